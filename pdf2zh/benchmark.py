@@ -0,0 +1,180 @@
+"""
+端到端吞吐量测试：用本地模拟翻译服务（pdf2zh.mock_server）翻译样例 PDF，
+输出每个文件的页数、每秒页数、翻译服务调用次数、缓存命中率和各阶段耗时。
+
+    python -m pdf2zh.benchmark --service deeplx --thread 4 8 16 --latency 0.2 --capacity 8
+
+默认翻译 pdf2zh_files/ 下的全部 PDF。运行期间使用临时的配置文件和缓存数据库，
+不会把模拟服务的地址和译文写入用户的配置和缓存。
+"""
+
+import argparse
+import json
+import logging
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+from typing import List
+
+from pdf2zh import cache
+from pdf2zh.config import ConfigManager
+from pdf2zh.mock_server import MockServer, mock_endpoints
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent / "pdf2zh_files"
+SERVICES = ("deeplx", "google", "baidu")
+
+
+def run_benchmark(
+    files: List[str],
+    service: str = "deeplx",
+    threads: List[int] = (4,),
+    server: MockServer = None,
+    endpoint: str = None,
+    use_cache: bool = False,
+    model=None,
+    lang_in: str = "en",
+    lang_out: str = "zh",
+) -> List[dict]:
+    """
+    依次用 threads 中的每个线程数翻译 files，返回每个文件每次运行的结果。
+    server 为空时使用 endpoint 处已启动的模拟服务（python -m pdf2zh.mock_server）。
+    """
+    from pdf2zh.doclayout import DocLayoutModel
+    from pdf2zh.high_level import translate
+
+    if model is None:
+        model = DocLayoutModel.load_available()
+    envs = server.endpoints() if server is not None else mock_endpoints(endpoint)
+
+    # 临时配置文件：复制用户配置（字体路径等），翻译器 envs 的改动只写入副本
+    config = ConfigManager.get_instance()
+    user_config = config._config_path
+    workdir = Path(tempfile.mkdtemp(prefix="pdf2zh-benchmark-"))
+    temp_config = workdir / "config.json"
+    if user_config.exists():
+        shutil.copyfile(user_config, temp_config)
+    else:
+        temp_config.write_text("{}", encoding="utf-8")
+    ConfigManager.custome_config(temp_config)
+    test_db = cache.init_test_db()
+    results = []
+    try:
+        for thread in threads:
+            if server is not None:
+                server.reset_stats()
+            output = workdir / f"thread-{thread}"
+            translate(
+                files,
+                output=str(output),
+                lang_in=lang_in,
+                lang_out=lang_out,
+                service=service,
+                thread=thread,
+                model=model,
+                envs=envs,
+                ignore_cache=not use_cache,
+                report=True,
+            )
+            for file in files:
+                report = json.loads(
+                    (output / f"{Path(file).stem}-report.json").read_text(encoding="utf-8")
+                )
+                translators = report["translators"].values()
+                results.append({
+                    "file": Path(file).name,
+                    "service": service,
+                    "thread": thread,
+                    "pages": report["pages"],
+                    "wall_time": report["wall_time"],
+                    "pages_per_sec": report["pages"] / report["wall_time"] if report["wall_time"] else None,
+                    "mt_calls": sum(t["calls"] for t in translators),
+                    "mt_errors": sum(t["errors"] for t in translators),
+                    "cache_hits": report["cache"]["hits"],
+                    "cache_hit_rate": report["cache"]["hit_rate"],
+                    "stages": report["stages"],
+                })
+            if server is not None:  # 模拟服务的统计按线程数汇总，不区分文件
+                results[-1]["server"] = dict(server.stats)
+    finally:
+        cache.clean_test_db(test_db)
+        ConfigManager.custome_config(user_config)
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def format_results(results: List[dict]) -> str:
+    lines = [
+        f"{'file':<40} {'thread':>6} {'pages':>5} {'wall':>8} {'pages/s':>8} {'calls':>6} {'errors':>6} {'hit rate':>8}"
+    ]
+    for r in results:
+        hit_rate = "n/a" if r["cache_hit_rate"] is None else f"{r['cache_hit_rate']:.1%}"
+        pages_per_sec = "n/a" if r["pages_per_sec"] is None else f"{r['pages_per_sec']:.2f}"
+        lines.append(
+            f"{r['file'][:40]:<40} {r['thread']:>6} {r['pages']:>5} {r['wall_time']:>7.2f}s "
+            f"{pages_per_sec:>8} {r['mt_calls']:>6} {r['mt_errors']:>6} {hit_rate:>8}"
+        )
+        stages = ", ".join(f"{k} {v:.2f}s" for k, v in sorted(r["stages"].items(), key=lambda x: -x[1]))
+        lines.append(f"    {stages}")
+        if "server" in r:
+            lines.append(f"    server: {json.dumps(r['server'])}")
+    return "\n".join(lines)
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pdf2zh.benchmark", description="pdf2zh 端到端吞吐量测试")
+    parser.add_argument("files", nargs="*", help=f"要翻译的 PDF，默认 {SAMPLE_DIR}/*.pdf")
+    parser.add_argument("--service", choices=SERVICES, default="deeplx")
+    parser.add_argument("--thread", type=int, nargs="+", default=[4], help="依次测试的线程数")
+    parser.add_argument("--lang-in", default="en")
+    parser.add_argument("--lang-out", default="zh")
+    parser.add_argument("--cache", action="store_true", help="使用缓存（默认全部请求翻译服务）")
+    parser.add_argument("--endpoint", help="已启动的模拟服务地址，如 http://127.0.0.1:1188，默认在进程内启动")
+    parser.add_argument("--latency", type=float, default=0.05, help="模拟服务每个请求的处理时间（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--rate", type=float, default=None)
+    parser.add_argument("--capacity", type=int, default=None)
+    parser.add_argument("--json", help="将结果写入 JSON 文件")
+    return parser
+
+
+def main(args=None) -> int:
+    args = create_parser().parse_args(args)
+    logging.basicConfig(level=logging.WARNING)
+    files = args.files or sorted(str(p) for p in SAMPLE_DIR.glob("*.pdf"))
+    if not files:
+        print(f"no PDF files found in {SAMPLE_DIR}", file=sys.stderr)
+        return 1
+    server = None
+    if not args.endpoint:
+        server = MockServer(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            rate=args.rate,
+            capacity=args.capacity,
+        ).start()
+    try:
+        results = run_benchmark(
+            files,
+            service=args.service,
+            threads=args.thread,
+            server=server,
+            endpoint=args.endpoint,
+            use_cache=args.cache,
+            lang_in=args.lang_in,
+            lang_out=args.lang_out,
+        )
+    finally:
+        if server is not None:
+            server.stop()
+    print(format_results(results))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -1,36 +1,199 @@
+import abc
+import atexit
+import hashlib
 import logging
 import os
 import json
-from peewee import Model, SqliteDatabase, AutoField, CharField, TextField, SQL
-from typing import Optional
+import queue
+import sqlite3
+import sys
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from contextlib import nullcontext
+from peewee import (
+    Model,
+    SqliteDatabase,
+    AutoField,
+    BlobField,
+    BooleanField,
+    CharField,
+    IntegerField,
+    TextField,
+    chunked,
+    fn,
+)
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from pdf2zh.config import ConfigManager
 
 
 # we don't init the database here
 db = SqliteDatabase(None)
 logger = logging.getLogger(__name__)
 
+# keep well below SQLITE_MAX_VARIABLE_NUMBER (999 on older sqlite builds)
+_SQLITE_MAX_VARIABLES = 900
+_DIGEST_SIZE = 16
+# rows whose text and translation together exceed this many bytes are stored
+# zlib-compressed; set to 0 to disable compression
+COMPRESS_MIN_BYTES = 512
+# access times of rows read from sqlite are buffered and written in batches
+_TOUCH_FLUSH_SIZE = 1000
+# pending writes held by the write-behind queue before new ones are dropped
+WRITE_QUEUE_SIZE = 100000
+# largest batch handed to backend.set_many by the writer thread
+WRITE_BATCH_SIZE = 1000
+# texts up to this many characters that are looked up again (running headers,
+# "Figure N:" prefixes, affiliations) are pinned in memory for the whole run
+PIN_MAX_CHARS = 80
+
+
+class _CacheProfile(Model):
+    """Interned (translate_engine, translate_engine_params) combinations."""
 
-class _TranslationCache(Model):
     id = AutoField()
     translate_engine = CharField(max_length=20)
     translate_engine_params = TextField()
-    original_text = TextField()
-    translation = TextField()
 
     class Meta:
         database = db
-        constraints = [
-            SQL(
-                """
-            UNIQUE (
-                translate_engine,
-                translate_engine_params,
-                original_text
-                )
-            ON CONFLICT REPLACE
-            """
-            )
-        ]
+        indexes = ((("translate_engine", "translate_engine_params"), True),)
+
+
+class _TranslationCache(Model):
+    # blake2b digest of (engine, params, text), see _digest
+    key = BlobField(primary_key=True)
+    profile = IntegerField(index=True)
+    original_text = BlobField()
+    translation = BlobField()
+    compressed = BooleanField(default=False)
+    size = IntegerField(default=0)  # stored bytes of original_text + translation
+    last_access = IntegerField(default=0, index=True)  # unix time
+
+    class Meta:
+        database = db
+        without_rowid = True
+
+
+class _CacheMeta(Model):
+    """Key/value state of the cache database, e.g. the progress of the v1 migration."""
+
+    key = CharField(primary_key=True)
+    value = TextField()
+
+    class Meta:
+        database = db
+
+
+# last migrated rowid of cache.v1.db, or "done"
+_V1_MIGRATION = "v1_migration"
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU bounded by entry count and approximate memory size.
+    Keys are (translate_engine, translate_engine_params, original_text) tuples.
+    Pinned entries are kept outside the LRU order and are never evicted.
+    """
+
+    def __init__(
+        self,
+        max_size: int = 65536,
+        max_bytes: int = 64 * 1024 * 1024,
+        max_pinned: int = 16384,
+    ):
+        self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.max_pinned = max_pinned
+        self.hits = 0
+        self.misses = 0
+        self._bytes = 0
+        self._data: OrderedDict = OrderedDict()
+        self._pinned: Dict[tuple, str] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _sizeof(key: tuple, value: str) -> int:
+        # engine and params strings are shared between entries, only count the text
+        return sys.getsizeof(key[-1]) + sys.getsizeof(value)
+
+    def get(self, key: tuple) -> Optional[str]:
+        with self._lock:
+            value = self._pinned.get(key)
+            if value is not None:
+                self.hits += 1
+                return value
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: tuple, value: str):
+        size = self._sizeof(key, value)
+        with self._lock:
+            if key in self._pinned:
+                # a re-translation replaces the pinned value too
+                self._pinned[key] = value
+            old = self._data.pop(key, None)
+            if old is not None:
+                self._bytes -= self._sizeof(key, old)
+            if size > self.max_bytes or self.max_size <= 0:
+                return
+            self._data[key] = value
+            self._bytes += size
+            self._shrink()
+
+    def pin(self, key: tuple, value: str):
+        """Keep an entry for the lifetime of the process (up to max_pinned entries)."""
+        with self._lock:
+            if key in self._pinned or len(self._pinned) < self.max_pinned:
+                self._pinned[key] = value
+
+    def resize(self, max_size: int = None, max_bytes: int = None):
+        with self._lock:
+            if max_size is not None:
+                self.max_size = max_size
+            if max_bytes is not None:
+                self.max_bytes = max_bytes
+            self._shrink()
+
+    def _shrink(self):
+        while self._data and (
+            len(self._data) > self.max_size or self._bytes > self.max_bytes
+        ):
+            key, value = self._data.popitem(last=False)
+            self._bytes -= self._sizeof(key, value)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._pinned.clear()
+            self._bytes = 0
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "bytes": self._bytes,
+                "pinned": len(self._pinned),
+                "hits": self.hits,
+                "misses": self.misses,
+            }
+
+    def __len__(self):
+        return len(self._data)
+
+
+# shared by every TranslationCache in the process,
+# so repeated paragraphs and re-runs of the same document skip SQLite
+memory_cache = LRUCache()
 
 
 class TranslationCache:
@@ -52,6 +215,16 @@ class TranslationCache:
         ), "current cache require translate engine name less than 20 characters"
         self.translate_engine = translate_engine
         self.replace_params(translate_engine_params)
+        self.fuzzy = None
+
+    def enable_fuzzy(self, minhash: bool = False, threshold: float = 0.92):
+        """
+        Fall back to normalized (whitespace, hyphenation, placeholder numbering) lookups,
+        and with minhash=True to near-duplicate lookups, see pdf2zh.cache_fuzzy.
+        """
+        from pdf2zh.cache_fuzzy import FuzzyMatcher
+
+        self.fuzzy = FuzzyMatcher(self, minhash=minhash, threshold=threshold)
 
     # The program typically starts multi-threaded translation
     # only after cache parameters are fully configured,
@@ -73,48 +246,645 @@ class TranslationCache:
         self.params[k] = v
         self.replace_params(self.params)
 
+    def _memory_key(self, original_text: str) -> tuple:
+        return (self.translate_engine, self.translate_engine_params, original_text)
+
+    def _digest(self, original_text: str) -> bytes:
+        return _digest(self.translate_engine, self.translate_engine_params, original_text)
+
+    def get(self, original_text: str) -> Optional[str]:
+        return self.get_many([original_text]).get(original_text)
+
+    def get_many(self, original_texts: Iterable[str]) -> Dict[str, str]:
+        """
+        Look up many texts at once, returning only the ones that are cached.
+        Memory misses are resolved with a single backend round trip.
+        Short texts that hit in memory again are pinned there, see PIN_MAX_CHARS.
+        """
+        found = {}
+        missing = {}
+        for original_text in dict.fromkeys(original_texts):
+            key = self._memory_key(original_text)
+            translation = memory_cache.get(key)
+            if translation is not None:
+                found[original_text] = translation
+                if len(original_text) <= PIN_MAX_CHARS:
+                    memory_cache.pin(key, translation)
+            else:
+                missing[self._digest(original_text)] = original_text
+        if not missing:
+            return found
+        try:
+            hits = _backend.get_many(list(missing))
+        except Exception as e:
+            logger.debug(f"Error getting cache: {e}")
+            hits = {}
+        for digest, translation in hits.items():
+            original_text = missing.pop(digest)
+            found[original_text] = translation
+            memory_cache.set(self._memory_key(original_text), translation)
+        if missing and self.fuzzy is not None:
+            try:
+                found.update(self.fuzzy.get_many(missing.values()))
+            except Exception as e:
+                logger.debug(f"Error getting fuzzy cache: {e}")
+        return found
+
+    def set_many(self, pairs: Iterable[Tuple[str, str]]):
+        """
+        Store many (original_text, translation) pairs. The memory cache is updated
+        right away, the backend write is queued for the write-behind thread.
+        """
+        entries = []
+        for original_text, translation in pairs:
+            memory_cache.set(self._memory_key(original_text), translation)
+            entries.append(
+                CacheEntry(
+                    self._digest(original_text),
+                    self.translate_engine,
+                    self.translate_engine_params,
+                    original_text,
+                    translation,
+                )
+            )
+        if not entries:
+            return
+        write_behind.put(entries)
+        if self.fuzzy is not None:
+            try:
+                self.fuzzy.set_many((e.original_text, e.translation) for e in entries)
+            except Exception as e:
+                logger.debug(f"Error setting fuzzy cache: {e}")
+
+    def set(self, original_text: str, translation: str):
+        self.set_many([(original_text, translation)])
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued write reached the backend."""
+        return write_behind.flush(timeout)
+
+
+class CacheEntry(NamedTuple):
+    key: bytes  # see _digest
+    translate_engine: str
+    translate_engine_params: str
+    original_text: str
+    translation: str
+
+
+class CacheBackend(abc.ABC):
+    """Storage behind TranslationCache, addressed by the (engine, params, text) digest."""
+
+    @abc.abstractmethod
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, str]:
+        """Return the translations of the given keys that are stored."""
+        pass
+
+    @abc.abstractmethod
+    def set_many(self, entries: List[CacheEntry]):
+        """Store the entries, replacing existing ones with the same key."""
+        pass
+
+    def scan(self, translate_engine: Optional[str] = None) -> Iterator[CacheEntry]:
+        """Iterate over the stored entries, optionally only those of one engine."""
+        raise NotImplementedError(f"{type(self).__name__} does not support scanning")
+
+    def scan_texts(self, translate_engine: str, translate_engine_params: str) -> Iterator[str]:
+        """Iterate over the source texts stored for one engine and params combination."""
+        for entry in self.scan(translate_engine):
+            if entry.translate_engine_params == translate_engine_params:
+                yield entry.original_text
+
+    def transaction(self):
+        """Context manager grouping several set_many calls, where the backend supports it."""
+        return nullcontext()
+
+    def close(self):
+        pass
+
+
+class SqliteBackend(CacheBackend):
+    """The local peewee database set up by init_db (or bound by init_test_db)."""
+
     # Since peewee and the underlying sqlite are thread-safe,
     # get and set operations don't need locks.
-    def get(self, original_text: str) -> Optional[str]:
-        result = _TranslationCache.get_or_none(
-            translate_engine=self.translate_engine,
-            translate_engine_params=self.translate_engine_params,
-            original_text=original_text,
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, str]:
+        found = {}
+        for chunk in chunked(keys, _SQLITE_MAX_VARIABLES):
+            query = _TranslationCache.select(
+                _TranslationCache.key,
+                _TranslationCache.translation,
+                _TranslationCache.compressed,
+            ).where(_TranslationCache.key.in_(chunk))
+            for digest, translation, compressed in query.tuples():
+                found[bytes(digest)] = _decode(translation, compressed)
+        _touch(found)
+        return found
+
+    def set_many(self, entries: List[CacheEntry]):
+        rows = []
+        for entry in entries:
+            row = _make_row(entry.key, entry.original_text, entry.translation)
+            row["profile"] = _intern_profile(entry.translate_engine, entry.translate_engine_params)
+            rows.append(row)
+        _insert_rows(rows)
+
+    def scan(self, translate_engine: Optional[str] = None) -> Iterator[CacheEntry]:
+        profiles = _CacheProfile.select()
+        if translate_engine is not None:
+            profiles = profiles.where(_CacheProfile.translate_engine == translate_engine)
+        for profile in profiles:
+            query = _TranslationCache.select(
+                _TranslationCache.key,
+                _TranslationCache.original_text,
+                _TranslationCache.translation,
+                _TranslationCache.compressed,
+            ).where(_TranslationCache.profile == profile.id)
+            for digest, original_text, translation, compressed in query.tuples().iterator():
+                yield CacheEntry(
+                    bytes(digest),
+                    profile.translate_engine,
+                    profile.translate_engine_params,
+                    _decode(original_text, compressed),
+                    _decode(translation, compressed),
+                )
+
+    def scan_texts(self, translate_engine: str, translate_engine_params: str) -> Iterator[str]:
+        profile = _CacheProfile.get_or_none(
+            (_CacheProfile.translate_engine == translate_engine)
+            & (_CacheProfile.translate_engine_params == translate_engine_params)
         )
-        return result.translation if result else None
+        if profile is None:
+            return
+        query = _TranslationCache.select(
+            _TranslationCache.original_text, _TranslationCache.compressed
+        ).where(_TranslationCache.profile == profile.id)
+        for original_text, compressed in query.tuples().iterator():
+            yield _decode(original_text, compressed)
 
-    def set(self, original_text: str, translation: str):
-        try:
-            _TranslationCache.create(
-                translate_engine=self.translate_engine,
-                translate_engine_params=self.translate_engine_params,
-                original_text=original_text,
-                translation=translation,
+    def transaction(self):
+        return _TranslationCache._meta.database.atomic()
+
+    def close(self):
+        flush_access_times()
+
+
+_backend: CacheBackend = SqliteBackend()
+
+
+def get_backend() -> CacheBackend:
+    return _backend
+
+
+def set_backend(backend: CacheBackend):
+    """Replace the storage used by every TranslationCache in the process."""
+    global _backend
+    # queued writes belong to the old backend
+    write_behind.flush()
+    old, _backend = _backend, backend
+    if old is not backend:
+        old.close()
+    memory_cache.clear()
+
+
+class WriteBehind:
+    """
+    Single writer thread that drains queued cache entries into backend.set_many,
+    so translator threads never wait on the storage. Writes are dropped (and
+    counted) when the queue is full, e.g. because the backend is unreachable.
+    """
+
+    def __init__(self, max_queue: int = WRITE_QUEUE_SIZE, batch_size: int = WRITE_BATCH_SIZE):
+        self.batch_size = batch_size
+        self._queue: "queue.Queue[CacheEntry]" = queue.Queue(max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(
+                    target=self._run, name="pdf2zh-cache-writer", daemon=True
+                )
+                self._thread.start()
+
+    def put(self, entries: Iterable[CacheEntry]):
+        self._start()
+        for entry in entries:
+            try:
+                self._queue.put_nowait(entry)
+            except queue.Full:
+                with self._lock:
+                    self.dropped += 1
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                _backend.set_many(batch)
+                with self._lock:
+                    self.written += len(batch)
+            except Exception as e:
+                with self._lock:
+                    self.failed += len(batch)
+                logger.warning(f"Error writing {len(batch)} cache entries: {e}")
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until the queue is drained, return False on timeout."""
+        done = self._queue.all_tasks_done
+        with done:
+            return done.wait_for(lambda: self._queue.unfinished_tasks == 0, timeout)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self._queue.unfinished_tasks,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+
+write_behind = WriteBehind()
+
+
+def _digest(translate_engine: str, translate_engine_params: str, original_text: str) -> bytes:
+    # engine names never contain NUL and json.dumps escapes it, so the join is unambiguous
+    data = f"{translate_engine}\0{translate_engine_params}\0{original_text}"
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=_DIGEST_SIZE).digest()
+
+
+def _encode(original_text: str, translation: str) -> Tuple[bytes, bytes, bool]:
+    original = original_text.encode("utf-8")
+    translated = translation.encode("utf-8")
+    if COMPRESS_MIN_BYTES and len(original) + len(translated) >= COMPRESS_MIN_BYTES:
+        return zlib.compress(original), zlib.compress(translated), True
+    return original, translated, False
+
+
+def _make_row(digest: bytes, original_text: str, translation: str) -> dict:
+    original, translated, compressed = _encode(original_text, translation)
+    return {
+        "key": digest,
+        "original_text": original,
+        "translation": translated,
+        "compressed": compressed,
+        "size": len(original) + len(translated),
+        "last_access": int(time.time()),
+    }
+
+
+def _decode(value: bytes, compressed: bool) -> str:
+    value = bytes(value)
+    if compressed:
+        value = zlib.decompress(value)
+    return value.decode("utf-8")
+
+
+_profile_ids: Dict[Tuple[str, str], int] = {}
+_profile_lock = threading.Lock()
+
+
+def _intern_profile(translate_engine: str, translate_engine_params: str) -> int:
+    key = (translate_engine, translate_engine_params)
+    with _profile_lock:
+        if key not in _profile_ids:
+            profile, _ = _CacheProfile.get_or_create(
+                translate_engine=translate_engine,
+                translate_engine_params=translate_engine_params,
             )
-        except Exception as e:
-            logger.debug(f"Error setting cache: {e}")
+            _profile_ids[key] = profile.id
+        return _profile_ids[key]
 
 
-def init_db(remove_exists=False):
-    cache_folder = os.path.join(os.path.expanduser("~"), ".cache", "pdf2zh")
-    os.makedirs(cache_folder, exist_ok=True)
-    # The current version does not support database migration, so add the version number to the file name.
-    cache_db_path = os.path.join(cache_folder, "cache.v1.db")
-    if remove_exists and os.path.exists(cache_db_path):
-        os.remove(cache_db_path)
+_INSERT_COLUMNS = (
+    "key",
+    "profile",
+    "original_text",
+    "translation",
+    "compressed",
+    "size",
+    "last_access",
+)
+
+
+def _insert_rows(rows: List[dict], replace: bool = True):
+    # one prepared statement reused for every row, inside a single transaction
+    database = _TranslationCache._meta.database
+    sql = (
+        f'INSERT OR {"REPLACE" if replace else "IGNORE"} INTO "{_TranslationCache._meta.table_name}" '
+        f'({", ".join(_INSERT_COLUMNS)}) VALUES ({", ".join("?" * len(_INSERT_COLUMNS))})'
+    )
+    with database.atomic():
+        database.cursor().executemany(
+            sql, [tuple(row[c] for c in _INSERT_COLUMNS) for row in rows]
+        )
+
+
+_touched: set = set()
+_touch_lock = threading.Lock()
+
+
+def _touch(digests: Iterable[bytes]):
+    with _touch_lock:
+        _touched.update(digests)
+        if len(_touched) < _TOUCH_FLUSH_SIZE:
+            return
+    flush_access_times()
+
+
+def flush_access_times():
+    """Write the buffered last-access times of rows read from sqlite."""
+    with _touch_lock:
+        digests = list(_touched)
+        _touched.clear()
+    if not digests:
+        return
+    now = int(time.time())
+    try:
+        with _TranslationCache._meta.database.atomic():
+            for chunk in chunked(digests, _SQLITE_MAX_VARIABLES):
+                _TranslationCache.update(last_access=now).where(
+                    _TranslationCache.key.in_(chunk)
+                ).execute()
+    except Exception as e:
+        logger.debug(f"Error updating cache access time: {e}")
+
+
+def _delete_oldest(where, limit: int) -> Tuple[int, int]:
+    """Delete up to `limit` least recently used rows matching `where` in one short transaction."""
+    query = _TranslationCache.select(_TranslationCache.key, _TranslationCache.size)
+    if where is not None:
+        query = query.where(where)
+    victims = list(query.order_by(_TranslationCache.last_access).limit(limit).tuples())
+    if not victims:
+        return 0, 0
+    with _TranslationCache._meta.database.atomic():
+        _TranslationCache.delete().where(
+            _TranslationCache.key.in_([v[0] for v in victims])
+        ).execute()
+    return len(victims), sum(v[1] for v in victims)
+
+
+def evict(
+    max_rows: Optional[int] = None,
+    max_bytes: Optional[int] = None,
+    ttl: Optional[int] = None,
+    batch_size: int = 500,
+) -> int:
+    """
+    Remove expired rows (not read or written for `ttl` seconds), then the least recently
+    used rows until the table fits in `max_rows` rows and `max_bytes` stored bytes.
+    Deletes run in small transactions so concurrent translations are not blocked for long.
+    Returns the number of deleted rows.
+    """
+    flush_access_times()
+    batch_size = min(batch_size, _SQLITE_MAX_VARIABLES)
+    deleted = 0
+    if ttl:
+        expired = _TranslationCache.last_access < int(time.time()) - ttl
+        while True:
+            n, _ = _delete_oldest(expired, batch_size)
+            deleted += n
+            if n < batch_size:
+                break
+    if max_rows is not None:
+        excess = _TranslationCache.select().count() - max_rows
+        while excess > 0:
+            n, _ = _delete_oldest(None, min(batch_size, excess))
+            if not n:
+                break
+            deleted += n
+            excess -= n
+    if max_bytes is not None:
+        total = _TranslationCache.select(fn.SUM(_TranslationCache.size)).scalar() or 0
+        while total > max_bytes:
+            n, size = _delete_oldest(None, batch_size)
+            if not n:
+                break
+            deleted += n
+            total -= size
+    if deleted:
+        logger.info(f"Evicted {deleted} cache entries")
+    return deleted
+
+
+def compact(full: bool = False, pages_per_step: int = 256):
+    """
+    Return free pages to the filesystem and truncate the WAL.
+
+    The default mode runs `incremental_vacuum` in small steps, each in its own short
+    write transaction, so it can run while other processes keep translating.
+    `full=True` runs a blocking VACUUM, which is also needed once to turn on incremental
+    vacuum for databases created before auto_vacuum was enabled.
+    """
+    database = _TranslationCache._meta.database
+    flush_access_times()
+    if full:
+        database.execute_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        database.execute_sql("VACUUM")
+    elif database.execute_sql("PRAGMA auto_vacuum").fetchone()[0] == 2:
+        while database.execute_sql("PRAGMA freelist_count").fetchone()[0]:
+            database.execute_sql(f"PRAGMA incremental_vacuum({pages_per_step})").fetchall()
+    else:
+        logger.info("Incremental vacuum is not enabled on this cache, run a full compaction once")
+    database.execute_sql("PRAGMA wal_checkpoint(PASSIVE)")
+    database.execute_sql("PRAGMA wal_checkpoint(TRUNCATE)")
+
+
+def stats() -> dict:
+    write_behind.flush()
+    flush_access_times()
+    row = _TranslationCache.select(
+        fn.COUNT(_TranslationCache.key), fn.SUM(_TranslationCache.size)
+    ).tuples().first()
+    return {
+        "rows": row[0],
+        "bytes": row[1] or 0,
+        "profiles": _CacheProfile.select().count(),
+        "memory": memory_cache.stats(),
+        "writes": write_behind.stats(),
+    }
+
+
+def _migration_state() -> Optional[str]:
+    row = _CacheMeta.get_or_none(_CacheMeta.key == _V1_MIGRATION)
+    return row.value if row is not None else None
+
+
+def migrate_from_v1(v1_path: str, batch_size: int = 1000) -> int:
+    """
+    Copy every row of a cache.v1.db into the current (v2) database.
+    Each batch commits together with its position, so an interrupted migration
+    resumes where it stopped; rows already present in v2 are kept.
+    Returns the number of migrated rows.
+    """
+    state = _migration_state()
+    if state == "done":
+        return 0
+    database_path = db.database
+    conn = sqlite3.connect(f"file:{v1_path}?mode=ro", uri=True)
+    migrated = 0
+    try:
+        cursor = conn.execute(
+            "SELECT rowid, translate_engine, translate_engine_params, original_text, translation "
+            "FROM _translationcache WHERE rowid > ? ORDER BY rowid",
+            (int(state or 0),),
+        )
+        while True:
+            records = cursor.fetchmany(batch_size)
+            if not records:
+                break
+            if db.database != database_path:  # init_db switched to another database
+                return migrated
+            rows = []
+            for _, translate_engine, translate_engine_params, original_text, translation in records:
+                row = _make_row(
+                    _digest(translate_engine, translate_engine_params, original_text),
+                    original_text,
+                    translation,
+                )
+                row["profile"] = _intern_profile(translate_engine, translate_engine_params)
+                rows.append(row)
+            with db.atomic():
+                _insert_rows(rows, replace=False)
+                _CacheMeta.replace(key=_V1_MIGRATION, value=str(records[-1][0])).execute()
+            migrated += len(rows)
+        _CacheMeta.replace(key=_V1_MIGRATION, value="done").execute()
+    except sqlite3.DatabaseError as e:
+        logger.warning(f"Failed to migrate cache from {v1_path}, will retry on next start: {e}")
+    finally:
+        conn.close()
+    logger.info(f"Migrated {migrated} cache entries from {v1_path}")
+    return migrated
+
+
+def _start_migration(v1_path: str):
+    """Migrate cache.v1.db in the background; its entries become hits as they are copied."""
+    if _migration_state() == "done":
+        return
+
+    def run():
+        try:
+            migrate_from_v1(v1_path)
+        finally:
+            db.close()
+
+    threading.Thread(target=run, name="pdf2zh-cache-migrate", daemon=True).start()
+
+
+def _open_sqlite(path: str):
+    _profile_ids.clear()
     db.init(
-        cache_db_path,
+        path,
         pragmas={
             "journal_mode": "wal",
             "busy_timeout": 1000,
+            # only takes effect on new databases, see compact()
+            "auto_vacuum": "incremental",
         },
     )
-    db.create_tables([_TranslationCache], safe=True)
+    db.create_tables([_CacheMeta, _CacheProfile, _TranslationCache], safe=True)
+
+
+def _start_eviction():
+    max_rows = ConfigManager.get("PDF2ZH_CACHE_MAX_ROWS")
+    max_bytes = ConfigManager.get("PDF2ZH_CACHE_MAX_BYTES")
+    ttl = ConfigManager.get("PDF2ZH_CACHE_TTL")
+    if max_rows or max_bytes or ttl:
+        threading.Thread(
+            target=evict,
+            kwargs={
+                "max_rows": int(max_rows) if max_rows else None,
+                "max_bytes": int(max_bytes) if max_bytes else None,
+                "ttl": int(ttl) if ttl else None,
+            },
+            daemon=True,
+        ).start()
+
+
+def _init_readonly(backend_url: Optional[str], cache_db_path: str):
+    from pdf2zh.cache_backends import OverlayBackend, ReadOnlySqliteBackend, create_backend
+
+    try:
+        if backend_url and not backend_url.startswith("sqlite://"):
+            base = create_backend(backend_url)
+        else:
+            base = ReadOnlySqliteBackend(cache_db_path)
+    except Exception as e:
+        logger.warning(f"Read-only translation cache unavailable: {e}")
+        base = None
+    overlay = None
+    overlay_path = ConfigManager.get("PDF2ZH_CACHE_OVERLAY")
+    if overlay_path:
+        os.makedirs(os.path.dirname(os.path.abspath(overlay_path)), exist_ok=True)
+        _open_sqlite(overlay_path)
+        overlay = SqliteBackend()
+    set_backend(OverlayBackend(base, overlay))
+    if overlay is not None:
+        _start_eviction()
+
+
+def init_db(remove_exists=False):
+    """
+    Set up the cache backend selected by PDF2ZH_CACHE_BACKEND:
+    empty for ~/.cache/pdf2zh/cache.v2.db, `sqlite://<path>` for a database elsewhere
+    (e.g. on a shared directory), or one of the URLs accepted by
+    pdf2zh.cache_backends.create_backend (`lmdb://<dir>`, `redis://host:port/db`).
+
+    With PDF2ZH_CACHE_READONLY set the selected cache is only read (a sqlite file is
+    opened immutable, without locks or WAL) and new entries go to the sqlite database
+    at PDF2ZH_CACHE_OVERLAY, or are not stored at all when that is unset.
+    """
+    write_behind.flush()
+    backend_url = ConfigManager.get("PDF2ZH_CACHE_BACKEND")
+    readonly = str(ConfigManager.get("PDF2ZH_CACHE_READONLY") or "").lower() in (
+        "1",
+        "true",
+        "yes",
+    )
+    cache_folder = os.path.join(os.path.expanduser("~"), ".cache", "pdf2zh")
+    # The schema version is part of the file name, older files are migrated in the background.
+    cache_db_path = os.path.join(cache_folder, "cache.v2.db")
+    v1_db_path = os.path.join(cache_folder, "cache.v1.db")
+    if backend_url and backend_url.startswith("sqlite://"):
+        cache_db_path = backend_url[len("sqlite://"):]
+        v1_db_path = None
+    if readonly:
+        _init_readonly(backend_url, cache_db_path)
+        return
+    if backend_url and not backend_url.startswith("sqlite://"):
+        from pdf2zh.cache_backends import create_backend
+
+        set_backend(create_backend(backend_url))
+        return
+    os.makedirs(cache_folder, exist_ok=True)
+    if remove_exists and os.path.exists(cache_db_path):
+        os.remove(cache_db_path)
+    _open_sqlite(cache_db_path)
+    set_backend(SqliteBackend())
+    if v1_db_path is not None and os.path.exists(v1_db_path):
+        _start_migration(v1_db_path)
+    _start_eviction()
 
 
 def init_test_db():
     import tempfile
 
+    write_behind.flush()
+    memory_cache.clear()
+    _profile_ids.clear()
     cache_db_path = tempfile.mktemp(suffix=".db")
     test_db = SqliteDatabase(
         cache_db_path,
@@ -123,14 +893,19 @@ def init_test_db():
             "busy_timeout": 1000,
         },
     )
-    test_db.bind([_TranslationCache], bind_refs=False, bind_backrefs=False)
+    test_db.bind([_CacheMeta, _CacheProfile, _TranslationCache], bind_refs=False, bind_backrefs=False)
     test_db.connect()
-    test_db.create_tables([_TranslationCache], safe=True)
+    test_db.create_tables([_CacheMeta, _CacheProfile, _TranslationCache], safe=True)
+    set_backend(SqliteBackend())
     return test_db
 
 
 def clean_test_db(test_db):
-    test_db.drop_tables([_TranslationCache])
+    write_behind.flush()
+    memory_cache.clear()
+    _profile_ids.clear()
+    _touched.clear()
+    test_db.drop_tables([_CacheMeta, _CacheProfile, _TranslationCache])
     test_db.close()
     db_path = test_db.database
     if os.path.exists(db_path):
@@ -144,3 +919,6 @@ def clean_test_db(test_db):
 
 
 init_db()
+atexit.register(flush_access_times)
+# registered last so it runs first: pending writes land before access times are flushed
+atexit.register(write_behind.flush, 10)
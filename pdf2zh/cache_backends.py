@@ -0,0 +1,578 @@
+"""
+Translation cache backends besides the local sqlite database in pdf2zh.cache.
+
+- LmdbBackend: memory-mapped key-value store, shared by the processes of one host
+- RespBackend: any server speaking the Redis protocol (RESP), shared by a fleet of workers
+- LocalKVServer: in-process RESP server used as a stand-in for RespBackend
+- ReadOnlySqliteBackend: a pdf2zh sqlite cache opened immutable, e.g. on a read-only share
+- OverlayBackend: a read-only base with an optional writable local overlay for new entries
+"""
+
+import json
+import logging
+import os
+import socket
+import socketserver
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Dict, Iterator, List, Optional
+from urllib.parse import parse_qs, quote, unquote, urlparse
+
+from pdf2zh.cache import (
+    _SQLITE_MAX_VARIABLES,
+    COMPRESS_MIN_BYTES,
+    CacheBackend,
+    CacheEntry,
+    _decode,
+)
+
+logger = logging.getLogger(__name__)
+
+# keys per MGET / MSET round trip
+_CHUNK_SIZE = 500
+
+
+def _pack(entry: CacheEntry) -> bytes:
+    # keep engine, params and text next to the translation so the entry can be exported later
+    value = json.dumps(
+        [
+            entry.translate_engine,
+            entry.translate_engine_params,
+            entry.original_text,
+            entry.translation,
+        ],
+        ensure_ascii=False,
+    ).encode("utf-8")
+    if COMPRESS_MIN_BYTES and len(value) >= COMPRESS_MIN_BYTES:
+        return b"z" + zlib.compress(value)
+    return b"j" + value
+
+
+def _unpack(key: bytes, value: bytes) -> CacheEntry:
+    value = bytes(value)
+    data = zlib.decompress(value[1:]) if value[:1] == b"z" else value[1:]
+    return CacheEntry(key, *json.loads(data.decode("utf-8")))
+
+
+class LmdbBackend(CacheBackend):
+    def __init__(self, path: str, map_size: int = 1 << 32, readonly: bool = False):
+        try:
+            import lmdb
+        except ImportError as e:
+            raise ImportError(
+                "LMDB 缓存后端需要 lmdb 包，请使用 pip install lmdb 安装"
+            ) from e
+        self._lmdb = lmdb
+        if not readonly:
+            os.makedirs(path, exist_ok=True)
+        self.env = lmdb.open(
+            path,
+            map_size=map_size,
+            readonly=readonly,
+            lock=not readonly,
+            readahead=False,
+            max_readers=512,
+        )
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, str]:
+        found = {}
+        with self.env.begin(buffers=True) as txn:
+            for key in keys:
+                value = txn.get(key)
+                if value is not None:
+                    found[key] = _unpack(key, value).translation
+        return found
+
+    def set_many(self, entries: List[CacheEntry]):
+        try:
+            with self.env.begin(write=True) as txn:
+                for entry in entries:
+                    txn.put(entry.key, _pack(entry))
+        except self._lmdb.MapFullError as e:
+            # 整批写入失败，由调用方（WriteBehind）记为 failed
+            raise RuntimeError("LMDB 缓存已满，请在 URL 中增大 map_size") from e
+
+    def scan(self, translate_engine: Optional[str] = None) -> Iterator[CacheEntry]:
+        with self.env.begin() as txn:
+            for key, value in txn.cursor():
+                entry = _unpack(key, value)
+                if translate_engine is None or entry.translate_engine == translate_engine:
+                    yield entry
+
+    def close(self):
+        self.env.close()
+
+
+class RespError(Exception):
+    """Error reply from a RESP server."""
+
+
+class RespClient:
+    """Minimal thread-safe Redis protocol client, one connection per thread."""
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 6379,
+        db: int = 0,
+        password: Optional[str] = None,
+        timeout: float = 5.0,
+    ):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+        # every open connection, so close() also reaches those of other threads
+        self._connections: Dict[socket.socket, object] = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        self._local.sock = sock
+        self._local.rfile = sock.makefile("rb")
+        with self._lock:
+            self._connections[sock] = self._local.rfile
+        if self.password:
+            self._roundtrip([("AUTH", self.password)])
+        if self.db:
+            self._roundtrip([("SELECT", self.db)])
+
+    @staticmethod
+    def _close_connection(sock: socket.socket, rfile):
+        try:
+            rfile.close()
+            sock.close()
+        except OSError:
+            pass
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            with self._lock:
+                self._connections.pop(sock, None)
+            self._close_connection(sock, self._local.rfile)
+        self._local.sock = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        out = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            elif not isinstance(arg, (bytes, bytearray)):
+                arg = str(arg).encode("utf-8")
+            out.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(out)
+
+    def _read_reply(self):
+        line = self._local.rfile.readline()
+        if not line:
+            raise ConnectionError("RESP server closed the connection")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode("utf-8")
+        if kind == b"-":
+            raise RespError(payload.decode("utf-8"))
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = self._local.rfile.read(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            if length < 0:
+                return None
+            return [self._read_reply() for _ in range(length)]
+        raise RespError(f"invalid RESP reply: {line!r}")
+
+    def _roundtrip(self, commands):
+        self._local.sock.sendall(b"".join(self._encode(c) for c in commands))
+        return [self._read_reply() for _ in commands]
+
+    def pipeline(self, commands) -> list:
+        """Send all commands in one write and read their replies in order."""
+        if getattr(self._local, "sock", None) is None:
+            self._connect()
+        try:
+            return self._roundtrip(commands)
+        except (OSError, ConnectionError):
+            self._disconnect()
+            raise
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def close(self):
+        """Close the connections of all threads."""
+        self._local.sock = None
+        with self._lock:
+            connections, self._connections = self._connections, {}
+        for sock, rfile in connections.items():
+            self._close_connection(sock, rfile)
+
+
+class RespBackend(CacheBackend):
+    """
+    Cache stored on a Redis-compatible server.
+    URL: redis://[:password@]host[:port][/db][?ttl=seconds&prefix=pdf2zh:]
+    """
+
+    def __init__(self, url: str):
+        parsed = urlparse(url)
+        query = parse_qs(parsed.query)
+        path = parsed.path.strip("/")
+        self.client = RespClient(
+            host=parsed.hostname or "127.0.0.1",
+            port=parsed.port or 6379,
+            db=int(path) if path else 0,
+            password=unquote(parsed.password) if parsed.password else None,
+        )
+        self.ttl = int(query["ttl"][0]) if "ttl" in query else None
+        self.prefix = query.get("prefix", ["pdf2zh:"])[0].encode("utf-8")
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, str]:
+        found = {}
+        for i in range(0, len(keys), _CHUNK_SIZE):
+            chunk = keys[i : i + _CHUNK_SIZE]
+            values = self.client.execute("MGET", *[self.prefix + k for k in chunk])
+            for key, value in zip(chunk, values):
+                if value is not None:
+                    found[key] = _unpack(key, value).translation
+        return found
+
+    def set_many(self, entries: List[CacheEntry]):
+        for i in range(0, len(entries), _CHUNK_SIZE):
+            chunk = entries[i : i + _CHUNK_SIZE]
+            if self.ttl:
+                commands = [
+                    ("SET", self.prefix + e.key, _pack(e), "EX", self.ttl) for e in chunk
+                ]
+            else:
+                args = []
+                for e in chunk:
+                    args += [self.prefix + e.key, _pack(e)]
+                commands = [("MSET", *args)]
+            self.client.pipeline(commands)
+
+    def scan(self, translate_engine: Optional[str] = None) -> Iterator[CacheEntry]:
+        cursor = b"0"
+        while True:
+            cursor, keys = self.client.execute(
+                "SCAN", cursor, "MATCH", self.prefix + b"*", "COUNT", _CHUNK_SIZE
+            )
+            if keys:
+                for key, value in zip(keys, self.client.execute("MGET", *keys)):
+                    if value is None:
+                        continue
+                    entry = _unpack(key[len(self.prefix) :], value)
+                    if translate_engine is None or entry.translate_engine == translate_engine:
+                        yield entry
+            if cursor in (b"0", "0"):
+                break
+
+    def close(self):
+        self.client.close()
+
+
+class _RespHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line:
+            return None
+        if line[:1] != b"*":  # inline command
+            return line.strip().split()
+        args = []
+        for _ in range(int(line[1:-2])):
+            length = int(self.rfile.readline()[1:-2])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def _write(self, reply):
+        if reply is None:
+            self.wfile.write(b"$-1\r\n")
+        elif isinstance(reply, RespError):
+            self.wfile.write(b"-%s\r\n" % str(reply).encode("utf-8"))
+        elif isinstance(reply, str):
+            self.wfile.write(b"+%s\r\n" % reply.encode("utf-8"))
+        elif isinstance(reply, int):
+            self.wfile.write(b":%d\r\n" % reply)
+        elif isinstance(reply, bytes):
+            self.wfile.write(b"$%d\r\n%s\r\n" % (len(reply), reply))
+        else:
+            self.wfile.write(b"*%d\r\n" % len(reply))
+            for item in reply:
+                self._write(item)
+
+    def handle(self):
+        while True:
+            args = self._read_command()
+            if args is None:
+                return
+            if not args:
+                continue
+            try:
+                reply = self.server.execute(args[0].decode("utf-8").upper(), args[1:])
+            except Exception as e:
+                reply = RespError(f"ERR {e}")
+            self._write(reply)
+            self.wfile.flush()
+
+
+class LocalKVServer(socketserver.ThreadingTCPServer):
+    """
+    In-process stand-in for a Redis server, supporting the commands RespBackend uses
+    (PING, AUTH, SELECT, GET, MGET, SET [EX], MSET, DEL, EXISTS, DBSIZE, FLUSHDB, SCAN).
+
+        server = LocalKVServer().start()
+        set_backend(RespBackend(server.url))
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _RespHandler)
+        self.data: Dict[bytes, bytes] = {}
+        self.expires: Dict[bytes, float] = {}
+        self.lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"redis://{host}:{port}/0"
+
+    def start(self) -> "LocalKVServer":
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        expire = self.expires.get(key)
+        if expire is not None and expire < time.time():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def _set(self, key: bytes, value: bytes, ex: Optional[int] = None):
+        self.data[key] = value
+        if ex:
+            self.expires[key] = time.time() + ex
+        else:
+            self.expires.pop(key, None)
+
+    def execute(self, command: str, args: list):
+        with self.lock:
+            if command == "PING":
+                return "PONG"
+            if command in ("AUTH", "SELECT"):
+                return "OK"
+            if command == "GET":
+                return self._get(args[0])
+            if command == "MGET":
+                return [self._get(k) for k in args]
+            if command == "SET":
+                ex = None
+                if len(args) >= 4 and args[2].upper() == b"EX":
+                    ex = int(args[3])
+                self._set(args[0], args[1], ex)
+                return "OK"
+            if command == "MSET":
+                for i in range(0, len(args), 2):
+                    self._set(args[i], args[i + 1])
+                return "OK"
+            if command == "DEL":
+                deleted = 0
+                for k in args:
+                    if self._get(k) is not None:  # expired keys don't count
+                        deleted += 1
+                    self.data.pop(k, None)
+                    self.expires.pop(k, None)
+                return deleted
+            if command == "EXISTS":
+                return sum(self._get(k) is not None for k in args)
+            if command == "DBSIZE":
+                return len(self.data)
+            if command == "FLUSHDB":
+                self.data.clear()
+                self.expires.clear()
+                return "OK"
+            if command == "SCAN":
+                # single page scan, MATCH only supports a trailing '*'
+                keys = list(self.data)
+                if b"MATCH" in [a.upper() for a in args]:
+                    pattern = args[[a.upper() for a in args].index(b"MATCH") + 1]
+                    keys = [k for k in keys if k.startswith(pattern.rstrip(b"*"))]
+                return [b"0", keys]
+            raise RespError(f"unknown command '{command}'")
+
+
+class ReadOnlySqliteBackend(CacheBackend):
+    """
+    A cache database written by SqliteBackend, opened with mode=ro&immutable=1:
+    sqlite takes no locks, reads no WAL and never changes the schema, so any number
+    of processes can share the file on a read-only or network mount. The file must
+    not be modified while it is open, and its WAL must be checkpointed before it is
+    published (`python -m pdf2zh.cache_cli compact`) since immutable readers ignore it.
+    """
+
+    def __init__(self, path: str, mmap_size: int = 256 << 20):
+        if not os.path.isfile(path):
+            raise FileNotFoundError(f"只读缓存文件不存在: {path}")
+        self.uri = f"file:{quote(os.path.abspath(path))}?mode=ro&immutable=1"
+        self.mmap_size = mmap_size
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._lock = threading.Lock()
+        self._connection().execute("SELECT 1 FROM _translationcache LIMIT 1")
+
+    def _connection(self) -> sqlite3.Connection:
+        # one connection per thread, reads don't contend on an immutable file
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False)
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            self._local.conn = conn
+            with self._lock:
+                self._connections.append(conn)
+        return conn
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, str]:
+        found = {}
+        conn = self._connection()
+        for i in range(0, len(keys), _SQLITE_MAX_VARIABLES):
+            chunk = keys[i : i + _SQLITE_MAX_VARIABLES]
+            rows = conn.execute(
+                "SELECT key, translation, compressed FROM _translationcache"
+                f" WHERE key IN ({','.join('?' * len(chunk))})",
+                chunk,
+            )
+            for digest, translation, compressed in rows:
+                found[bytes(digest)] = _decode(translation, compressed)
+        return found
+
+    def set_many(self, entries: List[CacheEntry]):
+        raise PermissionError("只读缓存不能写入")
+
+    def scan(self, translate_engine: Optional[str] = None) -> Iterator[CacheEntry]:
+        sql = (
+            "SELECT t.key, p.translate_engine, p.translate_engine_params,"
+            " t.original_text, t.translation, t.compressed"
+            " FROM _translationcache t JOIN _cacheprofile p ON t.profile = p.id"
+        )
+        args = ()
+        if translate_engine is not None:
+            sql += " WHERE p.translate_engine = ?"
+            args = (translate_engine,)
+        for digest, engine, params, original_text, translation, compressed in (
+            self._connection().execute(sql, args)
+        ):
+            yield CacheEntry(
+                bytes(digest),
+                engine,
+                params,
+                _decode(original_text, compressed),
+                _decode(translation, compressed),
+            )
+
+    def scan_texts(self, translate_engine: str, translate_engine_params: str) -> Iterator[str]:
+        rows = self._connection().execute(
+            "SELECT t.original_text, t.compressed"
+            " FROM _translationcache t JOIN _cacheprofile p ON t.profile = p.id"
+            " WHERE p.translate_engine = ? AND p.translate_engine_params = ?",
+            (translate_engine, translate_engine_params),
+        )
+        for original_text, compressed in rows:
+            yield _decode(original_text, compressed)
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            conn.close()
+
+
+class OverlayBackend(CacheBackend):
+    """
+    Reads from the overlay first and then from the read-only base; writes only go to
+    the overlay and are discarded without one. A base that becomes unreachable
+    (e.g. a network mount going away) is treated as empty.
+    """
+
+    def __init__(self, base: Optional[CacheBackend], overlay: Optional[CacheBackend] = None):
+        self.base = base
+        self.overlay = overlay
+
+    def get_many(self, keys: List[bytes]) -> Dict[bytes, str]:
+        found = self.overlay.get_many(keys) if self.overlay is not None else {}
+        missing = [key for key in keys if key not in found]
+        if missing and self.base is not None:
+            try:
+                found.update(self.base.get_many(missing))
+            except Exception as e:
+                logger.debug(f"Error reading read-only cache: {e}")
+        return found
+
+    def set_many(self, entries: List[CacheEntry]):
+        if self.overlay is not None:
+            self.overlay.set_many(entries)
+
+    def scan(self, translate_engine: Optional[str] = None) -> Iterator[CacheEntry]:
+        seen = set()
+        if self.overlay is not None:
+            for entry in self.overlay.scan(translate_engine):
+                seen.add(entry.key)
+                yield entry
+        if self.base is not None:
+            for entry in self.base.scan(translate_engine):
+                if entry.key not in seen:
+                    yield entry
+
+    def scan_texts(self, translate_engine: str, translate_engine_params: str) -> Iterator[str]:
+        seen = set()
+        for backend in (self.overlay, self.base):
+            if backend is None:
+                continue
+            for text in backend.scan_texts(translate_engine, translate_engine_params):
+                if text not in seen:
+                    seen.add(text)
+                    yield text
+
+    def transaction(self):
+        return super().transaction() if self.overlay is None else self.overlay.transaction()
+
+    def close(self):
+        for backend in (self.overlay, self.base):
+            if backend is not None:
+                backend.close()
+
+
+def create_backend(url: str) -> CacheBackend:
+    """
+    Build a backend from a URL:
+    - lmdb://<directory>[?map_size=bytes&readonly=1]
+    - redis://[:password@]host[:port][/db][?ttl=seconds&prefix=...] (also resp://)
+    """
+    scheme, _, rest = url.partition("://")
+    scheme = scheme.lower()
+    if scheme == "lmdb":
+        path, _, query = rest.partition("?")
+        params = parse_qs(query)
+        map_size = int(params["map_size"][0]) if "map_size" in params else 1 << 32
+        readonly = params.get("readonly", ["0"])[0].lower() in ("1", "true", "yes")
+        return LmdbBackend(path, map_size=map_size, readonly=readonly)
+    if scheme in ("redis", "resp"):
+        return RespBackend(url)
+    raise ValueError(f"不支持的缓存后端: {url}")
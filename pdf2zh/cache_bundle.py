@@ -0,0 +1,130 @@
+"""
+Export and import of translation memory bundles.
+
+A bundle is a gzip-compressed JSON-lines file: a header line followed by one
+[engine, params, original_text, translation] record per line, sorted so that
+similar entries sit next to each other and compress well. Params are re-normalized
+with TranslationCache._sort_dict_recursively on import, so the keys match the ones
+computed by a running translator.
+"""
+
+import gzip
+import json
+import logging
+from typing import Iterable, Optional
+
+from pdf2zh.cache import (
+    CacheBackend,
+    CacheEntry,
+    TranslationCache,
+    _digest,
+    get_backend,
+)
+
+logger = logging.getLogger(__name__)
+
+BUNDLE_FORMAT = "pdf2zh-cache-bundle"
+BUNDLE_VERSION = 1
+# entries per backend write when importing
+_IMPORT_CHUNK = 5000
+
+
+def _normalize_params(translate_engine_params: str) -> str:
+    params = TranslationCache._sort_dict_recursively(json.loads(translate_engine_params))
+    return json.dumps(params)
+
+
+def _match(params: dict, lang_in: Optional[str], lang_out: Optional[str]) -> bool:
+    if lang_in and str(params.get("lang_in", "")).lower() != lang_in.lower():
+        return False
+    if lang_out and str(params.get("lang_out", "")).lower() != lang_out.lower():
+        return False
+    return True
+
+
+def export_bundle(
+    path: str,
+    translate_engine: str,
+    lang_in: Optional[str] = None,
+    lang_out: Optional[str] = None,
+    backend: Optional[CacheBackend] = None,
+) -> int:
+    """
+    Write the cached translations of one engine (and optionally one language pair,
+    as stored in the cache params, e.g. lang_out="zh-CN" for google) to `path`.
+    Returns the number of exported entries.
+    """
+    backend = backend or get_backend()
+    records = []
+    params_cache = {}
+    for entry in backend.scan(translate_engine):
+        if entry.translate_engine_params not in params_cache:
+            params_cache[entry.translate_engine_params] = _match(
+                json.loads(entry.translate_engine_params), lang_in, lang_out
+            )
+        if params_cache[entry.translate_engine_params]:
+            records.append(
+                (
+                    entry.translate_engine,
+                    entry.translate_engine_params,
+                    entry.original_text,
+                    entry.translation,
+                )
+            )
+    records.sort()
+    header = {
+        "format": BUNDLE_FORMAT,
+        "version": BUNDLE_VERSION,
+        "translate_engine": translate_engine,
+        "lang_in": lang_in,
+        "lang_out": lang_out,
+        "count": len(records),
+    }
+    with gzip.open(path, "wt", encoding="utf-8", compresslevel=9) as f:
+        f.write(json.dumps(header, ensure_ascii=False) + "\n")
+        for record in records:
+            f.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")) + "\n")
+    logger.info(f"Exported {len(records)} cache entries to {path}")
+    return len(records)
+
+
+def _read_bundle(path: str) -> Iterable[CacheEntry]:
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        header = json.loads(f.readline())
+        if header.get("format") != BUNDLE_FORMAT:
+            raise ValueError(f"{path} 不是 pdf2zh 缓存包")
+        if header.get("version", 0) > BUNDLE_VERSION:
+            raise ValueError(f"不支持的缓存包版本: {header.get('version')}")
+        normalized = {}
+        for line in f:
+            translate_engine, translate_engine_params, original_text, translation = json.loads(line)
+            if translate_engine_params not in normalized:
+                normalized[translate_engine_params] = _normalize_params(translate_engine_params)
+            translate_engine_params = normalized[translate_engine_params]
+            yield CacheEntry(
+                _digest(translate_engine, translate_engine_params, original_text),
+                translate_engine,
+                translate_engine_params,
+                original_text,
+                translation,
+            )
+
+
+def import_bundle(path: str, backend: Optional[CacheBackend] = None) -> int:
+    """Load a bundle written by export_bundle into the cache. Returns the number of entries."""
+    backend = backend or get_backend()
+    count = 0
+    chunk = []
+    # the whole bundle goes in as one transaction on backends that support it
+    with backend.transaction():
+        for entry in _read_bundle(path):
+            chunk.append(entry)
+            if len(chunk) >= _IMPORT_CHUNK:
+                backend.set_many(chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            backend.set_many(chunk)
+            count += len(chunk)
+    logger.info(f"Imported {count} cache entries from {path}")
+    return count
@@ -0,0 +1,74 @@
+"""翻译缓存维护命令: python -m pdf2zh.cache_cli <command>"""
+
+import argparse
+import json
+import sys
+
+from pdf2zh import cache
+from pdf2zh.cache_bundle import export_bundle, import_bundle
+
+
+def cmd_stats(args):
+    print(json.dumps(cache.stats(), indent=2))
+
+
+def cmd_evict(args):
+    deleted = cache.evict(max_rows=args.max_rows, max_bytes=args.max_bytes, ttl=args.ttl)
+    print(f"evicted {deleted} entries")
+
+
+def cmd_compact(args):
+    cache.compact(full=args.full, pages_per_step=args.pages_per_step)
+    print("compaction finished")
+
+
+def cmd_export(args):
+    count = export_bundle(args.output, args.engine, args.lang_in, args.lang_out)
+    print(f"exported {count} entries to {args.output}")
+
+
+def cmd_import(args):
+    for path in args.bundles:
+        count = import_bundle(path)
+        print(f"imported {count} entries from {path}")
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pdf2zh.cache_cli", description="pdf2zh 翻译缓存维护")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("stats", help="显示缓存行数和大小")
+    p.set_defaults(func=cmd_stats)
+
+    p = subparsers.add_parser("evict", help="按 TTL 和 LRU 淘汰缓存")
+    p.add_argument("--max-rows", type=int, default=None, help="最多保留的行数")
+    p.add_argument("--max-bytes", type=int, default=None, help="最多保留的字节数")
+    p.add_argument("--ttl", type=int, default=None, help="超过多少秒未访问即过期")
+    p.set_defaults(func=cmd_evict)
+
+    p = subparsers.add_parser("compact", help="回收空闲页并截断 WAL")
+    p.add_argument("--full", action="store_true", help="执行阻塞的完整 VACUUM")
+    p.add_argument("--pages-per-step", type=int, default=256, help="每次增量回收的页数")
+    p.set_defaults(func=cmd_compact)
+
+    p = subparsers.add_parser("export", help="导出某个翻译引擎的缓存包")
+    p.add_argument("engine", help="翻译引擎名称，例如 google")
+    p.add_argument("-o", "--output", required=True, help="输出文件，例如 google-en-zh.jsonl.gz")
+    p.add_argument("--lang-in", default=None, help="源语言（缓存中记录的代码）")
+    p.add_argument("--lang-out", default=None, help="目标语言（缓存中记录的代码，例如 zh-CN）")
+    p.set_defaults(func=cmd_export)
+
+    p = subparsers.add_parser("import", help="导入缓存包以预热缓存")
+    p.add_argument("bundles", nargs="+", help="由 export 生成的缓存包")
+    p.set_defaults(func=cmd_import)
+    return parser
+
+
+def main(args=None) -> int:
+    parsed = create_parser().parse_args(args)
+    parsed.func(parsed)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
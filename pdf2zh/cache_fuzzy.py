@@ -0,0 +1,245 @@
+"""
+Fuzzy translation memory on top of TranslationCache.
+
+Paragraphs are normalized before lookup: whitespace is collapsed, words hyphenated
+at line breaks are joined and formula placeholders are renumbered in order of
+appearance ({v3} ... {v7} -> {v0} ... {v1}). Normalized entries live in their own
+key space of the same backend, so a revised version of a document hits the cache
+even when its formulas are numbered differently. The placeholders of the stored
+translation are mapped back to the numbering of the query.
+
+With minhash=True an in-memory MinHash/LSH index over the normalized source texts
+also finds near-duplicates (a changed word or two) above a similarity threshold.
+"""
+
+import difflib
+import logging
+import re
+import threading
+import zlib
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+_PLACEHOLDER = re.compile(r"\{\s*v([\d\s]+)\}", re.IGNORECASE)
+_HYPHEN_BREAK = re.compile(r"(\w)- (\w)")
+_SPACES = re.compile(r"\s+")
+
+# cache params entry that separates the normalized key space
+NORMALIZED_PARAM = "__normalized__"
+
+
+def normalize(text: str) -> Tuple[str, List[int]]:
+    """Return the normalized text and the original placeholder ids in order of appearance."""
+    text = _SPACES.sub(" ", text).strip()
+    text = _HYPHEN_BREAK.sub(r"\1\2", text)
+    ids: List[int] = []
+
+    def renumber(m):
+        vid = int(m.group(1).replace(" ", ""))
+        if vid not in ids:
+            ids.append(vid)
+        return f"{{v{ids.index(vid)}}}"
+
+    return _PLACEHOLDER.sub(renumber, text), ids
+
+
+def _map_placeholders(text: str, mapping: Dict[int, int]) -> Optional[str]:
+    # placeholders the mapping doesn't know about make the translation unusable
+    failed = False
+
+    def repl(m):
+        nonlocal failed
+        vid = int(m.group(1).replace(" ", ""))
+        if vid not in mapping:
+            failed = True
+            return m.group(0)
+        return f"{{v{mapping[vid]}}}"
+
+    result = _PLACEHOLDER.sub(repl, text)
+    return None if failed else result
+
+
+class MinHashIndex:
+    """MinHash signatures over character shingles, bucketed with LSH bands."""
+
+    def __init__(
+        self,
+        num_perm: int = 64,
+        bands: int = 16,
+        shingle: int = 5,
+        max_entries: int = 200000,
+        seed: int = 1,
+    ):
+        assert num_perm % bands == 0, "num_perm must be a multiple of bands"
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.shingle = shingle
+        self.max_entries = max_entries
+        rng = np.random.default_rng(seed)
+        self._prime = np.uint64((1 << 61) - 1)
+        self._a = rng.integers(1, 1 << 32, num_perm, dtype=np.uint64)
+        self._b = rng.integers(0, 1 << 32, num_perm, dtype=np.uint64)
+        self._buckets: List[Dict[bytes, List[int]]] = [{} for _ in range(bands)]
+        self._texts: List[str] = []
+        self._known: set = set()
+        self._lock = threading.Lock()
+
+    def _signature(self, text: str) -> np.ndarray:
+        n = self.shingle
+        shingles = {text[i : i + n] for i in range(max(1, len(text) - n + 1))}
+        hashes = np.fromiter(
+            (zlib.crc32(s.encode("utf-8")) for s in shingles), dtype=np.uint64, count=len(shingles)
+        )
+        # (a * h + b) mod p for every permutation and shingle, then the minimum per permutation
+        return ((np.outer(self._a, hashes) + self._b[:, None]) % self._prime).min(axis=1)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [
+            signature[i * self.rows : (i + 1) * self.rows].tobytes() for i in range(self.bands)
+        ]
+
+    def add(self, text: str):
+        with self._lock:
+            if text in self._known or len(self._texts) >= self.max_entries:
+                return
+            self._known.add(text)
+            idx = len(self._texts)
+            self._texts.append(text)
+        keys = self._band_keys(self._signature(text))
+        with self._lock:
+            for bucket, key in zip(self._buckets, keys):
+                bucket.setdefault(key, []).append(idx)
+
+    def query(self, text: str, threshold: float) -> Optional[Tuple[str, float]]:
+        """Return the most similar indexed text with a similarity ratio >= threshold."""
+        keys = self._band_keys(self._signature(text))
+        with self._lock:
+            candidates = {i for bucket, key in zip(self._buckets, keys) for i in bucket.get(key, ())}
+            texts = [self._texts[i] for i in candidates]
+        best = None
+        for candidate in texts:
+            matcher = difflib.SequenceMatcher(None, text, candidate, autojunk=False)
+            if matcher.real_quick_ratio() < threshold or matcher.quick_ratio() < threshold:
+                continue
+            ratio = matcher.ratio()
+            if ratio >= threshold and (best is None or ratio > best[1]):
+                best = (candidate, ratio)
+        return best
+
+    def __len__(self):
+        return len(self._texts)
+
+
+class FuzzyMatcher:
+    """Normalized (and optionally near-duplicate) lookups for one TranslationCache."""
+
+    def __init__(self, cache, minhash: bool = False, threshold: float = 0.92):
+        self.cache = cache
+        self.threshold = threshold
+        self.index: Optional[MinHashIndex] = MinHashIndex() if minhash else None
+        # the index is seeded from the backend on a background thread, see _load_index
+        self._index_thread: Optional[threading.Thread] = None
+        self._index_loaded = False
+        self._shadow = None
+        self._shadow_params = None
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.near_hits = 0
+
+    def _shadow_cache(self):
+        from pdf2zh.cache import TranslationCache
+
+        # follow parameter changes made on the parent cache after construction
+        with self._lock:
+            if self._shadow_params != self.cache.translate_engine_params:
+                self._shadow = TranslationCache(
+                    self.cache.translate_engine,
+                    {**self.cache.params, NORMALIZED_PARAM: True},
+                )
+                self._shadow_params = self.cache.translate_engine_params
+                self._index_thread = None
+                self._index_loaded = False
+            return self._shadow
+
+    def _load_index(self, shadow):
+        """
+        Seed the near-duplicate index with normalized texts cached by earlier runs.
+        Runs in the background; lookups meanwhile only see the texts indexed so far.
+        """
+        with self._lock:
+            if self._index_thread is not None:
+                return
+            self._index_thread = threading.Thread(
+                target=self._build_index, args=(shadow,), name="pdf2zh-fuzzy-index", daemon=True
+            )
+        self._index_thread.start()
+
+    def _build_index(self, shadow):
+        from pdf2zh.cache import get_backend
+
+        try:
+            for text in get_backend().scan_texts(
+                shadow.translate_engine, shadow.translate_engine_params
+            ):
+                self.index.add(text)
+                if len(self.index) >= self.index.max_entries:
+                    break
+        except NotImplementedError:
+            pass
+        except Exception as e:
+            logger.debug(f"Error loading fuzzy cache index: {e}")
+        with self._lock:
+            if self._shadow is shadow:
+                self._index_loaded = True
+
+    def get_many(self, original_texts: Iterable[str]) -> Dict[str, str]:
+        shadow = self._shadow_cache()
+        normalized = {text: normalize(text) for text in original_texts}
+        stored = shadow.get_many(n for n, _ in normalized.values())
+        found = {}
+        near: Dict[str, str] = {}
+        hits = near_hits = 0
+        for text, (ntext, ids) in normalized.items():
+            if ntext in stored:
+                translation = _map_placeholders(stored[ntext], dict(enumerate(ids)))
+                if translation is not None:
+                    found[text] = translation
+                    hits += 1
+            elif self.index is not None:
+                self._load_index(shadow)
+                match = self.index.query(ntext, self.threshold)
+                # a near-duplicate must keep the same formulas to be reusable
+                if match and len(normalize(match[0])[1]) == len(ids):
+                    near[text] = match[0]
+        if near:
+            near_stored = shadow.get_many(near.values())
+            for text, ntext in near.items():
+                if ntext not in near_stored:
+                    continue
+                _, ids = normalized[text]
+                translation = _map_placeholders(near_stored[ntext], dict(enumerate(ids)))
+                if translation is not None:
+                    found[text] = translation
+                    near_hits += 1
+                    logger.debug(f"Fuzzy cache near hit: {normalized[text][0]!r} ~ {ntext!r}")
+        # counted once per call so concurrent lookups don't lose increments
+        with self._lock:
+            self.hits += hits
+            self.near_hits += near_hits
+        return found
+
+    def set_many(self, pairs: Iterable[Tuple[str, str]]):
+        shadow = self._shadow_cache()
+        rows = []
+        for original_text, translation in pairs:
+            ntext, ids = normalize(original_text)
+            ntranslation = _map_placeholders(translation, {vid: i for i, vid in enumerate(ids)})
+            if ntranslation is None:
+                continue
+            rows.append((ntext, ntranslation))
+            if self.index is not None:
+                self.index.add(ntext)
+        shadow.set_many(rows)
@@ -1,25 +1,30 @@
 import concurrent.futures
 import logging
 import re
+import time
 import unicodedata
+from collections import deque
 from enum import Enum
 from string import Template
-from typing import Dict
+from typing import Dict, List, Optional
 
-import numpy as np
 from pdfminer.converter import PDFConverter
 from pdfminer.layout import LTChar, LTFigure, LTLine, LTPage
 from pdfminer.pdffont import PDFCIDFont, PDFUnicodeNotDefined
 from pdfminer.pdfinterp import PDFGraphicState, PDFResourceManager
+from pdfminer.psparser import LIT
 from pdfminer.utils import apply_matrix_pt, mult_matrix
 from pymupdf import Font
-from tenacity import retry, wait_fixed
 
 # --- Updated Translator Imports ---
 # Only import BaseTranslator directly and the module containing all translators
 import pdf2zh.translators
 from pdf2zh.translators import BaseTranslator
 # --- End Updated Translator Imports ---
+from pdf2zh.cache import write_behind
+from pdf2zh.ir import Formula, FormulaChar, Line, PageLayout, Paragraph
+from pdf2zh.report import RunReport
+from pdf2zh.scheduler import TranslationScheduler
 
 log = logging.getLogger(__name__)
 
@@ -94,18 +99,6 @@ class PDFConverterEx(PDFConverter):
         return item.adv
 
 
-class Paragraph:
-    def __init__(self, y, x, x0, x1, y0, y1, size, brk):
-        self.y: float = y  # 初始纵坐标
-        self.x: float = x  # 初始横坐标
-        self.x0: float = x0  # 左边界
-        self.x1: float = x1  # 右边界
-        self.y0: float = y0  # 上边界
-        self.y1: float = y1  # 下边界
-        self.size: float = size  # 字体大小
-        self.brk: bool = brk  # 换行标记
-
-
 # fmt: off
 class TranslateConverter(PDFConverterEx):
     def __init__(
@@ -123,8 +116,17 @@ class TranslateConverter(PDFConverterEx):
         envs: Dict = None,
         prompt: Template = None,
         ignore_cache: bool = False,
+        run_report: RunReport = None,
+        ir_load: Optional[List[PageLayout]] = None,
+        ir_dump: Optional[List[PageLayout]] = None,
     ) -> None:
         super().__init__(rsrcmgr)
+        self.report = run_report if run_report is not None else RunReport()
+        # 给出 ir_load 时按顺序与解析出的页面和 form xobject 对应，使用其中的译文重新排版，不调用翻译服务
+        self.ir_load = ir_load
+        self.ir_index = 0
+        # 给出 ir_dump 时依次追加解析出的中间表示，排版后其中已填入译文
+        self.ir_dump = ir_dump
         self.vfont = vfont
         self.vchar = vchar
         self.thread = thread
@@ -134,6 +136,13 @@ class TranslateConverter(PDFConverterEx):
         self.lang_in = lang_in
         self.lang_out = lang_out
         self.translator: BaseTranslator = None
+        self.pending: deque[DeferredOps] = deque()  # 等待排版的页面和 form xobject
+        self.fontmap: dict = {}  # 由 PDFPageInterpreterEx 在每页和每个 form xobject 解析后设置
+        self.fontid: dict = {}
+        # 与插入到页面中的 tiro 字体相同，排版时用来计算拉丁字符宽度
+        self.tiro = rsrcmgr.get_font(None, {
+            "Type": LIT("Font"), "Subtype": LIT("Type1"), "BaseFont": LIT("Times-Roman"), "Encoding": LIT("WinAnsiEncoding")
+        })
         param = service.split(":", 1)
         service_name = param[0]
         service_model = param[1] if len(param) > 1 else None
@@ -166,6 +175,8 @@ class TranslateConverter(PDFConverterEx):
                     prompt=prompt,
                     ignore_cache=ignore_cache
                 )
+                self.translator.report = self.report
+                self.scheduler = TranslationScheduler(self.translator, self.thread, self.report)
                 log.info(f"Using translator: {translator_class.__name__}")
             except Exception as e:
                  log.error(f"Failed to initialize translator {translator_class.__name__}: {e}")
@@ -175,6 +186,25 @@ class TranslateConverter(PDFConverterEx):
              raise ValueError(f"Unsupported translation service: {service_name}")
         # --- End Dynamic Translator Instantiation ---
 
+    def flush_typesetting(self, max_pending: Optional[int] = None):
+        """
+        按顺序排版译文已经就绪的页面和 form xobject；
+        给出 max_pending 时还会等待翻译，直到待排版的数量不超过 max_pending。
+        """
+        while self.pending and (
+            self.pending[0].done()
+            or (max_pending is not None and len(self.pending) > max_pending)
+        ):
+            with self.report.stage("translation"):  # 等待译文的时间计入翻译，排版另行计时
+                self.pending.popleft().resolve()
+
+    def close(self, cancel: bool = False):
+        self.scheduler.close(cancel=cancel)
+        # 缓存由后台线程写入，文档结束时等待写完，并把写入情况记入报告
+        self.translator.cache.flush()
+        self.report.record_cache_writes(write_behind.stats())
+        super().close()
+
     def receive_layout(self, ltpage: LTPage):
         # 段落
         sstk: list[str] = []            # 段落文字栈
@@ -194,7 +224,6 @@ class TranslateConverter(PDFConverterEx):
         xt: LTChar = None               # 上一个字符
         xt_cls: int = -1                # 上一个字符所属段落，保证无论第一个字符属于哪个类别都可以触发新段落
         vmax: float = ltpage.width / 4  # 行内公式最大宽度
-        ops: str = ""                   # 渲染结果
 
         def vflag(font: str, char: str):    # 匹配公式（和角标）字体
             if isinstance(font, bytes):     # 不一定能 decode，直接转 str
@@ -234,15 +263,18 @@ class TranslateConverter(PDFConverterEx):
 
         ############################################################
         # A. 原文档解析
+        # 一次查出所有字符和线条在 layout 中的类别，按出现顺序依次取用
+        # ltpage.height 可能是 fig 里面的高度，坐标统一按 layout 的页面大小截断
+        anchors = [child for child in ltpage if isinstance(child, (LTChar, LTLine))]
+        if anchors:
+            anchor_cls = iter(self.layout[ltpage.pageid].lookup(
+                [child.x0 for child in anchors], [child.y0 for child in anchors]
+            ).tolist())
         for child in ltpage:
             if isinstance(child, LTChar):
                 cur_v = False
-                layout = self.layout[ltpage.pageid]
-                # ltpage.height 可能是 fig 里面的高度，这里统一用 layout.shape
-                h, w = layout.shape
                 # 读取当前字符在 layout 中的类别
-                cx, cy = np.clip(int(child.x0), 0, w - 1), np.clip(int(child.y0), 0, h - 1)
-                cls = layout[cy, cx]
+                cls = next(anchor_cls)
                 # 锚定文档中 bullet 的位置
                 if child.get_text() == "•":
                     cls = 0
@@ -325,12 +357,8 @@ class TranslateConverter(PDFConverterEx):
             elif isinstance(child, LTFigure):   # 图表
                 pass
             elif isinstance(child, LTLine):     # 线条
-                layout = self.layout[ltpage.pageid]
-                # ltpage.height 可能是 fig 里面的高度，这里统一用 layout.shape
-                h, w = layout.shape
                 # 读取当前线条在 layout 中的类别
-                cx, cy = np.clip(int(child.x0), 0, w - 1), np.clip(int(child.y0), 0, h - 1)
-                cls = layout[cy, cx]
+                cls = next(anchor_cls)
                 if vstk and cls == xt_cls:      # 公式线条
                     vlstk.append(child)
                 else:                           # 全局线条
@@ -350,33 +378,64 @@ class TranslateConverter(PDFConverterEx):
             vlen.append(l)
 
         ############################################################
-        # B. 段落翻译
+        # B. 生成中间表示
+        for paragraph, text in zip(pstk, sstk):
+            paragraph.text = text
+        page = PageLayout(
+            pageid=ltpage.pageid,
+            figure=isinstance(ltpage, LTFigure),
+            latin_font="tiro" if "tiro" in self.fontmap else None,
+            paragraphs=pstk,
+            formulas=[
+                Formula(
+                    chars=[FormulaChar.from_ltchar(vch, self.fontid.get(vch.font), isinstance(vch.font, PDFCIDFont)) for vch in v],
+                    lines=[Line.from_ltline(l) for l in varl[id]],
+                    offset=varf[id],
+                    width=vlen[id],
+                )
+                for id, v in enumerate(var)
+            ],
+            lines=[Line.from_ltline(l) for l in lstk],
+        )
+
+        ############################################################
+        # C. 段落翻译
         log.debug("\n==========[SSTACK]==========\n")
+        t_translate = time.perf_counter()
+        if self.ir_load is not None:
+            pending = self.load_translations(page)
+        else:
+            pending = self.scheduler.submit(page.texts())  # 译文在后台翻译，排版延迟到译文就绪之后
+        self.report.add_stage("translation", time.perf_counter() - t_translate)
+        if self.ir_dump is not None:
+            self.ir_dump.append(page)
+
+        # form xobject 排版失败时跳过（与原先解析时的处理一致），页面排版失败则报错
+        deferred = DeferredOps(page, pending, self.typeset)
+        self.pending.append(deferred)
+        return deferred
+
+    def load_translations(self, page: PageLayout) -> concurrent.futures.Future:
+        """从 ir_load 中取出与 page 对应的译文，原文对不上时按原文排版"""
+        saved = self.ir_load[self.ir_index] if self.ir_index < len(self.ir_load) else None
+        self.ir_index += 1
+        future = concurrent.futures.Future()
+        if saved is None or saved.texts() != page.texts():
+            log.warning(f"IR does not match page {page.pageid} (figure={page.figure}), keeping source text")
+            future.set_result([None] * len(page.paragraphs))
+        else:
+            future.set_result([p.translation for p in saved.paragraphs])
+        return future
 
-        @retry(wait=wait_fixed(1))
-        def worker(s: str):  # 多线程翻译
-            if not s.strip() or re.match(r"^\{v\d+\}$", s):  # 空白和公式不翻译
-                return s
-            try:
-                new = self.translator.translate(s)
-                return new
-            except BaseException as e:
-                if log.isEnabledFor(logging.DEBUG):
-                    log.exception(e)
-                else:
-                    log.exception(e, exc_info=False)
-                raise e
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.thread
-        ) as executor:
-            news = list(executor.map(worker, sstk))
+    def typeset(self, page: PageLayout) -> str:
+        """D. 新文档排版：根据中间表示和其中的译文生成指令流，没有译文的段落按原文排版"""
+        t_typeset = time.perf_counter()
+        lines = list(page.lines)  # 调试模式会追加轨迹线条，不修改中间表示
 
-        ############################################################
-        # C. 新文档排版
-        def raw_string(fcur: str, cstk: str):  # 编码字符串
+        def raw_string(fcur: str, cstk: str, cid_font: bool = False):  # 编码字符串
             if fcur == self.noto_name:
                 return "".join(["%04x" % self.noto.has_glyph(ord(c)) for c in cstk])
-            elif isinstance(self.fontmap[fcur], PDFCIDFont):  # 判断编码长度
+            elif cid_font:  # 判断编码长度
                 return "".join(["%04x" % ord(c) for c in cstk])
             else:
                 return "".join(["%02x" % ord(c) for c in cstk])
@@ -396,21 +455,22 @@ class TranslateConverter(PDFConverterEx):
         def gen_op_line(x, y, xlen, ylen, linewidth):
             return f"ET q 1 0 0 1 {x:f} {y:f} cm [] 0 d 0 J {linewidth:f} w 0 0 m {xlen:f} {ylen:f} l S Q BT "
 
-        for id, new in enumerate(news):
-            x: float = pstk[id].x                       # 段落初始横坐标
-            y: float = pstk[id].y                       # 段落初始纵坐标
-            x0: float = pstk[id].x0                     # 段落左边界
-            x1: float = pstk[id].x1                     # 段落右边界
-            height: float = pstk[id].y1 - pstk[id].y0   # 段落高度
-            size: float = pstk[id].size                 # 段落字体大小
-            brk: bool = pstk[id].brk                    # 段落换行标记
-            cstk: str = ""                              # 当前文字栈
-            fcur: str = None                            # 当前字体 ID
-            lidx = 0                                    # 记录换行次数
+        for paragraph in page.paragraphs:
+            new: str = paragraph.text if paragraph.translation is None else paragraph.translation
+            x: float = paragraph.x                          # 段落初始横坐标
+            y: float = paragraph.y                          # 段落初始纵坐标
+            x0: float = paragraph.x0                        # 段落左边界
+            x1: float = paragraph.x1                        # 段落右边界
+            height: float = paragraph.y1 - paragraph.y0     # 段落高度
+            size: float = paragraph.size                    # 段落字体大小
+            brk: bool = paragraph.brk                       # 段落换行标记
+            cstk: str = ""                                  # 当前文字栈
+            fcur: str = None                                # 当前字体 ID
+            lidx = 0                                        # 记录换行次数
             tx = x
             fcur_ = fcur
             ptr = 0
-            log.debug(f"< {y} {x} {x0} {x1} {size} {brk} > {sstk[id]} | {new}")
+            log.debug(f"< {y} {x} {x0} {x1} {size} {brk} > {paragraph.text} | {new}")
 
             ops_vals: list[dict] = []
 
@@ -423,17 +483,18 @@ class TranslateConverter(PDFConverterEx):
                     ptr += len(vy_regex.group(0))
                     try:
                         vid = int(vy_regex.group(1).replace(" ", ""))
-                        adv = vlen[vid]
+                        formula = page.formulas[vid]
+                        adv = formula.width
                     except Exception:
                         continue  # 翻译器可能会自动补个越界的公式标记
-                    if var[vid][-1].get_text() and unicodedata.category(var[vid][-1].get_text()[0]) in ["Lm", "Mn", "Sk"]:  # 文字修饰符
-                        mod = var[vid][-1].width
+                    if formula.chars[-1].text and unicodedata.category(formula.chars[-1].text[0]) in ["Lm", "Mn", "Sk"]:  # 文字修饰符
+                        mod = formula.chars[-1].width
                 else:  # 加载文字
                     ch = new[ptr]
                     fcur_ = None
                     try:
-                        if fcur_ is None and self.fontmap["tiro"].to_unichr(ord(ch)) == ch:
-                            fcur_ = "tiro"  # 默认拉丁字体
+                        if fcur_ is None and page.latin_font and self.tiro.to_unichr(ord(ch)) == ch:
+                            fcur_ = page.latin_font  # 默认拉丁字体
                     except Exception:
                         pass
                     if fcur_ is None:
@@ -441,7 +502,7 @@ class TranslateConverter(PDFConverterEx):
                     if fcur_ == self.noto_name: # FIXME: change to CONST
                         adv = self.noto.char_lengths(ch, size)[0]
                     else:
-                        adv = self.fontmap[fcur_].char_width(ord(ch)) * size
+                        adv = self.tiro.char_width(ord(ch)) * size
                     ptr += 1
                 if (                                # 输出文字缓冲区
                     fcur_ != fcur                   # 1. 字体更新
@@ -465,30 +526,32 @@ class TranslateConverter(PDFConverterEx):
                 if vy_regex:  # 插入公式
                     fix = 0
                     if fcur is not None:  # 段落内公式修正纵向偏移
-                        fix = varf[vid]
-                    for vch in var[vid]:  # 排版公式字符
-                        vc = chr(vch.cid)
+                        fix = formula.offset
+                    origin = formula.chars[0]
+                    for vch in formula.chars:  # 排版公式字符
+                        if vch.font is None:
+                            raise KeyError(f"font of formula character {vch.text!r} not found in resources")
                         ops_vals.append({
                             "type": OpType.TEXT,
-                            "font": self.fontid[vch.font],
+                            "font": vch.font,
                             "size": vch.size,
-                            "x": x + vch.x0 - var[vid][0].x0,
-                            "dy": fix + vch.y0 - var[vid][0].y0,
-                            "rtxt": raw_string(self.fontid[vch.font], vc),
+                            "x": x + vch.x0 - origin.x0,
+                            "dy": fix + vch.y0 - origin.y0,
+                            "rtxt": raw_string(vch.font, chr(vch.cid), vch.cid_font),
                             "lidx": lidx
                         })
                         if log.isEnabledFor(logging.DEBUG):
-                            lstk.append(LTLine(0.1, (_x, _y), (x + vch.x0 - var[vid][0].x0, fix + y + vch.y0 - var[vid][0].y0)))
-                            _x, _y = x + vch.x0 - var[vid][0].x0, fix + y + vch.y0 - var[vid][0].y0
-                    for l in varl[vid]:  # 排版公式线条
+                            lines.append(Line(_x, _y, x + vch.x0 - origin.x0, fix + y + vch.y0 - origin.y0, 0.1))
+                            _x, _y = x + vch.x0 - origin.x0, fix + y + vch.y0 - origin.y0
+                    for l in formula.lines:  # 排版公式线条
                         if l.linewidth < 5:  # hack 有的文档会用粗线条当图片背景
                             ops_vals.append({
                                 "type": OpType.LINE,
-                                "x": l.pts[0][0] + x - var[vid][0].x0,
-                                "dy": l.pts[0][1] + fix - var[vid][0].y0,
+                                "x": l.x0 + x - origin.x0,
+                                "dy": l.y0 + fix - origin.y0,
                                 "linewidth": l.linewidth,
-                                "xlen": l.pts[1][0] - l.pts[0][0],
-                                "ylen": l.pts[1][1] - l.pts[0][1],
+                                "xlen": l.x1 - l.x0,
+                                "ylen": l.y1 - l.y0,
                                 "lidx": lidx
                             })
                 else:  # 插入文字缓冲区
@@ -504,7 +567,7 @@ class TranslateConverter(PDFConverterEx):
                 fcur = fcur_
                 x += adv
                 if log.isEnabledFor(logging.DEBUG):
-                    lstk.append(LTLine(0.1, (_x, _y), (x, y)))
+                    lines.append(Line(_x, _y, x, y, 0.1))
                     _x, _y = x, y
             # 处理结尾
             if cstk:
@@ -529,14 +592,50 @@ class TranslateConverter(PDFConverterEx):
                 elif vals["type"] == OpType.LINE:
                     ops_list.append(gen_op_line(vals["x"], vals["dy"] + y - vals["lidx"] * size * line_height, vals["xlen"], vals["ylen"], vals["linewidth"]))
 
-        for l in lstk:  # 排版全局线条
+        for l in lines:  # 排版全局线条
             if l.linewidth < 5:  # hack 有的文档会用粗线条当图片背景
-                ops_list.append(gen_op_line(l.pts[0][0], l.pts[0][1], l.pts[1][0] - l.pts[0][0], l.pts[1][1] - l.pts[0][1], l.linewidth))
+                ops_list.append(gen_op_line(l.x0, l.y0, l.x1 - l.x0, l.y1 - l.y0, l.linewidth))
 
         ops = f"BT {''.join(ops_list)}ET "
+        self.report.add_stage("typesetting", time.perf_counter() - t_typeset)
         return ops
 
 
+class DeferredOps:
+    """
+    receive_layout 返回的指令流。页面解析完成时译文可能还没有返回，
+    resolve() 等待译文填入中间表示后再排版，结果会被缓存。
+    """
+
+    def __init__(self, page: PageLayout, future: concurrent.futures.Future, typeset):
+        self.page = page    # 填入译文后可以用 TranslateConverter.typeset 重新排版
+        self.prefix = ""
+        self.optional = page.figure  # 为真时排版出错返回 None
+        self._future = future
+        self._typeset = typeset
+        self._ops: Optional[str] = None
+
+    def prepend(self, prefix: str) -> "DeferredOps":
+        self.prefix = prefix + self.prefix
+        return self
+
+    def done(self) -> bool:
+        return self._typeset is None or self._future.done()
+
+    def resolve(self) -> Optional[str]:
+        if self._typeset is not None:
+            typeset, self._typeset = self._typeset, None
+            try:
+                self.page.set_translations(self._future.result())
+                self._ops = typeset(self.page)
+            except Exception:
+                if not self.optional:
+                    raise
+            finally:
+                self._future = None
+        return None if self._ops is None else self.prefix + self._ops
+
+
 class OpType(Enum):
     TEXT = "text"
     LINE = "line"
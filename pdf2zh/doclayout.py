@@ -1,5 +1,10 @@
 import abc
+import hashlib
+import logging
 import os.path
+import platform
+import threading
+from pathlib import Path
 
 import cv2
 import numpy as np
@@ -7,7 +12,7 @@ import ast
 from babeldoc.assets.assets import get_doclayout_onnx_model_path
 
 try:
-    import onnx
+    import onnx  # noqa: F401
     import onnxruntime
 except ImportError as e:
     if "DLL load failed" in str(e):
@@ -21,6 +26,137 @@ from huggingface_hub import hf_hub_download
 
 from pdf2zh.config import ConfigManager
 
+logger = logging.getLogger(__name__)
+
+_OPTIMIZATION_LEVELS = {
+    "disable": onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL,
+    "basic": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_BASIC,
+    "extended": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_EXTENDED,
+    "all": onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL,
+}
+
+
+def _setting(key: str, default, convert=str):
+    value = ConfigManager.get(f"PDF2ZH_ONNX_{key}")
+    return convert(value) if value not in (None, "") else default
+
+
+def _flag(value) -> bool:
+    return str(value).lower() in ("1", "true", "yes", "on")
+
+
+def session_options() -> onnxruntime.SessionOptions:
+    """
+    SessionOptions configured by PDF2ZH_ONNX_INTRA_THREADS / _INTER_THREADS (0 lets
+    onnxruntime decide), _EXECUTION_MODE (sequential or parallel), _MEM_ARENA (1 or 0)
+    and _OPT_LEVEL (disable, basic, extended or all).
+    """
+    options = onnxruntime.SessionOptions()
+    options.intra_op_num_threads = _setting("INTRA_THREADS", 0, int)
+    options.inter_op_num_threads = _setting("INTER_THREADS", 0, int)
+    if _setting("EXECUTION_MODE", "sequential").lower() == "parallel":
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_PARALLEL
+    else:
+        options.execution_mode = onnxruntime.ExecutionMode.ORT_SEQUENTIAL
+    options.enable_cpu_mem_arena = _setting("MEM_ARENA", True, _flag)
+    options.graph_optimization_level = _OPTIMIZATION_LEVELS[_setting("OPT_LEVEL", "all").lower()]
+    return options
+
+
+def int8_model_path() -> Path:
+    """Location of the quantized layout model, PDF2ZH_ONNX_INT8_PATH overrides the default."""
+    return _setting("INT8_PATH", Path.home() / ".cache" / "pdf2zh" / "doclayout-int8.onnx", Path)
+
+
+def _file_digest(path, cache_dir: Path) -> str:
+    """
+    Hash of the model file. The hash is remembered in cache_dir next to the optimized
+    graphs together with the file's size and mtime, and only recomputed when those change.
+    """
+    path = Path(path).resolve()
+    stat = path.stat()
+    stamp = f"{stat.st_size} {stat.st_mtime_ns}"
+    name = hashlib.blake2b(str(path).encode(), digest_size=8).hexdigest()
+    record = cache_dir / f"{path.stem}-{name}.digest"
+    try:
+        saved_stamp, saved_digest = record.read_text().rsplit(" ", 1)
+        if saved_stamp == stamp:
+            return saved_digest
+    except (OSError, ValueError):
+        pass
+
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        tmp = record.with_name(f"{record.name}.{os.getpid()}.tmp")
+        tmp.write_text(f"{stamp} {digest.hexdigest()}")
+        os.replace(tmp, record)
+    except OSError as e:
+        logger.warning(f"Failed to record model digest at {record}: {e}")
+    return digest.hexdigest()
+
+
+def _is_shape_error(e: Exception) -> bool:
+    """onnxruntime errors raised when a graph exported with a fixed batch size gets a larger batch"""
+    message = str(e).lower()
+    return any(word in message for word in ("invalid dimensions", "shape", "dimension"))
+
+
+def create_session(model_path, providers=None) -> onnxruntime.InferenceSession:
+    """
+    Create an InferenceSession straight from the model file.
+
+    The optimized graph is saved under PDF2ZH_ONNX_CACHE_DIR (default ~/.cache/pdf2zh/onnx),
+    keyed by the hash of the model (recomputed only when its size or mtime changes), the
+    optimization level, the onnxruntime version, the machine and the providers, and later
+    sessions load it without optimizing again.
+    Set PDF2ZH_ONNX_GRAPH_CACHE=0 to disable the cache.
+    """
+    options = session_options()
+    level = options.graph_optimization_level
+    if (
+        not _setting("GRAPH_CACHE", True, _flag)
+        or level == onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+    ):
+        return onnxruntime.InferenceSession(str(model_path), options, providers=providers)
+
+    cache_dir = _setting("CACHE_DIR", Path.home() / ".cache" / "pdf2zh" / "onnx", Path)
+    key = hashlib.blake2b(
+        "|".join(
+            [
+                _file_digest(model_path, cache_dir),
+                str(level),
+                onnxruntime.__version__,
+                platform.machine(),
+                str(providers),
+            ]
+        ).encode(),
+        digest_size=16,
+    ).hexdigest()
+    cached = cache_dir / f"{Path(model_path).stem}-{key}.onnx"
+    if cached.exists():
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_DISABLE_ALL
+        try:
+            return onnxruntime.InferenceSession(str(cached), options, providers=providers)
+        except Exception as e:
+            logger.warning(f"Discarding unusable optimized model {cached}: {e}")
+            cached.unlink(missing_ok=True)
+            options = session_options()
+
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    tmp = cached.with_name(f"{cached.name}.{os.getpid()}.tmp")
+    options.optimized_model_filepath = str(tmp)
+    session = onnxruntime.InferenceSession(str(model_path), options, providers=providers)
+    try:
+        os.replace(tmp, cached)
+    except OSError as e:
+        logger.warning(f"Failed to cache optimized model at {cached}: {e}")
+        tmp.unlink(missing_ok=True)
+    return session
+
 
 class DocLayoutModel(abc.ABC):
     @staticmethod
@@ -28,8 +164,23 @@ class DocLayoutModel(abc.ABC):
         model = OnnxModel.from_pretrained()
         return model
 
+    @staticmethod
+    def load_int8():
+        return OnnxModel.from_quantized()
+
     @staticmethod
     def load_available():
+        """
+        The FP32 model, or with PDF2ZH_ONNX_PRECISION=int8 the quantized model
+        created by `python -m pdf2zh.quantize` when it exists.
+        """
+        if _setting("PRECISION", "fp32").lower() == "int8":
+            if int8_model_path().exists():
+                return DocLayoutModel.load_int8()
+            logger.warning(
+                f"INT8 layout model not found at {int8_model_path()}, "
+                "run `python -m pdf2zh.quantize` to create it. Using the FP32 model."
+            )
         return DocLayoutModel.load_onnx()
 
     @property
@@ -50,85 +201,156 @@ class DocLayoutModel(abc.ABC):
         """
         pass
 
+    def predict_batch(self, images, imgsz=1024, **kwargs) -> list:
+        """
+        Predict the layout of several document pages, one result per image.
 
-class YoloResult:
-    """Helper class to store detection results from ONNX model."""
+        Args:
+            images: The images of the document pages.
+            imgsz: Resize the images to this size, either one size for all images or one per image.
+            **kwargs: Additional arguments.
+        """
+        if isinstance(imgsz, int):
+            imgsz = [imgsz] * len(images)
+        return [self.predict(image, imgsz=size, **kwargs)[0] for image, size in zip(images, imgsz)]
 
-    def __init__(self, boxes, names):
-        self.boxes = [YoloBox(data=d) for d in boxes]
-        self.boxes.sort(key=lambda x: x.conf, reverse=True)
-        self.names = names
+
+# one detection per record, sorted by confidence, highest first
+BOX_DTYPE = np.dtype([("xyxy", np.float32, (4,)), ("conf", np.float32), ("cls", np.float32)])
 
 
-class YoloBox:
-    """Helper class to store detection results from ONNX model."""
+class YoloResult:
+    """
+    Detection results from ONNX model.
+
+    `boxes` is a record array with the fields of BOX_DTYPE, so `boxes.xyxy` is an (N, 4) array
+    while iterating it still yields boxes with `.xyxy`, `.conf` and `.cls` as in babeldoc's results.
+    """
 
-    def __init__(self, data):
-        self.xyxy = data[:4]
-        self.conf = data[-2]
-        self.cls = data[-1]
+    def __init__(self, boxes, names):
+        boxes = np.asarray(boxes).reshape(-1, np.shape(boxes)[-1])
+        order = np.argsort(-boxes[:, -2], kind="stable")
+        self.boxes = np.empty(len(order), dtype=BOX_DTYPE).view(np.recarray)
+        self.boxes.xyxy = boxes[order, :4]
+        self.boxes.conf = boxes[order, -2]
+        self.boxes.cls = boxes[order, -1]
+        self.names = names
 
 
 class OnnxModel(DocLayoutModel):
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, providers=None):
         self.model_path = model_path
 
-        model = onnx.load(model_path)
-        metadata = {d.key: d.value for d in model.metadata_props}
+        self.model = create_session(model_path, providers)
+        metadata = self.model.get_modelmeta().custom_metadata_map
         self._stride = ast.literal_eval(metadata["stride"])
         self._names = ast.literal_eval(metadata["names"])
-
-        self.model = onnxruntime.InferenceSession(model.SerializeToString())
+        # models exported with a fixed batch size of 1 can only run one page per call
+        self._batched = not isinstance(self.model.get_inputs()[0].shape[0], int)
+        # per-thread input buffer, grown to the largest batch seen and reused afterwards
+        self._local = threading.local()
 
     @staticmethod
     def from_pretrained():
         pth = get_doclayout_onnx_model_path()
         return OnnxModel(pth)
 
+    @staticmethod
+    def from_quantized():
+        return OnnxModel(int8_model_path())
+
     @property
     def stride(self):
         return self._stride
 
-    def resize_and_pad_image(self, image, new_shape):
+    def letterbox(self, shape, new_shape):
         """
-        Resize and pad the image to the specified size, ensuring dimensions are multiples of stride.
-
-        Parameters:
-        - image: Input image
-        - new_shape: Target size (integer or (height, width) tuple)
-        - stride: Padding alignment stride, default 32
+        Geometry of resize_and_pad_image for an image of the given (height, width).
 
         Returns:
-        - Processed image
+        - (resized_h, resized_w): size of the resized image
+        - (top, left): offset of the resized image in the padded one
+        - (padded_h, padded_w): size of the padded image
         """
         if isinstance(new_shape, int):
             new_shape = (new_shape, new_shape)
 
-        h, w = image.shape[:2]
+        h, w = shape[:2]
         new_h, new_w = new_shape
 
         # Calculate scaling ratio
         r = min(new_h / h, new_w / w)
         resized_h, resized_w = int(round(h * r)), int(round(w * r))
 
+        # Calculate padding size and align to stride multiple
+        pad_w = (new_w - resized_w) % self.stride
+        pad_h = (new_h - resized_h) % self.stride
+        return (
+            (resized_h, resized_w),
+            (pad_h // 2, pad_w // 2),
+            (resized_h + pad_h, resized_w + pad_w),
+        )
+
+    def resize_and_pad_image(self, image, new_shape):
+        """
+        Resize and pad the image to the specified size, ensuring dimensions are multiples of stride.
+
+        Parameters:
+        - image: Input image
+        - new_shape: Target size (integer or (height, width) tuple)
+
+        Returns:
+        - Processed image
+        """
+        (resized_h, resized_w), (top, left), (padded_h, padded_w) = self.letterbox(
+            image.shape, new_shape
+        )
+
         # Resize image
         image = cv2.resize(
             image, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR
         )
 
-        # Calculate padding size and align to stride multiple
-        pad_w = (new_w - resized_w) % self.stride
-        pad_h = (new_h - resized_h) % self.stride
-        top, bottom = pad_h // 2, pad_h - pad_h // 2
-        left, right = pad_w // 2, pad_w - pad_w // 2
-
         # Add padding
         image = cv2.copyMakeBorder(
-            image, top, bottom, left, right, cv2.BORDER_CONSTANT, value=(114, 114, 114)
+            image,
+            top,
+            padded_h - resized_h - top,
+            left,
+            padded_w - resized_w - left,
+            cv2.BORDER_CONSTANT,
+            value=(114, 114, 114),
         )
 
         return image
 
+    def preprocess(self, images, imgsz):
+        """
+        Letterbox the images straight into a reused float32 NCHW buffer, normalized to [0, 1].
+        Images smaller than the batch are padded at the bottom and right, which leaves
+        box coordinates unaffected.
+
+        Returns the input tensor, a view of the buffer valid until the next call
+        from the same thread, and the letterboxed (height, width) of every image.
+        """
+        geometry = [self.letterbox(image.shape, size) for image, size in zip(images, imgsz)]
+        batch_h = max(padded[0] for _, _, padded in geometry)
+        batch_w = max(padded[1] for _, _, padded in geometry)
+        size = len(images) * 3 * batch_h * batch_w
+        buffer = getattr(self._local, "buffer", None)
+        if buffer is None or buffer.size < size:
+            buffer = self._local.buffer = np.empty(size, dtype=np.float32)
+        pix = buffer[:size].reshape(len(images), 3, batch_h, batch_w)
+        pix.fill(114)
+        for dst, image, ((resized_h, resized_w), (top, left), _) in zip(pix, images, geometry):
+            if image.shape[:2] != (resized_h, resized_w):
+                image = cv2.resize(
+                    image, (resized_w, resized_h), interpolation=cv2.INTER_LINEAR
+                )
+            dst[:, top : top + resized_h, left : left + resized_w] = image.transpose(2, 0, 1)
+        pix /= 255.0
+        return pix, [padded for _, _, padded in geometry]
+
     def scale_boxes(self, img1_shape, boxes, img0_shape):
         """
         Rescales bounding boxes (in the format of xyxy by default) from the shape of the image they were originally
@@ -155,24 +377,43 @@ class OnnxModel(DocLayoutModel):
         boxes[..., :4] = (boxes[..., :4] - [pad_x, pad_y, pad_x, pad_y]) / gain
         return boxes
 
+    def postprocess(self, pred, img1_shape, img0_shape):
+        pred = pred[pred[..., 4] > 0.25]
+        pred[..., :4] = self.scale_boxes(img1_shape, pred[..., :4], img0_shape)
+        return YoloResult(boxes=pred, names=self._names)
+
     def predict(self, image, imgsz=1024, **kwargs):
-        # Preprocess input image
-        orig_h, orig_w = image.shape[:2]
-        pix = self.resize_and_pad_image(image, new_shape=imgsz)
-        pix = np.transpose(pix, (2, 0, 1))  # CHW
-        pix = np.expand_dims(pix, axis=0)  # BCHW
-        pix = pix.astype(np.float32) / 255.0  # Normalize to [0, 1]
-        new_h, new_w = pix.shape[2:]
-
-        # Run inference
+        pix, shapes = self.preprocess([image], [imgsz])
         preds = self.model.run(None, {"images": pix})[0]
+        return [self.postprocess(preds[0], shapes[0], image.shape[:2])]
 
-        # Postprocess predictions
-        preds = preds[preds[..., 4] > 0.25]
-        preds[..., :4] = self.scale_boxes(
-            (new_h, new_w), preds[..., :4], (orig_h, orig_w)
-        )
-        return [YoloResult(boxes=preds, names=self._names)]
+    def predict_batch(self, images, imgsz=1024, **kwargs):
+        """
+        Predict the layout of several pages with a single inference call.
+        Every image is letterboxed as in predict() and then padded at the bottom and right
+        to the largest shape in the batch, so box coordinates are unaffected by the padding.
+        """
+        if isinstance(imgsz, int):
+            imgsz = [imgsz] * len(images)
+        if len(images) <= 1 or not self._batched:
+            return super().predict_batch(images, imgsz, **kwargs)
+        pix, shapes = self.preprocess(images, imgsz)
+
+        try:
+            preds = self.model.run(None, {"images": pix})[0]
+        except Exception as e:
+            if _is_shape_error(e):
+                # the exported graph does not accept a batch dimension after all
+                logger.warning(f"Layout model rejected a batch of {len(images)} pages, running one page at a time: {e}")
+                self._batched = False
+            else:
+                logger.warning(f"Batched layout detection failed, retrying one page at a time: {e}")
+            return super().predict_batch(images, imgsz, **kwargs)
+
+        return [
+            self.postprocess(pred, shape, image.shape[:2])
+            for pred, shape, image in zip(preds, shapes, images)
+        ]
 
 
 class ModelInstance:
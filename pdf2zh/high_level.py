@@ -6,8 +6,11 @@ import os
 import re
 import sys
 import tempfile
+import time
 import logging
 from asyncio import CancelledError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from string import Template
 from typing import Any, BinaryIO, List, Optional, Dict
@@ -22,9 +25,12 @@ from pdfminer.pdfpage import PDFPage
 from pdfminer.pdfparser import PDFParser
 from pymupdf import Document, Font
 
-from pdf2zh.converter import TranslateConverter
+from pdf2zh.converter import DeferredOps, TranslateConverter
 from pdf2zh.doclayout import OnnxModel
+from pdf2zh.ir import PageLayout, dump_pages, load_pages
+from pdf2zh.layout_map import LayoutMap
 from pdf2zh.pdfinterp import PDFPageInterpreterEx
+from pdf2zh.report import RunReport
 
 from pdf2zh.config import ConfigManager
 from babeldoc.assets.assets import get_font_and_metadata
@@ -67,6 +73,24 @@ def check_files(files: List[str]) -> List[str]:
     return missing_files
 
 
+def layout_mask(model, image: np.ndarray, height: int, scale: int = 1) -> LayoutMap:
+    """版面分析，返回每个像素所属版面块的编号图：0 为不翻译的区域，1 为未识别的区域"""
+    return layout_masks(model, [image], [height], scale)[0]
+
+
+def layout_masks(model, images: List[np.ndarray], heights: List[int], scale: int = 1) -> List[LayoutMap]:
+    """多页一起进行版面分析，模型没有 predict_batch（如 babeldoc 的模型）时逐页分析"""
+    imgsz = [int(height / 32) * 32 for height in heights]
+    if len(images) > 1 and hasattr(model, "predict_batch"):
+        results = model.predict_batch(images, imgsz=imgsz)
+    else:
+        results = [model.predict(image, imgsz=size)[0] for image, size in zip(images, imgsz)]
+    return [
+        LayoutMap.from_result(page_layout, image.shape[:2], scale)
+        for page_layout, image in zip(results, images)
+    ]
+
+
 def translate_patch(
     inf: BinaryIO,
     pages: Optional[list[int]] = None,
@@ -85,6 +109,9 @@ def translate_patch(
     envs: Dict = None,
     prompt: Template = None,
     ignore_cache: bool = False,
+    run_report: RunReport = None,
+    ir_load: Optional[List[PageLayout]] = None,
+    ir_dump: Optional[List[PageLayout]] = None,
     **kwarg: Any,
 ) -> None:
     rsrcmgr = PDFResourceManager()
@@ -103,7 +130,11 @@ def translate_patch(
         envs,
         prompt,
         ignore_cache,
+        run_report,
+        ir_load,
+        ir_dump,
     )
+    run_report = device.report
 
     assert device is not None
     obj_patch = {}
@@ -113,55 +144,95 @@ def translate_patch(
     else:
         total_pages = doc_zh.page_count
 
-    parser = PDFParser(inf)
-    doc = PDFDocument(parser)
-    with tqdm.tqdm(total=total_pages) as progress:
-        for pageno, page in enumerate(PDFPage.create_pages(doc)):
-            if cancellation_event and cancellation_event.is_set():
-                raise CancelledError("task cancelled")
-            if pages and (pageno not in pages):
-                continue
-            progress.update()
-            if callback:
-                callback(progress)
-            page.pageno = pageno
+    # 流水线：渲染（主线程，PyMuPDF 不支持多线程）-> 版面分析（后台线程，每批最多 batch_size 页，
+    # 最多提前 depth 页）-> pdfminer 解析（主线程）-> 翻译（converter 的调度器）-> 排版（主线程，按页面顺序）
+    depth = max(1, int(ConfigManager.get("PDF2ZH_PIPELINE_DEPTH") or 2))
+    # 一次推理的页数和模型输入（float32）大小上限，没有 predict_batch 的模型逐页推理
+    batch_size = max(1, int(ConfigManager.get("PDF2ZH_LAYOUT_BATCH") or 4))
+    if not hasattr(model, "predict_batch"):
+        batch_size = 1
+    batch_bytes = max(1.0, float(ConfigManager.get("PDF2ZH_LAYOUT_BATCH_MB") or 256)) * (1 << 20)
+    # 版面块编号图每 scale x scale 个像素存一个编号，默认逐像素
+    layout_scale = max(1, int(ConfigManager.get("PDF2ZH_LAYOUT_SCALE") or 1))
+    # 已解析但尚未排版的页面和 form xobject 数量上限，超过时等待翻译
+    max_pending = max(1, int(ConfigManager.get("PDF2ZH_MAX_PENDING_PAGES") or 16))
+    layout_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="pdf2zh-layout")
+    chunk = []  # 已渲染、等待凑成一批的 (page, image, height)
+    queued = deque()  # (page, 版面分析 Future, 在该批中的序号)
+
+    def check_cancelled():
+        if cancellation_event and cancellation_event.is_set():
+            raise CancelledError("task cancelled")
+
+    def render(page):
+        with run_report.stage("render"):
             pix = doc_zh[page.pageno].get_pixmap()
-            image = np.fromstring(pix.samples, np.uint8).reshape(
+            image = np.frombuffer(pix.samples, np.uint8).reshape(
                 pix.height, pix.width, 3
             )[:, :, ::-1]
-            page_layout = model.predict(image, imgsz=int(pix.height / 32) * 32)[0]
-            # kdtree 是不可能 kdtree 的，不如直接渲染成图片，用空间换时间
-            box = np.ones((pix.height, pix.width))
-            h, w = box.shape
-            vcls = ["abandon", "figure", "table", "isolate_formula", "formula_caption"]
-            for i, d in enumerate(page_layout.boxes):
-                if page_layout.names[int(d.cls)] not in vcls:
-                    x0, y0, x1, y1 = d.xyxy.squeeze()
-                    x0, y0, x1, y1 = (
-                        np.clip(int(x0 - 1), 0, w - 1),
-                        np.clip(int(h - y1 - 1), 0, h - 1),
-                        np.clip(int(x1 + 1), 0, w - 1),
-                        np.clip(int(h - y0 + 1), 0, h - 1),
-                    )
-                    box[y0:y1, x0:x1] = i + 2
-            for i, d in enumerate(page_layout.boxes):
-                if page_layout.names[int(d.cls)] in vcls:
-                    x0, y0, x1, y1 = d.xyxy.squeeze()
-                    x0, y0, x1, y1 = (
-                        np.clip(int(x0 - 1), 0, w - 1),
-                        np.clip(int(h - y1 - 1), 0, h - 1),
-                        np.clip(int(x1 + 1), 0, w - 1),
-                        np.clip(int(h - y0 + 1), 0, h - 1),
-                    )
-                    box[y0:y1, x0:x1] = 0
-            layout[page.pageno] = box
-            # 新建一个 xref 存放新指令流
-            page.page_xref = doc_zh.get_new_xref()  # hack 插入页面的新 xref
-            doc_zh.update_object(page.page_xref, "<<>>")
-            doc_zh.update_stream(page.page_xref, b"")
-            doc_zh[page.pageno].set_contents(page.page_xref)
+        chunk.append((page, image, pix.height))
+        if len(chunk) >= batch_size or sum(item[1].size * 4 for item in chunk) >= batch_bytes:
+            submit_chunk()
+
+    def submit_chunk():
+        if not chunk:
+            return
+        items = chunk[:]
+        chunk.clear()
+
+        def detect():
+            t_layout = time.perf_counter()
+            boxes = layout_masks(
+                model, [item[1] for item in items], [item[2] for item in items], layout_scale
+            )
+            run_report.add_stage("layout", time.perf_counter() - t_layout)
+            return boxes
+
+        future = layout_executor.submit(detect)
+        for index, item in enumerate(items):
+            queued.append((item[0], future, index))
+
+    def parse(page, layout_future, index):
+        progress.update()
+        if callback:
+            callback(progress)
+        run_report.pages += 1
+        layout[page.pageno] = layout_future.result()[index]
+        # 新建一个 xref 存放新指令流
+        page.page_xref = doc_zh.get_new_xref()  # hack 插入页面的新 xref
+        doc_zh.update_object(page.page_xref, "<<>>")
+        doc_zh.update_stream(page.page_xref, b"")
+        doc_zh[page.pageno].set_contents(page.page_xref)
+        with run_report.stage("parsing"):  # 翻译和排版在 converter 内单独计时
             interpreter.process_page(page)
+        # 页面（包括其中的 form xobject）解析完成后不再需要编号图
+        layout.pop(page.pageno, None)
+        # 前面页面的译文已经返回的话，先排版这些页面，释放提取结果
+        device.flush_typesetting(max_pending)
 
+    parser = PDFParser(inf)
+    doc = PDFDocument(parser)
+    try:
+        with tqdm.tqdm(total=total_pages) as progress:
+            for pageno, page in enumerate(PDFPage.create_pages(doc)):
+                check_cancelled()
+                if pages and (pageno not in pages):
+                    continue
+                page.pageno = pageno
+                render(page)
+                # 解析一批的页面时，下一批在渲染和分析
+                while len(queued) > depth + batch_size - 1:
+                    parse(*queued.popleft())
+            submit_chunk()
+            while queued:
+                check_cancelled()
+                parse(*queued.popleft())
+        device.flush_typesetting(0)
+    except BaseException:
+        device.close(cancel=True)
+        raise
+    finally:
+        layout_executor.shutdown(wait=False, cancel_futures=True)
     device.close()
     return obj_patch
 
@@ -182,8 +253,14 @@ def translate_stream(
     prompt: Template = None,
     skip_subset_fonts: bool = False,
     ignore_cache: bool = False,
+    run_report: RunReport = None,
+    ir_load: Optional[List[PageLayout]] = None,
+    ir_dump: Optional[List[PageLayout]] = None,
     **kwarg: Any,
 ):
+    if run_report is None:
+        run_report = RunReport()
+    t_fonts = time.perf_counter()
     font_list = [("tiro", None)]
 
     font_path = download_remote_fonts(lang_out.lower())
@@ -229,13 +306,19 @@ def translate_stream(
     fp = io.BytesIO()
 
     doc_zh.save(fp)
+    run_report.add_stage("fonts", time.perf_counter() - t_fonts)
     obj_patch: dict = translate_patch(fp, **locals())
 
+    t_write = time.perf_counter()
     for obj_id, ops_new in obj_patch.items():
         # ops_old=doc_en.xref_stream(obj_id)
         # print(obj_id)
         # print(ops_old)
         # print(ops_new.encode())
+        if isinstance(ops_new, DeferredOps):
+            ops_new = ops_new.resolve()
+            if ops_new is None:  # form xobject 排版失败，保留原指令流
+                continue
         doc_zh.update_stream(obj_id, ops_new.encode())
 
     doc_en.insert_file(doc_zh)
@@ -244,10 +327,12 @@ def translate_stream(
     if not skip_subset_fonts:
         doc_zh.subset_fonts(fallback=True)
         doc_en.subset_fonts(fallback=True)
-    return (
+    result = (
         doc_zh.write(deflate=True, garbage=3, use_objstms=1),
         doc_en.write(deflate=True, garbage=3, use_objstms=1),
     )
+    run_report.add_stage("pdf_writing", time.perf_counter() - t_write)
+    return result
 
 
 def convert_to_pdfa(input_path, output_path):
@@ -317,8 +402,17 @@ def translate(
     prompt: Template = None,
     skip_subset_fonts: bool = False,
     ignore_cache: bool = False,
+    report: bool = False,
+    ir: bool = False,
+    from_ir: bool = False,
     **kwarg: Any,
 ):
+    """
+    翻译文件列表，返回 [(mono 路径, dual 路径), ...]。
+    report=True 时在输出目录额外写入 {filename}-report.json 运行报告。
+    ir=True 时在输出目录额外写入 {filename}-ir.json 中间表示（含译文）；
+    from_ir=True 时读取输出目录中的 {filename}-ir.json，按其中的译文重新排版，不调用翻译服务。
+    """
     if not files:
         raise PDFValueError("No files to process.")
 
@@ -390,6 +484,13 @@ def translate(
         except Exception as e:
             logger.warning(f"Failed to clean temp file {file_path}", exc_info=True)
 
+        run_report = RunReport()
+        file_ir = output_path / f"{filename}-ir.json"
+        ir_load = None
+        if from_ir:
+            with open(file_ir, encoding="utf-8") as f:
+                ir_load = load_pages(f)
+        ir_dump = [] if ir else None
         s_mono, s_dual = translate_stream(
             s_raw,
             **locals(),
@@ -397,7 +498,8 @@ def translate(
         # Construct full paths using the confirmed output_path
         file_mono = output_path / f"{filename}-mono.pdf"
         file_dual = output_path / f"{filename}-dual.pdf"
-        
+        t_write = time.perf_counter()
+
         try:
             with open(file_mono, "wb") as doc_mono:
                 doc_mono.write(s_mono)
@@ -413,12 +515,31 @@ def translate(
         except IOError as e:
             print(f"Error writing dual file {file_dual}: {e}")
             # Don't necessarily raise, as mono might have succeeded
+        run_report.add_stage("pdf_writing", time.perf_counter() - t_write)
+
+        logger.info(f"{filename}: {run_report.summary()}")
+        if report:
+            file_report = output_path / f"{filename}-report.json"
+            run_report.write(file_report)
+            print(f"Successfully wrote report file: {file_report}")
+        if ir:
+            with open(file_ir, "w", encoding="utf-8") as f:
+                dump_pages(ir_dump, f)
+            print(f"Successfully wrote IR file: {file_ir}")
 
         result_files.append((str(file_mono), str(file_dual)))
 
     return result_files
 
 
+def retypeset(files: list[str], output: str = "", **kwarg: Any):
+    """
+    用 translate(ir=True) 写入输出目录的 {filename}-ir.json（可以先修改其中的译文）重新生成 mono/dual 文件，
+    不调用翻译服务。参数与 translate 相同，pages 等影响解析的参数需与生成中间表示时一致。
+    """
+    return translate(files, output, from_ir=True, **kwarg)
+
+
 def download_remote_fonts(lang: str):
     lang = lang.lower()
     LANG_NAME_MAP = {
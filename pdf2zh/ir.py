@@ -0,0 +1,111 @@
+"""
+段落的中间表示：TranslateConverter 解析页面（或 form xobject）得到 PageLayout，
+翻译填入 Paragraph.translation，排版只依赖 PageLayout 生成指令流。
+PageLayout 可以序列化为 JSON，填好译文后可以重新排版而不必重新翻译。
+"""
+
+import json
+from dataclasses import asdict, dataclass, field
+from typing import List, Optional
+
+
+@dataclass
+class Paragraph:
+    y: float                            # 初始纵坐标
+    x: float                            # 初始横坐标
+    x0: float                           # 左边界
+    x1: float                           # 右边界
+    y0: float                           # 上边界
+    y1: float                           # 下边界
+    size: float                         # 字体大小
+    brk: bool                           # 换行标记
+    text: str = ""                      # 原文，公式以 {vn} 表示
+    translation: Optional[str] = None   # 译文
+
+
+@dataclass
+class Line:
+    x0: float
+    y0: float
+    x1: float
+    y1: float
+    linewidth: float
+
+    @classmethod
+    def from_ltline(cls, line) -> "Line":
+        (x0, y0), (x1, y1) = line.pts[0], line.pts[1]
+        return cls(x0, y0, x1, y1, line.linewidth)
+
+
+@dataclass
+class FormulaChar:
+    font: Optional[str]     # 字体资源名，找不到时为 None
+    cid_font: bool          # 是否双字节编码
+    cid: int
+    size: float
+    x0: float
+    y0: float
+    x1: float
+    width: float
+    text: str
+
+    @classmethod
+    def from_ltchar(cls, char, font: Optional[str], cid_font: bool) -> "FormulaChar":
+        return cls(
+            font, cid_font, char.cid, char.size, char.x0, char.y0, char.x1, char.width, char.get_text()
+        )
+
+
+@dataclass
+class Formula:
+    chars: List[FormulaChar]
+    lines: List[Line]
+    offset: float   # 纵向偏移
+    width: float
+
+
+@dataclass
+class PageLayout:
+    pageid: int
+    figure: bool = False    # 为真时是 form xobject
+    latin_font: Optional[str] = "tiro"  # 拉丁字体资源名，资源中没有时全部使用非拉丁字体
+    paragraphs: List[Paragraph] = field(default_factory=list)
+    formulas: List[Formula] = field(default_factory=list)
+    lines: List[Line] = field(default_factory=list)   # 全局线条
+
+    def texts(self) -> List[str]:
+        return [p.text for p in self.paragraphs]
+
+    def set_translations(self, translations: List[str]):
+        for paragraph, translation in zip(self.paragraphs, translations):
+            paragraph.translation = translation
+
+    def to_dict(self) -> dict:
+        return asdict(self)
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "PageLayout":
+        return cls(
+            pageid=data["pageid"],
+            figure=data["figure"],
+            latin_font=data["latin_font"],
+            paragraphs=[Paragraph(**p) for p in data["paragraphs"]],
+            formulas=[
+                Formula(
+                    chars=[FormulaChar(**c) for c in f["chars"]],
+                    lines=[Line(**line) for line in f["lines"]],
+                    offset=f["offset"],
+                    width=f["width"],
+                )
+                for f in data["formulas"]
+            ],
+            lines=[Line(**line) for line in data["lines"]],
+        )
+
+
+def dump_pages(pages: List[PageLayout], fp):
+    json.dump([page.to_dict() for page in pages], fp, ensure_ascii=False)
+
+
+def load_pages(fp) -> List[PageLayout]:
+    return [PageLayout.from_dict(data) for data in json.load(fp)]
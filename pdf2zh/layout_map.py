@@ -0,0 +1,63 @@
+"""
+页面版面块编号图：0 为不翻译的区域，1 为未识别的区域，其他为版面块序号 + 2。
+
+编号按版面块数量用 uint8 或 int16 存储（原来是与页面同样大小的 float64 数组），
+scale > 1 时每 scale x scale 个像素存一个编号，版面块边缘向外取整。
+行号为 PDF 坐标的 y（自下而上），与 pdfminer 的坐标一致。
+"""
+
+from typing import Sequence
+
+import numpy as np
+
+# 不翻译的版面块类别
+KEEP_CLASSES = ("abandon", "figure", "table", "isolate_formula", "formula_caption")
+
+
+class LayoutMap:
+    def __init__(self, labels: np.ndarray, shape: tuple, scale: int = 1):
+        self.labels = labels
+        self.shape = shape  # 页面像素大小 (h, w)
+        self.scale = scale
+
+    @classmethod
+    def from_result(cls, page_layout, shape: tuple, scale: int = 1) -> "LayoutMap":
+        """由版面分析结果（boxes 带 xyxy 和 cls，names 为类别名）生成编号图"""
+        h, w = shape
+        scale = max(1, int(scale))
+        boxes = list(page_layout.boxes)
+        count = len(boxes) + 2
+        dtype = np.uint8 if count <= np.iinfo(np.uint8).max else np.int16 if count <= np.iinfo(np.int16).max else np.int32
+        labels = np.ones((-(-h // scale), -(-w // scale)), dtype=dtype)
+        if not boxes:
+            return cls(labels, (h, w), scale)
+        xyxy = np.array([np.asarray(d.xyxy, dtype=np.float64).reshape(4) for d in boxes])
+        keep = np.array([page_layout.names[int(d.cls)] in KEEP_CLASSES for d in boxes])
+        # 图片坐标（自上而下）转为 PDF 坐标，四周各扩展一个像素
+        x0 = np.clip(np.trunc(xyxy[:, 0] - 1), 0, w - 1).astype(np.int64)
+        y0 = np.clip(np.trunc(h - xyxy[:, 3] - 1), 0, h - 1).astype(np.int64)
+        x1 = np.clip(np.trunc(xyxy[:, 2] + 1), 0, w - 1).astype(np.int64)
+        y1 = np.clip(np.trunc(h - xyxy[:, 1] + 1), 0, h - 1).astype(np.int64)
+        x0, y0 = x0 // scale, y0 // scale
+        x1, y1 = -(-x1 // scale), -(-y1 // scale)
+        # 先画需要翻译的版面块，再用不翻译的版面块覆盖
+        for i in np.flatnonzero(~keep):
+            labels[y0[i] : y1[i], x0[i] : x1[i]] = i + 2
+        for i in np.flatnonzero(keep):
+            labels[y0[i] : y1[i], x0[i] : x1[i]] = 0
+        return cls(labels, (h, w), scale)
+
+    def lookup(self, xs: Sequence[float], ys: Sequence[float]) -> np.ndarray:
+        """一次查出多个点（PDF 坐标）所在的版面块编号，页面外的点按最近的边缘处理"""
+        h, w = self.shape
+        xs = np.clip(np.asarray(xs, dtype=np.float64).astype(np.int64), 0, w - 1)
+        ys = np.clip(np.asarray(ys, dtype=np.float64).astype(np.int64), 0, h - 1)
+        return self.labels[ys // self.scale, xs // self.scale]
+
+    def __getitem__(self, index):
+        y, x = index
+        return self.labels[y // self.scale, x // self.scale]
+
+    @property
+    def nbytes(self) -> int:
+        return self.labels.nbytes
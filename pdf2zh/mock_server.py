@@ -0,0 +1,235 @@
+"""
+本地模拟翻译服务，用于在不访问外部翻译服务的情况下测试和测量吞吐量：
+
+    python -m pdf2zh.mock_server --port 1188 --latency 0.2 --error-rate 0.01 --capacity 8
+
+支持 traditional_api.py 中使用的三种协议，译文为原文转大写（{vn} 公式标记保持可识别）：
+
+- DeepLX: POST /translate，对应 DEEPLX_ENDPOINT=http://127.0.0.1:1188/translate
+- 谷歌: GET /m，对应 GOOGLE_ENDPOINT=http://127.0.0.1:1188/m
+- 百度: GET /api/trans/vip/translate，对应 BAIDU_ENDPOINT=http://127.0.0.1:1188/api/trans/vip/translate
+
+GOOGLE_ENDPOINT 和 BAIDU_ENDPOINT 只在本次运行生效（见 BaseTranslator.runtime_envs）；
+DEEPLX_ENDPOINT 是 DeepLX 的常规设置，和其他 envs 一样会写入用户配置，benchmark 因此使用临时配置文件。
+
+可以模拟延迟、随机错误（HTTP 500）和限流（超过每秒请求数或同时处理的请求数时返回 HTTP 429），
+GET /stats 返回请求统计。
+"""
+
+import argparse
+import html
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+from urllib.parse import parse_qs, urlparse
+
+
+def mock_translate(text: str) -> str:
+    return text.upper()
+
+
+def mock_endpoints(url: str) -> dict:
+    """各翻译器指向 url 处的模拟服务所需的 envs"""
+    url = url.rstrip("/")
+    return {
+        "DEEPLX_ENDPOINT": f"{url}/translate",
+        "GOOGLE_ENDPOINT": f"{url}/m",
+        "BAIDU_ENDPOINT": f"{url}/api/trans/vip/translate",
+        "BAIDU_APP_ID": "mock",
+        "BAIDU_SECRET_KEY": "mock",
+    }
+
+
+class MockServer:
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        rate: Optional[float] = None,
+        capacity: Optional[int] = None,
+    ):
+        """
+        latency/jitter: 每个请求的处理时间为 latency 加上 [0, jitter) 内的随机值（秒）
+        error_rate: 返回 HTTP 500 的概率
+        rate: 每秒请求数上限，超过时返回 HTTP 429
+        capacity: 同时处理的请求数上限，超过时返回 HTTP 429
+        port 为 0 时使用随机端口，见 url
+        """
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate = rate
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._tokens = rate or 0.0
+        self._updated = time.monotonic()
+        self._inflight = 0
+        self.reset_stats()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def endpoints(self) -> dict:
+        return mock_endpoints(self.url)
+
+    def reset_stats(self):
+        self.stats = {
+            "requests": 0,
+            "segments": 0,
+            "chars": 0,
+            "throttled": 0,
+            "errors": 0,
+            "max_inflight": 0,
+        }
+
+    def start(self) -> "MockServer":
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="pdf2zh-mock-server", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _admit(self) -> int:
+        """返回 0 表示接受请求，否则为应返回的 HTTP 状态码"""
+        with self._lock:
+            self.stats["requests"] += 1
+            if self.rate:
+                now = time.monotonic()
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens < 1:
+                    self.stats["throttled"] += 1
+                    return 429
+                self._tokens -= 1
+            if self.capacity and self._inflight >= self.capacity:
+                self.stats["throttled"] += 1
+                return 429
+            if random.random() < self.error_rate:
+                self.stats["errors"] += 1
+                return 500
+            self._inflight += 1
+            self.stats["max_inflight"] = max(self.stats["max_inflight"], self._inflight)
+            return 0
+
+    def _serve(self, texts: list) -> list:
+        with self._lock:
+            self.stats["segments"] += len(texts)
+            self.stats["chars"] += sum(len(t) for t in texts)
+        try:
+            time.sleep(self.latency + random.random() * self.jitter)
+            return [mock_translate(t) for t in texts]
+        finally:
+            with self._lock:
+                self._inflight -= 1
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _reply(self, status: int, body: str, content_type: str = "application/json"):
+                data = body.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", f"{content_type}; charset=utf-8")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                query = {k: v[0] for k, v in parse_qs(url.query, keep_blank_values=True).items()}
+                if url.path == "/stats":
+                    with server._lock:
+                        return self._reply(200, json.dumps(server.stats))
+                if url.path not in ("/m", "/api/trans/vip/translate"):
+                    return self._reply(404, json.dumps({"error": "not found"}))
+                status = server._admit()
+                if status:
+                    return self._reply(status, json.dumps({"error": status}))
+                if url.path == "/m":  # 谷歌移动版网页
+                    (dst,) = server._serve([query.get("q", "")])
+                    return self._reply(
+                        200, f'<html><div class="result-container">{html.escape(dst)}</div></html>', "text/html"
+                    )
+                # 百度：多段文本以换行分隔，逐行返回
+                src = query.get("q", "").split("\n")
+                result = [{"src": s, "dst": d} for s, d in zip(src, server._serve(src))]
+                self._reply(200, json.dumps({
+                    "from": query.get("from", ""), "to": query.get("to", ""), "trans_result": result
+                }, ensure_ascii=False))
+
+            def do_POST(self):
+                url = urlparse(self.path)
+                if url.path != "/translate":
+                    return self._reply(404, json.dumps({"error": "not found"}))
+                length = int(self.headers.get("Content-Length") or 0)
+                try:
+                    payload = json.loads(self.rfile.read(length) or b"{}")
+                except ValueError:
+                    return self._reply(400, json.dumps({"code": 400, "message": "invalid json"}))
+                status = server._admit()
+                if status:
+                    return self._reply(status, json.dumps({"code": status, "message": "mock error"}))
+                (dst,) = server._serve([payload.get("text", "")])  # DeepLX
+                self._reply(200, json.dumps({"code": 200, "data": dst}, ensure_ascii=False))
+
+        return Handler
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pdf2zh.mock_server", description="pdf2zh 本地模拟翻译服务")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=1188)
+    parser.add_argument("--latency", type=float, default=0.0, help="每个请求的处理时间（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="处理时间的随机增量上限（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="返回 HTTP 500 的概率")
+    parser.add_argument("--rate", type=float, default=None, help="每秒请求数上限，超过时返回 HTTP 429")
+    parser.add_argument("--capacity", type=int, default=None, help="同时处理的请求数上限，超过时返回 HTTP 429")
+    return parser
+
+
+def main(args=None) -> int:
+    args = create_parser().parse_args(args)
+    server = MockServer(
+        args.host, args.port, args.latency, args.jitter, args.error_rate, args.rate, args.capacity
+    )
+    print(f"mock translation service listening on {server.url}")
+    for key, value in server.endpoints().items():
+        print(f"  {key}={value}")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._server.server_close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,257 @@
+"""
+生成 INT8 量化的版面分析模型，并与 FP32 模型比较检测框和速度：
+
+    python -m pdf2zh.quantize --method static --report quantize-report.json
+
+样例页面（默认为 pdf2zh_files/ 下的 PDF，跳过翻译生成的 -mono/-dual 文件）随机分成两部分：
+静态量化用校准集估计激活值范围（动态量化不需要校准），与 FP32 模型的比较只在留出的评估集上进行。
+量化后的模型默认保存到 doclayout.int8_model_path()，
+设置 PDF2ZH_ONNX_PRECISION=int8 后 DocLayoutModel.load_available() 会使用它。
+"""
+
+import argparse
+import json
+import logging
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+import onnx
+import pymupdf
+
+from pdf2zh.doclayout import OnnxModel, int8_model_path
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_DIR = Path(__file__).resolve().parent.parent / "pdf2zh_files"
+# 翻译生成的文件，不是原始文档
+GENERATED_SUFFIXES = ("-mono", "-dual")
+
+
+def sample_files(folder: Path = SAMPLE_DIR) -> List[str]:
+    return sorted(
+        str(p) for p in folder.glob("*.pdf") if not p.stem.endswith(GENERATED_SUFFIXES)
+    )
+
+
+def render_pages(files: List[str], max_pages: int = 10) -> List[np.ndarray]:
+    """与 translate_patch 相同的方式渲染每个 PDF 的前 max_pages 页"""
+    images = []
+    for file in files:
+        with pymupdf.open(file) as doc:
+            for page in list(doc)[:max_pages]:
+                pix = page.get_pixmap()
+                images.append(
+                    np.frombuffer(pix.samples, np.uint8).reshape(pix.height, pix.width, 3)[:, :, ::-1]
+                )
+    return images
+
+
+def split_pages(images: List[np.ndarray], holdout: float = 0.3, seed: int = 0):
+    """随机分出校准集和评估集，评估集占 holdout，两者都至少有一页"""
+    if len(images) < 2:
+        raise ValueError("at least two sample pages are needed to hold out an evaluation set")
+    order = np.random.default_rng(seed).permutation(len(images))
+    n_eval = min(len(images) - 1, max(1, round(len(images) * holdout)))
+    return [images[i] for i in order[n_eval:]], [images[i] for i in order[:n_eval]]
+
+
+def _imgsz(image: np.ndarray) -> int:
+    return int(image.shape[0] / 32) * 32
+
+
+def preprocess(model: OnnxModel, image: np.ndarray) -> np.ndarray:
+    """与 OnnxModel.predict 相同的预处理"""
+    pix = model.resize_and_pad_image(image, new_shape=_imgsz(image))
+    return np.expand_dims(np.transpose(pix, (2, 0, 1)), axis=0).astype(np.float32) / 255.0
+
+
+def quantize(model_path, output, method: str = "static", images: List[np.ndarray] = None):
+    """量化 model_path 保存到 output，static 需要用于校准的页面 images"""
+    from onnxruntime.quantization import (
+        CalibrationDataReader,
+        QuantFormat,
+        QuantType,
+        quantize_dynamic,
+        quantize_static,
+    )
+
+    output = Path(output)
+    output.parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        source = Path(model_path)
+        try:  # 先做形状推断和图优化，量化效果更好
+            from onnxruntime.quantization.shape_inference import quant_pre_process
+
+            prepared = Path(tmp) / "prepared.onnx"
+            quant_pre_process(str(source), str(prepared))
+            source = prepared
+        except Exception as e:
+            logger.warning(f"Skipping quantization pre-processing: {e}")
+
+        if method == "dynamic":
+            quantize_dynamic(str(source), str(output), weight_type=QuantType.QUInt8)
+        elif method == "static":
+            if not images:
+                raise ValueError("static quantization needs calibration pages")
+            fp32 = OnnxModel(model_path)
+            input_name = fp32.model.get_inputs()[0].name
+
+            class PageReader(CalibrationDataReader):
+                def __init__(self):
+                    self._pages = iter(images)
+
+                def get_next(self):
+                    image = next(self._pages, None)
+                    return None if image is None else {input_name: preprocess(fp32, image)}
+
+            quantize_static(
+                str(source),
+                str(output),
+                PageReader(),
+                quant_format=QuantFormat.QDQ,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+                per_channel=True,
+            )
+        else:
+            raise ValueError(f"unknown quantization method: {method}")
+
+    # OnnxModel 从元数据中读取 stride 和类别名
+    metadata = {d.key: d.value for d in onnx.load(str(model_path), load_external_data=False).metadata_props}
+    quantized = onnx.load(str(output))
+    onnx.helper.set_model_props(quantized, metadata)
+    onnx.save(quantized, str(output))
+    return output
+
+
+def box_iou(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """(N, 4) 和 (M, 4) 的 xyxy 框两两之间的 IoU，形状 (N, M)"""
+    lt = np.maximum(a[:, None, :2], b[None, :, :2])
+    rb = np.minimum(a[:, None, 2:], b[None, :, 2:])
+    inter = np.prod(np.clip(rb - lt, 0, None), axis=2)
+    area_a = np.prod(a[:, 2:] - a[:, :2], axis=1)
+    area_b = np.prod(b[:, 2:] - b[:, :2], axis=1)
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-9)
+
+
+def match_boxes(reference, candidate, iou_threshold: float = 0.5) -> Dict[str, float]:
+    """
+    按置信度从高到低，把 reference 的每个框与 candidate 中同类别、IoU 最大且未匹配的框配对，
+    IoU 不低于 iou_threshold 时算作匹配
+    """
+    ref = [(box.xyxy.reshape(4), int(box.cls)) for box in reference.boxes]
+    cand = [(box.xyxy.reshape(4), int(box.cls)) for box in candidate.boxes]
+    used = set()
+    ious = []
+    for xyxy, cls in ref:  # boxes 已按置信度排序
+        best, best_iou = None, 0.0
+        for j, (other, other_cls) in enumerate(cand):
+            if j in used or other_cls != cls:
+                continue
+            iou = float(box_iou(xyxy[None], other[None])[0, 0])
+            if iou > best_iou:
+                best, best_iou = j, iou
+        if best is not None and best_iou >= iou_threshold:
+            used.add(best)
+            ious.append(best_iou)
+    return {
+        "reference_boxes": len(ref),
+        "candidate_boxes": len(cand),
+        "matched": len(ious),
+        "iou_sum": float(sum(ious)),
+    }
+
+
+def compare(reference: OnnxModel, candidate: OnnxModel, images: List[np.ndarray], iou_threshold: float = 0.5) -> dict:
+    """逐页比较两个模型的检测框和推理耗时"""
+    totals = {"reference_boxes": 0, "candidate_boxes": 0, "matched": 0, "iou_sum": 0.0}
+    times = {"reference": 0.0, "candidate": 0.0}
+    pages = []
+    for image in images:
+        t = time.perf_counter()
+        ref = reference.predict(image, imgsz=_imgsz(image))[0]
+        times["reference"] += time.perf_counter() - t
+        t = time.perf_counter()
+        cand = candidate.predict(image, imgsz=_imgsz(image))[0]
+        times["candidate"] += time.perf_counter() - t
+        page = match_boxes(ref, cand, iou_threshold)
+        pages.append(page)
+        for key in totals:
+            totals[key] += page[key]
+    n = max(len(images), 1)
+    return {
+        "pages": len(images),
+        "iou_threshold": iou_threshold,
+        "mean_iou": totals["iou_sum"] / totals["matched"] if totals["matched"] else None,
+        "recall": totals["matched"] / totals["reference_boxes"] if totals["reference_boxes"] else None,
+        "precision": totals["matched"] / totals["candidate_boxes"] if totals["candidate_boxes"] else None,
+        "reference_ms_per_page": times["reference"] / n * 1000,
+        "candidate_ms_per_page": times["candidate"] / n * 1000,
+        "speedup": times["reference"] / times["candidate"] if times["candidate"] else None,
+        "per_page": pages,
+    }
+
+
+def create_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="pdf2zh.quantize", description="生成并评估 INT8 版面分析模型")
+    parser.add_argument("files", nargs="*", help=f"用于校准和比较的 PDF，默认 {SAMPLE_DIR} 下的原始文档")
+    parser.add_argument("--method", choices=("static", "dynamic"), default="static")
+    parser.add_argument("--pages", type=int, default=10, help="每个 PDF 最多使用的页数")
+    parser.add_argument("--model", help="FP32 模型，默认使用 babeldoc 下载的模型")
+    parser.add_argument("--output", help=f"量化模型的保存位置，默认 {int8_model_path()}")
+    parser.add_argument("--holdout", type=float, default=0.3, help="留作评估、不参与校准的页面比例")
+    parser.add_argument("--iou", type=float, default=0.5, help="检测框匹配的 IoU 阈值")
+    parser.add_argument("--compare-only", action="store_true", help="不重新量化，只比较已有的量化模型")
+    parser.add_argument("--report", help="将比较结果写入 JSON 文件")
+    return parser
+
+
+def main(args=None) -> int:
+    args = create_parser().parse_args(args)
+    logging.basicConfig(level=logging.INFO)
+    files = args.files or sample_files()
+    if not files:
+        print(
+            f"no source PDF files found in {SAMPLE_DIR} (translated -mono/-dual files are skipped), "
+            "pass the PDFs to use",
+            file=sys.stderr,
+        )
+        return 1
+    if args.model:
+        model_path = Path(args.model)
+    else:
+        from babeldoc.assets.assets import get_doclayout_onnx_model_path
+
+        model_path = Path(get_doclayout_onnx_model_path())
+    output = Path(args.output) if args.output else int8_model_path()
+
+    calibration, evaluation = split_pages(render_pages(files, args.pages), args.holdout)
+    print(
+        f"rendered {len(calibration) + len(evaluation)} pages from {len(files)} files: "
+        f"{len(calibration)} for calibration, {len(evaluation)} held out for evaluation"
+    )
+    if not args.compare_only:
+        quantize(model_path, output, args.method, calibration)
+        print(f"saved {args.method} INT8 model to {output}")
+
+    report = compare(OnnxModel(model_path), OnnxModel(output), evaluation, args.iou)
+    report.update({
+        "method": args.method,
+        "model": str(model_path),
+        "quantized_model": str(output),
+        "calibration_pages": len(calibration),
+    })
+    summary = {k: v for k, v in report.items() if k != "per_page"}
+    print(json.dumps(summary, indent=2))
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,119 @@
+"""单次翻译运行的统计报告：各阶段耗时、缓存命中率和翻译服务调用情况"""
+
+import json
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+
+
+class RunReport:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.started = time.time()
+        self.pages = 0
+        self.stages: Dict[str, float] = defaultdict(float)  # 各阶段独占耗时（秒）
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.deduplicated = 0  # 未命中缓存、但与正在翻译的段落相同而无需再次请求的段落数
+        self.cache_writes: Dict[str, int] = {}  # 缓存后台写入情况，见 cache.WriteBehind
+        self.mt_calls: Dict[str, int] = defaultdict(int)
+        self.mt_errors: Dict[str, int] = defaultdict(int)
+        self.chars_sent: Dict[str, int] = defaultdict(int)
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+
+    @contextmanager
+    def stage(self, name: str):
+        """
+        统计一个阶段的耗时。阶段可以嵌套，外层阶段只记录扣除内层阶段之后的时间，
+        因此各阶段之和约等于总耗时。
+        """
+        stack = self._local.__dict__.setdefault("stack", [])
+        frame = [time.perf_counter(), 0.0]  # 开始时间, 内层阶段耗时
+        stack.append(frame)
+        try:
+            yield
+        finally:
+            stack.pop()
+            elapsed = time.perf_counter() - frame[0]
+            if stack:
+                stack[-1][1] += elapsed
+            with self._lock:
+                self.stages[name] += elapsed - frame[1]
+
+    def add_stage(self, name: str, seconds: float):
+        """记录一段手动计时的耗时，同样从当前线程的外层阶段中扣除"""
+        stack = getattr(self._local, "stack", None)
+        if stack:
+            stack[-1][1] += seconds
+        with self._lock:
+            self.stages[name] += seconds
+
+    def record_cache(self, hits: int, misses: int, deduplicated: int = 0):
+        with self._lock:
+            self.cache_hits += hits
+            self.cache_misses += misses
+            self.deduplicated += deduplicated
+
+    def record_cache_writes(self, stats: Dict[str, int]):
+        with self._lock:
+            self.cache_writes = dict(stats)
+
+    def record_translation(self, engine: str, chars: int, seconds: float):
+        with self._lock:
+            self.mt_calls[engine] += 1
+            self.chars_sent[engine] += chars
+            self.latencies[engine].append(seconds)
+
+    def record_error(self, engine: str):
+        with self._lock:
+            self.mt_errors[engine] += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            lookups = self.cache_hits + self.cache_misses
+            engines = {}
+            for engine in set(self.mt_calls) | set(self.mt_errors):
+                latencies = np.array(self.latencies.get(engine, []))
+                engines[engine] = {
+                    "calls": self.mt_calls.get(engine, 0),
+                    "errors": self.mt_errors.get(engine, 0),
+                    "chars_sent": self.chars_sent.get(engine, 0),
+                    "latency_total": float(latencies.sum()) if latencies.size else 0.0,
+                    "latency_p50": float(np.percentile(latencies, 50)) if latencies.size else None,
+                    "latency_p90": float(np.percentile(latencies, 90)) if latencies.size else None,
+                    "latency_p99": float(np.percentile(latencies, 99)) if latencies.size else None,
+                }
+            return {
+                "pages": self.pages,
+                "wall_time": time.time() - self.started,
+                "stages": dict(self.stages),
+                "cache": {
+                    "hits": self.cache_hits,
+                    "misses": self.cache_misses,
+                    "hit_rate": self.cache_hits / lookups if lookups else None,
+                    "deduplicated": self.deduplicated,
+                    "writes": self.cache_writes,
+                },
+                "translators": engines,
+            }
+
+    def summary(self) -> str:
+        data = self.to_dict()
+        stages = ", ".join(f"{k} {v:.2f}s" for k, v in sorted(data["stages"].items(), key=lambda x: -x[1]))
+        hit_rate = data["cache"]["hit_rate"]
+        hit_rate = "n/a" if hit_rate is None else f"{hit_rate:.1%}"
+        calls = sum(e["calls"] for e in data["translators"].values())
+        return (
+            f"{data['pages']} pages in {data['wall_time']:.2f}s, "
+            f"cache hit rate {hit_rate}, "
+            f"{calls} MT calls; {stages}"
+        )
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_dict(), f, indent=2, ensure_ascii=False)
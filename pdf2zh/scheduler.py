@@ -0,0 +1,197 @@
+"""
+整个文档共用的翻译调度器。
+
+每页（和每个 form xobject）的段落在提取后立即提交，缓存未命中的段落按翻译服务的上限打包，
+交给一个在整个文档期间存在的线程池（或异步翻译器的事件循环）。翻译服务在页面之间不会空闲，
+排版则等到该页译文就绪后按页面顺序进行，见 converter.DeferredOps。
+
+正在翻译的段落按翻译服务、参数和规范化（合并空白）后的原文登记在进程内，
+其他页面或同时翻译的其他文档遇到相同段落时等待同一个结果，不再重复请求。
+"""
+
+import concurrent.futures
+import logging
+import re
+import threading
+from functools import partial
+from typing import Dict, List, Optional, Tuple
+
+from tenacity import retry, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+from pdf2zh.report import RunReport
+from pdf2zh.translators import BaseTranslator, aio, throttle
+
+log = logging.getLogger(__name__)
+
+
+def _log_error(e: BaseException):
+    if log.isEnabledFor(logging.DEBUG):
+        log.exception(e)
+    else:
+        log.exception(e, exc_info=False)
+
+
+class _Abandoned(Exception):
+    """登记段落的调度器被取消或翻译失败，等待这些段落的其他调度器应自己重新提交"""
+
+    def __init__(self, owner: "TranslationScheduler", error: BaseException):
+        super().__init__(error)
+        self.owner = owner
+        self.error = error
+
+
+# 正在翻译的段落，值为该段落译文的 Future
+_flights: Dict[Tuple[str, str, str], concurrent.futures.Future] = {}
+_flights_lock = threading.Lock()
+
+
+class TranslationScheduler:
+    def __init__(self, translator: BaseTranslator, thread: int, report: RunReport):
+        self.translator = translator
+        self.report = report
+        self.thread = thread
+        translator.set_concurrency(thread)  # 同时进行的请求数上限跟随线程数
+        self._executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        # 只重试被限流、超时和连接错误，有限次，带随机抖动的指数退避，避免被限流时所有线程同时重试
+        retry_policy = retry(
+            retry=retry_if_exception(throttle.is_transient),
+            stop=stop_after_attempt(translator.max_retries + 1),
+            wait=wait_random_exponential(multiplier=0.5, max=30),
+            reraise=True,
+        )
+        self._worker = retry_policy(self._translate)
+        self._worker_async = retry_policy(self._translate_async)
+
+    def _translate(self, batch: List[str]) -> List[str]:  # 多线程翻译，每个任务是一批段落
+        try:
+            # 缓存已在 submit 中统一批量查询，这里跳过逐段查询
+            return self.translator.translate_batch(batch, ignore_cache=True)
+        except BaseException as e:
+            _log_error(e)
+            raise e
+
+    async def _translate_async(self, batch: List[str]) -> List[str]:  # 异步翻译，并发数由翻译服务控制
+        try:
+            return await self.translator.translate_batch_async(batch, ignore_cache=True)
+        except BaseException as e:
+            _log_error(e)
+            raise e
+
+    def _submit_batch(self, batch: List[str]) -> concurrent.futures.Future:
+        if self.translator.is_async:
+            return aio.submit(self._worker_async(batch))
+        if self._executor is None:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.thread or None, thread_name_prefix="pdf2zh-translate"
+            )
+        return self._executor.submit(self._worker, batch)
+
+    def _flight_key(self, text: str) -> Tuple[str, str, str]:
+        cache = self.translator.cache
+        return (cache.translate_engine, cache.translate_engine_params, " ".join(text.split()))
+
+    def _claim(self, misses: List[str]) -> Tuple[Dict[str, concurrent.futures.Future], List[str]]:
+        """登记未命中的段落，返回每个段落译文的 Future 和需要由本次提交翻译的段落"""
+        flights: Dict[str, concurrent.futures.Future] = {}
+        owned: List[str] = []
+        with _flights_lock:
+            for s in misses:
+                key = self._flight_key(s)
+                flight = _flights.get(key)
+                if flight is None:
+                    flight = _flights[key] = concurrent.futures.Future()
+                    owned.append(s)
+                flights[s] = flight
+        return flights, owned
+
+    def _land(self, batch: List[str], future: concurrent.futures.Future):
+        """
+        一批翻译结束，把结果交给等待这些段落的所有页面。
+        取消或失败时只有本调度器的页面失败，其他文档的调度器收到 _Abandoned 后重新提交
+        """
+        with _flights_lock:
+            flights = [_flights.pop(self._flight_key(s)) for s in batch]
+        if future.cancelled() or future.exception() is not None:
+            e = future.exception() if not future.cancelled() else concurrent.futures.CancelledError()
+            for flight in flights:
+                flight.set_exception(_Abandoned(self, e))
+        else:
+            for flight, translation in zip(flights, future.result()):
+                flight.set_result(translation)
+
+    def submit(self, sstk: List[str]) -> concurrent.futures.Future:
+        """提交一页的段落，返回的 Future 结果为与 sstk 一一对应的译文"""
+        # 空白和公式不翻译，重复段落只翻译一次
+        todo = list(dict.fromkeys(s for s in sstk if s.strip() and not re.match(r"^\{v\d+\}$", s)))
+        if self.translator.ignore_cache:
+            cached: Dict[str, str] = {}
+        else:
+            cached = self.translator.cache.get_many(todo)  # 整页一次查询缓存
+        misses = [s for s in todo if s not in cached]
+        flights, owned = self._claim(misses)  # 其他页面正在翻译的段落不再重复请求
+        self.report.record_cache(len(todo) - len(misses), len(misses), len(misses) - len(owned))
+        for batch in self.translator.split_batches(owned):  # 按翻译服务的上限打包
+            try:
+                future = self._submit_batch(batch)
+            except BaseException as e:  # 登记过的段落必须结束，否则等待它们的页面不会返回
+                future = concurrent.futures.Future()
+                future.set_exception(e)
+                self._land(batch, future)
+                raise
+            future.add_done_callback(partial(self._land, batch))
+
+        result: concurrent.futures.Future = concurrent.futures.Future()
+        texts: Dict[concurrent.futures.Future, List[str]] = {}  # 每个 Future 对应的段落
+        for s, flight in flights.items():
+            texts.setdefault(flight, []).append(s)
+        remaining = set(texts)
+        if not remaining:
+            result.set_result([cached.get(s, s) for s in sstk])
+            return result
+        lock = threading.Lock()
+
+        def land(flight: concurrent.futures.Future, translations: List[str]):
+            with lock:
+                if result.done():
+                    return
+                cached.update(zip(texts[flight], translations))
+                remaining.discard(flight)
+                if not remaining:
+                    result.set_result([cached.get(s, s) for s in sstk])
+
+        def fail(e: BaseException):
+            with lock:
+                if not result.done():
+                    # 任意段落翻译失败，整页失败
+                    result.set_exception(e)
+
+        def on_resubmitted(flight: concurrent.futures.Future, resubmitted: concurrent.futures.Future):
+            if resubmitted.cancelled() or resubmitted.exception() is not None:
+                fail(resubmitted.exception() if not resubmitted.cancelled() else concurrent.futures.CancelledError())
+            else:
+                land(flight, resubmitted.result())
+
+        def on_done(flight: concurrent.futures.Future):
+            e = flight.exception()
+            if e is None:
+                return land(flight, [flight.result()] * len(texts[flight]))
+            if not isinstance(e, _Abandoned):
+                return fail(e)
+            if e.owner is self or result.done():
+                return fail(e.error)
+            # 其他文档放弃了这些段落，由本调度器重新提交
+            try:
+                resubmitted = self.submit(texts[flight])
+            except BaseException as error:
+                return fail(error)
+            resubmitted.add_done_callback(partial(on_resubmitted, flight))
+
+        for flight in texts:
+            flight.add_done_callback(on_done)
+        return result
+
+    def close(self, cancel: bool = False):
+        """cancel 为真时丢弃尚未开始的翻译任务"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=not cancel, cancel_futures=cancel)
+            self._executor = None
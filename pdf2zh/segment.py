@@ -0,0 +1,80 @@
+"""
+翻译请求的分段：
+
+- split_text: 超过翻译服务长度上限的段落在句末（其次在空白处）拆开，不会拆开 {vn} 公式标记
+- join_text: 把拆开翻译的译文按目标语言拼回一段
+- pack/unpack: 不支持批量接口的翻译服务用分隔符把多个短段落拼成一次请求，再按分隔符拆回
+
+见 BaseTranslator.max_text_chars 和 BaseTranslator.pack_delimiter。
+"""
+
+import re
+from typing import List, Optional
+
+_PLACEHOLDER = re.compile(r"\{\s*v[\d\s]+\}", re.IGNORECASE)
+# 句末标点：西文标点后须有空白（避免拆开 3.14、e.g.），中文标点后直接拆
+_SENTENCE_END = re.compile(r"[.!?;:]+[\"'”’)\]]*\s+|[。！？；：]+[”’」』）]*\s*")
+_SPACE = re.compile(r"\s+")
+# 译文之间不加空格的目标语言
+_NO_SPACE_LANGS = ("zh", "ja")
+# 拼接请求的分隔符：不含文字的符号串，翻译服务会原样保留；换行只为让翻译服务分开处理各段，
+# 拆分时只认符号串本身，翻译服务删掉或增加换行也能拆回
+PACK_DELIMITER = "\n|||\n"
+
+
+def _cut(text: str, start: int, max_chars: int, spans: List[tuple]) -> int:
+    """返回 text[start:] 的第一段的结束位置，段长不超过 max_chars"""
+    end = start + max_chars
+
+    def inside(i: int) -> bool:
+        return any(s < i < e for s, e in spans)
+
+    for pattern in (_SENTENCE_END, _SPACE):
+        cuts = [
+            m.end() for m in pattern.finditer(text, start, end)
+            if start < m.end() <= end and not inside(m.end())
+        ]
+        if cuts:
+            return cuts[-1]
+    # 没有句末和空白时硬切，避开公式标记
+    for s, e in spans:
+        if s < end < e:
+            return s if s > start else e
+    return end
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """把文本拆成不超过 max_chars 的若干段（单个公式标记本身超长时除外）"""
+    if not max_chars or len(text) <= max_chars:
+        return [text]
+    spans = [m.span() for m in _PLACEHOLDER.finditer(text)]
+    pieces = []
+    start = 0
+    while len(text) - start > max_chars:
+        end = _cut(text, start, max_chars, spans)
+        pieces.append(text[start:end].strip())
+        start = end
+    pieces.append(text[start:].strip())
+    return [piece for piece in pieces if piece]
+
+
+def join_text(pieces: List[str], lang_out: str) -> str:
+    separator = "" if lang_out.split("-")[0].lower() in _NO_SPACE_LANGS else " "
+    return separator.join(piece.strip() for piece in pieces)
+
+
+def pack(texts: List[str], delimiter: str) -> Optional[str]:
+    """拼接多个段落，有空白段落或段落本身含分隔符时返回 None"""
+    sentinel = delimiter.strip() or delimiter
+    if any(sentinel in text or not text.strip() for text in texts):
+        return None
+    return delimiter.join(texts)
+
+
+def unpack(text: str, delimiter: str, count: int) -> Optional[List[str]]:
+    """按分隔符（忽略两端空白）拆回 count 段，段数不一致（翻译服务改动了分隔符）时返回 None"""
+    pieces = [piece.strip() for piece in text.strip().split(delimiter.strip() or delimiter)]
+    if len(pieces) != count:
+        # 翻译服务可能插入空行
+        pieces = [piece for piece in pieces if piece]
+    return pieces if len(pieces) == count else None
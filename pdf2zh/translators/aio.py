@@ -0,0 +1,79 @@
+"""
+翻译器共用的异步运行环境：一个后台事件循环线程和共享连接池的 httpx.AsyncClient。
+任意线程都可以用 run() 提交协程并等待结果，并发请求数不再受线程数限制，
+而由 throttle.AIMDController 控制。
+"""
+
+import asyncio
+import atexit
+import concurrent.futures
+import logging
+import threading
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+# 只在后台事件循环线程中创建和使用
+_client: Optional[httpx.AsyncClient] = None
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="pdf2zh-aio", daemon=True).start()
+        return _loop
+
+
+def submit(coro) -> concurrent.futures.Future:
+    """在后台事件循环中运行协程，立即返回 Future"""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop())
+
+
+def run(coro):
+    """在后台事件循环中运行协程，阻塞当前线程直到返回结果"""
+    return submit(coro).result()
+
+
+def _http2_available() -> bool:
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    共享的 AsyncClient，只能在后台事件循环中调用。
+    安装了 h2 (pip install httpx[http2]) 时，支持 HTTP/2 的服务会复用同一连接。
+    """
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            http2=_http2_available(),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20),
+            timeout=httpx.Timeout(20.0, connect=10.0),
+        )
+    return _client
+
+
+def _close():
+    global _client
+    if _loop is None:
+        return
+    if _client is not None:
+        try:
+            run(_client.aclose())
+        except Exception as e:
+            logger.debug(f"Error closing http client: {e}")
+        _client = None
+    _loop.call_soon_threadsafe(_loop.stop)
+
+
+atexit.register(_close)
@@ -0,0 +1,254 @@
+"""
+Argos Translate 的进程内模型池。
+
+每个语言对的模型只加载一次，所有 ArgosTranslator 共享。各线程提交的段落进入同一个队列，
+推理线程把等待中的段落（最多 max_batch 段，最多等待 max_wait 秒）合并成一次
+CTranslate2 translate_batch 调用，避免逐段推理的固定开销。
+推理线程数为 inter_threads，每次推理使用 intra_threads 个线程（0 为 CTranslate2 默认值）。
+线程设置只在模型第一次加载时生效。
+
+分段、分句、分词和解码参数与 Argos 的 apply_packaged_translation 相同，第一次推理时抽查几段
+与 translation.translate() 的结果，不一致时改为逐段调用 Argos。
+没有安装 ctranslate2/sentencepiece 或语言对需要经过中间语言翻译时，退回逐段调用 Argos。
+"""
+
+import concurrent.futures
+import json
+import logging
+import queue
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Argos apply_packaged_translation 的解码参数（translate() 取一个候选），
+# 翻译包的 metadata.json 或 argostranslate.settings 中有同名设置时以其为准
+_DECODING = {"beam_size": 4, "length_penalty": 0.2, "replace_unknowns": True}
+# 没有 stanza 时的分句方式：句末标点后的空白
+_SENTENCE_END = re.compile(r"(?<=[.!?。！？])\s+")
+# 第一次推理时与 translation.translate() 逐段比较的段落数，不一致时改为逐段调用 Argos
+_CHECK_PARAGRAPHS = 3
+
+
+def _load_translation(lang_in: str, lang_out: str):
+    import argostranslate.translate
+
+    from_lang = argostranslate.translate.get_language_from_code(lang_in)
+    to_lang = argostranslate.translate.get_language_from_code(lang_out)
+    translation = from_lang.get_translation(to_lang) if from_lang and to_lang else None
+    if not translation:
+        raise ValueError(f"从{lang_in}到{lang_out}的Argos翻译包不可用")
+    return translation
+
+
+def _decoding_options(pkg) -> dict:
+    import argostranslate.settings
+
+    try:
+        with open(pkg.package_path / "metadata.json", encoding="utf-8") as f:
+            metadata = json.load(f)
+    except (OSError, ValueError):
+        metadata = {}
+    options = {}
+    for key, default in _DECODING.items():
+        options[key] = metadata.get(key, getattr(argostranslate.settings, key, default))
+    return options
+
+
+def _sentencizer(pkg) -> Callable[[str], List[str]]:
+    """与 Argos 相同的分句：有 stanza 时使用翻译包里的 stanza 模型"""
+    import argostranslate.settings
+
+    stanza_dir = pkg.package_path / "stanza"
+    if getattr(argostranslate.settings, "stanza_available", True) and stanza_dir.exists():
+        try:
+            import stanza
+        except ImportError:
+            stanza = None
+        if stanza is not None:
+            pipeline = stanza.Pipeline(
+                lang=pkg.from_code,
+                dir=str(stanza_dir),
+                processors="tokenize",
+                use_gpu=getattr(argostranslate.settings, "device", "cpu") == "cuda",
+                logging_level="WARNING",
+            )
+            lock = threading.Lock()  # 推理线程共用一个 pipeline
+
+            def split(text: str) -> List[str]:
+                with lock:
+                    return [sentence.text for sentence in pipeline(text).sentences]
+
+            return split
+    return lambda text: [sentence for sentence in _SENTENCE_END.split(text) if sentence]
+
+
+class ArgosModel:
+    def __init__(
+        self,
+        translation,
+        intra_threads: int = 0,
+        inter_threads: int = 1,
+        max_batch: int = 32,
+        max_wait: float = 0.005,
+    ):
+        self.translation = translation
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self._queue: queue.Queue = queue.Queue()
+        self._ct2 = None
+        self._checked = False
+        self._check_lock = threading.Lock()
+        # 直接翻译的语言对（PackageTranslation，可能包在 CachedTranslation 里）
+        pkg = getattr(getattr(translation, "underlying", translation), "pkg", None)
+        try:
+            import ctranslate2
+            import sentencepiece
+        except ImportError:
+            ctranslate2 = None
+        if pkg is not None and ctranslate2 is not None:
+            import argostranslate.settings
+
+            self._ct2 = ctranslate2.Translator(
+                str(pkg.package_path / "model"),
+                device=getattr(argostranslate.settings, "device", "cpu"),
+                inter_threads=inter_threads,
+                intra_threads=intra_threads,
+            )
+            self._decoding = _decoding_options(pkg)
+            self._split = _sentencizer(pkg)
+            tokenizer = getattr(pkg, "tokenizer", None)  # Argos 1.9 起翻译包自带分词器（SentencePiece 或 BPE）
+            if tokenizer is not None:
+                self._encode, self._decode = tokenizer.encode, tokenizer.decode
+            else:
+                sp = sentencepiece.SentencePieceProcessor(
+                    model_file=str(pkg.package_path / "sentencepiece.model")
+                )
+                self._encode = lambda sentence: sp.encode(sentence, out_type=str)
+                self._decode = lambda tokens: "".join(tokens).replace("▁", " ")
+            self._target_prefix = getattr(pkg, "target_prefix", "") or ""
+        else:
+            try:
+                import argostranslate.settings
+
+                # Argos 在第一次翻译时按这里的设置创建 CTranslate2 模型
+                argostranslate.settings.inter_threads = inter_threads
+                argostranslate.settings.intra_threads = intra_threads
+            except ImportError:
+                pass
+        for i in range(max(1, inter_threads)):
+            threading.Thread(target=self._run, name=f"pdf2zh-argos-{i}", daemon=True).start()
+
+    def translate_many(self, texts: List[str]) -> List[str]:
+        """翻译多个段落，与其他线程同时提交的段落一起推理"""
+        futures = []
+        for text in texts:
+            future: concurrent.futures.Future = concurrent.futures.Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return [future.result() for future in futures]
+
+    def _run(self):
+        while True:
+            items = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(items) < self.max_batch:
+                timeout = deadline - time.monotonic()
+                try:
+                    items.append(self._queue.get(timeout=timeout) if timeout > 0 else self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                results = self._infer([text for text, _ in items])
+            except BaseException as e:
+                for _, future in items:
+                    future.set_exception(e)
+            else:
+                for (_, future), result in zip(items, results):
+                    future.set_result(result)
+
+    def _infer(self, texts: List[str]) -> List[str]:
+        if self._ct2 is not None and not self._checked:
+            with self._check_lock:
+                if not self._checked:
+                    results = self._infer_batch(texts)
+                    self._check(texts, results)
+                    self._checked = True
+                    if self._ct2 is not None:
+                        return results
+        if self._ct2 is None:
+            return [self.translation.translate(text) for text in texts]
+        return self._infer_batch(texts)
+
+    def _check(self, texts: List[str], results: List[str]):
+        """合并推理应与 Argos 逐段翻译的结果一致，否则以后改为逐段调用 Argos"""
+        for text, result in list(zip(texts, results))[:_CHECK_PARAGRAPHS]:
+            expected = self.translation.translate(text)
+            if result != expected:
+                logger.warning(
+                    f"Batched Argos output differs from translation.translate(), "
+                    f"falling back to per-paragraph translation: {result!r} != {expected!r}"
+                )
+                self._ct2 = None
+                return
+
+    def _infer_batch(self, texts: List[str]) -> List[str]:
+        # 与 Argos 相同，段落按换行拆开、再分句；所有段落的所有句子一次推理，再按段落拼回
+        paragraphs = [text.split("\n") for text in texts]
+        sentences: List[List[str]] = []
+        owners: List[Tuple[int, int]] = []
+        for i, parts in enumerate(paragraphs):
+            for j, part in enumerate(parts):
+                for sentence in self._split(part):
+                    sentences.append(self._encode(sentence))
+                    owners.append((i, j))
+        tokens: Dict[Tuple[int, int], List[str]] = {}
+        if sentences:
+            results = self._ct2.translate_batch(
+                sentences,
+                target_prefix=[[self._target_prefix]] * len(sentences) if self._target_prefix else None,
+                max_batch_size=self.max_batch,
+                **self._decoding,
+            )
+            for owner, result in zip(owners, results):
+                hypothesis = result.hypotheses[0]
+                if self._target_prefix:
+                    hypothesis = hypothesis[1:]
+                tokens.setdefault(owner, []).extend(hypothesis)
+        translated = []
+        for i, parts in enumerate(paragraphs):
+            lines = []
+            for j in range(len(parts)):
+                value = self._decode(tokens.get((i, j), []))
+                lines.append(value[1:] if value.startswith(" ") else value)
+            translated.append("\n".join(lines))
+        return translated
+
+
+_models: Dict[Tuple[str, str], ArgosModel] = {}
+_models_lock = threading.Lock()
+
+
+def get_model(
+    lang_in: str,
+    lang_out: str,
+    intra_threads: int = 0,
+    inter_threads: int = 1,
+    max_batch: int = 32,
+    max_wait: float = 0.005,
+) -> ArgosModel:
+    """返回语言对共享的模型，第一次调用时加载"""
+    with _models_lock:
+        key = (lang_in, lang_out)
+        if key not in _models:
+            _models[key] = ArgosModel(
+                _load_translation(lang_in, lang_out),
+                intra_threads=intra_threads,
+                inter_threads=inter_threads,
+                max_batch=max_batch,
+                max_wait=max_wait,
+            )
+            logger.info(f"Loaded Argos model {lang_in}->{lang_out}")
+        return _models[key]
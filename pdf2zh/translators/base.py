@@ -1,12 +1,16 @@
+import asyncio
 import logging
 import os
+import time
 import unicodedata
 from copy import copy
 from string import Template
 from typing import cast
 
+from pdf2zh import segment
 from pdf2zh.cache import TranslationCache
 from pdf2zh.config import ConfigManager
+from pdf2zh.translators import throttle
 
 logger = logging.getLogger(__name__)
 
@@ -18,8 +22,29 @@ def remove_control_characters(s):
 class BaseTranslator:
     name = "base"
     envs = {}
+    # 只在本次运行生效的设置及其默认值（如指向 pdf2zh.mock_server 的服务地址）：
+    # 从 envs 参数或环境变量读取，不在界面上显示，也不写入用户配置
+    runtime_envs: dict = {}
     lang_map: dict[str, str] = {}
     CustomPrompt = False
+    report = None  # RunReport，由 TranslateConverter 设置
+    # 单次批量请求的段落数和字符数上限，默认每次请求只翻译一段
+    batch_max_segments = 1
+    batch_max_chars = 0
+    # 单次请求的文本长度上限（0 为不限），超长段落在句末拆开分别翻译后再拼接
+    max_text_chars = 0
+    # 没有批量接口的服务可设置分隔符（如 segment.PACK_DELIMITER），默认的 do_translate_batch 用它
+    # 把一批段落拼成一次请求，译文按分隔符拆回的段数不一致时改为逐段翻译
+    pack_delimiter: str | None = None
+    # 译文中的分隔符数量不对的次数达到此值后不再拼接
+    pack_max_failures = 3
+    # 每秒请求数上限（None 为不限速）、令牌桶容量、同时进行的请求数上限和失败后的重试次数，
+    # 可在 envs 或配置中用 PDF2ZH_<NAME>_RATE_LIMIT、_RATE_BURST、_MAX_INFLIGHT、_MAX_RETRIES 覆盖。
+    # max_inflight 为 None 时等于翻译线程数（见 set_concurrency），被限流时才自动降低
+    rate_limit: float | None = None
+    rate_burst: float | None = None
+    max_inflight: int | None = None
+    max_retries = 5
 
     def __init__(self, lang_in: str, lang_out: str, model: str, ignore_cache: bool):
         lang_in = self.lang_map.get(lang_in.lower(), lang_in)
@@ -28,6 +53,7 @@ class BaseTranslator:
         self.lang_out = lang_out
         self.model = model
         self.ignore_cache = ignore_cache
+        self.pack_failures = 0
 
         self.cache = TranslationCache(
             self.name,
@@ -37,6 +63,31 @@ class BaseTranslator:
                 "model": model,
             },
         )
+        # 可选的模糊缓存: normalize 只做规范化匹配, minhash 额外匹配近似段落
+        fuzzy = ConfigManager.get("PDF2ZH_CACHE_FUZZY")
+        if fuzzy in ("normalize", "minhash"):
+            self.cache.enable_fuzzy(minhash=fuzzy == "minhash")
+
+        self.rate_limit = self._setting("RATE_LIMIT", self.rate_limit, float)
+        self.rate_burst = self._setting("RATE_BURST", self.rate_burst, float)
+        self.max_inflight = self._setting("MAX_INFLIGHT", self.max_inflight, int)
+        self.max_retries = self._setting("MAX_RETRIES", self.max_retries, int)
+        # 同一翻译服务的所有实例共享限流和并发控制
+        self.limiter = throttle.get_limiter(self.name, self.rate_limit, self.rate_burst)
+        self.set_concurrency(0)
+
+    def set_concurrency(self, thread: int):
+        """
+        按翻译线程数设置同时进行的请求数上限，thread 为 0 时与线程池的默认线程数相同。
+        设置了 max_inflight 时以它为准。并发从上限开始，被限流时减半，成功后逐渐恢复
+        """
+        maximum = self.max_inflight or thread or min(32, (os.cpu_count() or 1) + 4)
+        self.controller = throttle.get_controller(self.name, maximum)
+
+    def _setting(self, key: str, default, convert):
+        key = f"PDF2ZH_{self.name.upper()}_{key}"
+        value = self.envs.get(key) or ConfigManager.get(key)
+        return convert(value) if value else default
 
     def set_envs(self, envs):
         # 从self.__class__.envs中分离
@@ -44,7 +95,10 @@ class BaseTranslator:
         # 因为如果set_envs被调用两次，第二次调用将覆盖第一次调用
         self.envs = copy(self.envs)
         if ConfigManager.get_translator_by_name(self.name):
-            self.envs = ConfigManager.get_translator_by_name(self.name)
+            self.envs = copy(ConfigManager.get_translator_by_name(self.name))
+        # 旧版本可能把 runtime_envs 写进了用户配置，忽略这些值
+        for key in self.runtime_envs:
+            self.envs.pop(key, None)
         needUpdate = False
         for key in self.envs:
             if key in os.environ:
@@ -54,8 +108,11 @@ class BaseTranslator:
             ConfigManager.set_translator_by_name(self.name, self.envs)
         if envs is not None:
             for key in envs:
-                self.envs[key] = envs[key]
+                if key not in self.runtime_envs:
+                    self.envs[key] = envs[key]
             ConfigManager.set_translator_by_name(self.name, self.envs)
+        for key, default in self.runtime_envs.items():
+            self.envs[key] = (envs or {}).get(key) or os.environ.get(key) or default
 
     def add_cache_impact_parameters(self, k: str, v):
         """
@@ -76,7 +133,16 @@ class BaseTranslator:
             if cache is not None:
                 return cache
 
-        translation = self.do_translate(text)
+        start = time.perf_counter()
+        try:
+            # 与批量翻译一样拆开超长段落
+            (translation,) = self._translate_batch([text])
+        except Exception:
+            if self.report is not None:
+                self.report.record_error(self.name)
+            raise
+        if self.report is not None:
+            self.report.record_translation(self.name, len(text), time.perf_counter() - start)
         self.cache.set(text, translation)
         return translation
 
@@ -88,6 +154,235 @@ class BaseTranslator:
         """
         raise NotImplementedError
 
+    def split_batches(self, texts: list[str]) -> list[list[str]]:
+        """
+        按 batch_max_segments 和 batch_max_chars 把文本分成若干批，
+        超过字符上限的单段文本单独成批。拼接请求的字符数包括段落之间的分隔符。
+        """
+        delimiter = len(self.pack_delimiter or "")
+        batches, batch, chars = [], [], 0
+        for text in texts:
+            if batch and (
+                len(batch) >= self.batch_max_segments
+                or (self.batch_max_chars and chars + delimiter + len(text) > self.batch_max_chars)
+            ):
+                batches.append(batch)
+                batch, chars = [], 0
+            chars += len(text) + (delimiter if batch else 0)
+            batch.append(text)
+        if batch:
+            batches.append(batch)
+        return batches
+
+    def translate_batch(self, texts: list[str], ignore_cache: bool = False) -> list[str]:
+        """
+        批量翻译文本，重复文本只翻译一次，按服务的上限分批请求。
+        :param texts: 要翻译的文本列表
+        :return: 与 texts 一一对应的译文
+        """
+        unique = list(dict.fromkeys(texts))
+        if self.ignore_cache or ignore_cache:
+            results = {}
+        else:
+            results = self.cache.get_many(unique)
+        misses = [text for text in unique if text not in results]
+        for batch in self.split_batches(misses):
+            start = time.perf_counter()
+            try:
+                translations = self._translate_batch(batch)
+            except Exception:
+                if self.report is not None:
+                    self.report.record_error(self.name)
+                raise
+            if self.report is not None:
+                self.report.record_translation(
+                    self.name, sum(len(text) for text in batch), time.perf_counter() - start
+                )
+            self.cache.set_many(zip(batch, translations))
+            results.update(zip(batch, translations))
+        return [results[text] for text in texts]
+
+    def _split_oversize(self, texts: list[str]):
+        """超长段落拆开后的所有片段，以及每段对应的片段数；没有超长段落时返回 None"""
+        if not self.max_text_chars or all(len(text) <= self.max_text_chars for text in texts):
+            return None
+        pieces = [segment.split_text(text, self.max_text_chars) for text in texts]
+        return [piece for parts in pieces for piece in parts], [len(parts) for parts in pieces]
+
+    def _join_pieces(self, translations: list[str], counts: list[int]) -> list[str]:
+        results, pos = [], 0
+        for count in counts:
+            results.append(segment.join_text(translations[pos:pos + count], self.lang_out))
+            pos += count
+        return results
+
+    def _translate_batch(self, texts: list[str]) -> list[str]:
+        split = self._split_oversize(texts)
+        if split is not None:
+            pieces, counts = split
+            translations = []
+            for batch in self.split_batches(pieces):
+                translations.extend(self._translate_batch(batch))
+            return self._join_pieces(translations, counts)
+        if len(texts) == 1:
+            return [self._call(self.do_translate, texts[0])]
+        try:
+            translations = self._call(self.do_translate_batch, texts)
+            if len(translations) != len(texts):
+                raise ValueError(f"批量翻译返回了 {len(translations)} 条结果，应为 {len(texts)} 条")
+            return translations
+        except throttle.MALFORMED_ERRORS as e:
+            # 批量响应格式不对或条数不一致时逐段翻译；被限流和其他错误交给调度器退避重试
+            if throttle.is_throttled(e):
+                raise
+            logger.warning(f"{self.name} 批量翻译失败，改为逐段翻译: {e}")
+            return [self._call(self.do_translate, text) for text in texts]
+
+    def _call(self, fn, *args):
+        # 每次请求都经过限流和并发控制，被限流时降低并发
+        epoch = self.controller.acquire()
+        outcome = "error"
+        try:
+            if self.limiter is not None:
+                self.limiter.acquire()
+            result = fn(*args)
+            outcome = "success"
+            return result
+        except Exception as e:
+            if throttle.is_throttled(e):
+                outcome = "throttled"
+            raise
+        finally:
+            self.controller.release(epoch, outcome)
+
+    def do_translate_batch(self, texts: list[str]) -> list[str]:
+        """
+        实际批量翻译文本，支持批量请求的子类重写此方法并设置 batch_max_segments
+        :param texts: 要翻译的文本列表
+        :return: 与 texts 一一对应的译文
+        """
+        packed = self._pack(texts)
+        if packed is not None:
+            translations = self._unpack(self.do_translate(packed), len(texts))
+            if translations is not None:
+                return translations
+        return [self.do_translate(text) for text in texts]
+
+    def _pack(self, texts: list[str]) -> str | None:
+        if not self.pack_delimiter or self.pack_failures >= self.pack_max_failures:
+            return None
+        return segment.pack(texts, self.pack_delimiter)
+
+    def _unpack(self, translation: str, count: int) -> list[str] | None:
+        translations = segment.unpack(translation, self.pack_delimiter, count)
+        if translations is None:
+            self.pack_failures += 1
+            logger.warning(
+                f"{self.name} 拼接请求的译文段数不一致（{self.pack_failures}/{self.pack_max_failures}），改为逐段翻译"
+            )
+        return translations
+
+    @property
+    def is_async(self) -> bool:
+        """子类实现了 do_translate_async 时，TranslateConverter 使用异步接口"""
+        return type(self).do_translate_async is not BaseTranslator.do_translate_async
+
+    async def translate_batch_async(self, texts: list[str], ignore_cache: bool = False) -> list[str]:
+        """
+        translate_batch 的异步版本，各批并发请求，需在 aio 的事件循环中运行。
+        :param texts: 要翻译的文本列表
+        :return: 与 texts 一一对应的译文
+        """
+        unique = list(dict.fromkeys(texts))
+        if self.ignore_cache or ignore_cache:
+            results = {}
+        else:
+            results = self.cache.get_many(unique)
+        misses = [text for text in unique if text not in results]
+
+        async def run(batch):
+            start = time.perf_counter()
+            try:
+                translations = await self._translate_batch_async(batch)
+            except Exception:
+                if self.report is not None:
+                    self.report.record_error(self.name)
+                raise
+            if self.report is not None:
+                self.report.record_translation(
+                    self.name, sum(len(text) for text in batch), time.perf_counter() - start
+                )
+            self.cache.set_many(zip(batch, translations))
+            return translations
+
+        batches = self.split_batches(misses)
+        for batch, translations in zip(batches, await asyncio.gather(*map(run, batches))):
+            results.update(zip(batch, translations))
+        return [results[text] for text in texts]
+
+    async def _call_async(self, fn, *args):
+        epoch = await self.controller.acquire_async()
+        outcome = "error"
+        try:
+            if self.limiter is not None:
+                await self.limiter.acquire_async()
+            result = await fn(*args)
+            outcome = "success"
+            return result
+        except Exception as e:
+            if throttle.is_throttled(e):
+                outcome = "throttled"
+            raise
+        finally:
+            self.controller.release(epoch, outcome)
+
+    async def _translate_batch_async(self, texts: list[str]) -> list[str]:
+        split = self._split_oversize(texts)
+        if split is not None:
+            pieces, counts = split
+            batches = self.split_batches(pieces)
+            translations = []
+            for result in await asyncio.gather(*map(self._translate_batch_async, batches)):
+                translations.extend(result)
+            return self._join_pieces(translations, counts)
+        if len(texts) == 1:
+            return [await self._call_async(self.do_translate_async, texts[0])]
+        try:
+            translations = await self._call_async(self.do_translate_batch_async, texts)
+            if len(translations) != len(texts):
+                raise ValueError(f"批量翻译返回了 {len(translations)} 条结果，应为 {len(texts)} 条")
+            return translations
+        except throttle.MALFORMED_ERRORS as e:
+            # 批量响应格式不对或条数不一致时逐段翻译；被限流和其他错误交给调度器退避重试
+            if throttle.is_throttled(e):
+                raise
+            logger.warning(f"{self.name} 批量翻译失败，改为逐段翻译: {e}")
+            return list(
+                await asyncio.gather(
+                    *(self._call_async(self.do_translate_async, text) for text in texts)
+                )
+            )
+
+    async def do_translate_async(self, text: str) -> str:
+        """
+        实际异步翻译文本，默认在线程中调用 do_translate。
+        基于 HTTP 的子类可重写此方法，使用 aio.get_client() 发送请求
+        """
+        return await asyncio.to_thread(self.do_translate, text)
+
+    async def do_translate_batch_async(self, texts: list[str]) -> list[str]:
+        """
+        实际异步批量翻译文本。设置了 pack_delimiter 且实现了 do_translate_async 时拼成一次异步请求，
+        否则在线程中调用 do_translate_batch
+        """
+        packed = self._pack(texts) if self.is_async else None
+        if packed is not None:
+            translations = self._unpack(await self.do_translate_async(packed), len(texts))
+            if translations is not None:
+                return translations
+            return list(await asyncio.gather(*map(self.do_translate_async, texts)))
+        return await asyncio.to_thread(self.do_translate_batch, texts)
+
     def prompt(
         self, text: str, prompt_template: Template | None = None
     ) -> list[dict[str, str]]:
@@ -0,0 +1,163 @@
+"""
+翻译服务的限流和自适应并发控制，按翻译服务共享：
+
+- TokenBucket: 令牌桶，限制每秒请求数
+- AIMDController: 同时进行的请求数上限，成功时加性增长，被限流（429/5xx）时减半
+- is_throttled/is_transient: 判断错误是否为被限流，或是否值得重试
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from typing import Dict, Optional, Tuple
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst if burst else max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        # 先预订令牌（令牌数可以为负），返回需要等待的秒数
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return max(0.0, -self._tokens / self.rate)
+
+    def acquire(self):
+        wait = self._reserve()
+        if wait:
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        wait = self._reserve()
+        if wait:
+            await asyncio.sleep(wait)
+
+
+class AIMDController:
+    """
+    每次成功请求使上限增加 1/上限（即每轮满并发的请求后加 1），被限流时上限减半。
+    与 TCP 拥塞控制相同，上次减半之前发出的请求再被限流时不会重复减半。
+    acquire() 返回的序号需传给 release()。
+    """
+
+    def __init__(self, maximum: int, initial: Optional[int] = None, minimum: int = 1):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.limit = float(initial if initial else max(minimum, maximum // 4))
+        self.inflight = 0
+        self.throttled = 0
+        self._epoch = 0  # 每次减半加一
+        self._cond = threading.Condition()
+        self._async_waiters: deque = deque()
+
+    def _try_acquire(self) -> bool:
+        if self.inflight < int(self.limit):
+            self.inflight += 1
+            return True
+        return False
+
+    def acquire(self) -> int:
+        with self._cond:
+            while not self._try_acquire():
+                self._cond.wait()
+            return self._epoch
+
+    async def acquire_async(self) -> int:
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._cond:
+                if self._try_acquire():
+                    return self._epoch
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, epoch: int, outcome: str):
+        """outcome: success、throttled 或 error（其他错误不影响上限）"""
+        with self._cond:
+            self.inflight -= 1
+            if outcome == "success":
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif outcome == "throttled":
+                self.throttled += 1
+                if epoch == self._epoch:
+                    self._epoch += 1
+                    self.limit = max(self.minimum, self.limit / 2)
+            self._cond.notify_all()
+            waiters = list(self._async_waiters)
+            self._async_waiters.clear()
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+
+def _wake(waiter: asyncio.Future):
+    if not waiter.done():
+        waiter.set_result(None)
+
+
+def is_throttled(e: BaseException) -> bool:
+    """HTTP 429 和 5xx 视为被限流（requests、httpx 以及带 status_code 的 SDK 异常）"""
+    if "TooManyRequests" in type(e).__name__:
+        return True
+    response = getattr(e, "response", None)
+    status = getattr(response, "status_code", None) or getattr(e, "status_code", None)
+    try:
+        status = int(status)
+    except (TypeError, ValueError):
+        return False
+    return status == 429 or status >= 500
+
+
+# 批量响应格式不对（解析失败、条数不一致）时抛出的错误，只有这些错误会改为逐段翻译
+MALFORMED_ERRORS = (ValueError, KeyError, IndexError, TypeError)
+
+# requests、httpx 和各 SDK 的超时和连接错误的类名，不必导入这些包
+_TRANSIENT_NAMES = {
+    "Timeout",
+    "TimeoutException",
+    "ConnectionError",
+    "ConnectError",
+    "TransportError",
+    "APIConnectionError",
+    "APITimeoutError",
+}
+
+
+def is_transient(e: BaseException) -> bool:
+    """被限流、超时和连接错误，值得退避后重试；认证失败、4xx 和解析错误重试也不会成功"""
+    if is_throttled(e) or isinstance(e, (TimeoutError, ConnectionError)):
+        return True
+    return any(cls.__name__ in _TRANSIENT_NAMES for cls in type(e).__mro__)
+
+
+_limiters: Dict[Tuple[str, float, Optional[float]], TokenBucket] = {}
+_controllers: Dict[Tuple[str, int], AIMDController] = {}
+_registry_lock = threading.Lock()
+
+
+def get_limiter(name: str, rate: Optional[float], burst: Optional[float] = None) -> Optional[TokenBucket]:
+    """同一翻译服务、同样设置的翻译器共享一个令牌桶，rate 为空时不限速"""
+    if not rate:
+        return None
+    with _registry_lock:
+        key = (name, rate, burst)
+        if key not in _limiters:
+            _limiters[key] = TokenBucket(rate, burst)
+        return _limiters[key]
+
+
+def get_controller(name: str, maximum: int) -> AIMDController:
+    """同一翻译服务、同样上限的翻译器共享一个控制器，初始并发即为上限"""
+    with _registry_lock:
+        key = (name, maximum)
+        if key not in _controllers:
+            _controllers[key] = AIMDController(maximum, initial=maximum)
+        return _controllers[key]
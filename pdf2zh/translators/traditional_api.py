@@ -3,35 +3,48 @@ import re
 import hashlib
 import random
 import logging
+import httpx
 import requests
 import deepl
 from azure.ai.translation.text import TextTranslationClient
 from azure.core.credentials import AzureKeyCredential
 from tencentcloud.common import credential
 from tencentcloud.tmt.v20180321.models import (
+    TextTranslateBatchRequest,
     TextTranslateRequest,
     TextTranslateResponse,
 )
 from tencentcloud.tmt.v20180321.tmt_client import TmtClient
 
+from pdf2zh import segment
+
+from . import aio, argos_pool
 from .base import BaseTranslator, remove_control_characters
 
 logger = logging.getLogger(__name__)
 
 class GoogleTranslator(BaseTranslator):
     name = "google"
+    runtime_envs = {
+        "GOOGLE_ENDPOINT": "https://translate.google.com/m", # 可指向 pdf2zh.mock_server 做离线测试
+    }
     lang_map = {"zh": "zh-CN"}
+    # 单次最多5000字符，超长段落按句拆开；短段落用分隔符拼成一次请求
+    max_text_chars = 5000
+    batch_max_segments = 50
+    batch_max_chars = 5000
+    pack_delimiter = segment.PACK_DELIMITER
 
-    def __init__(self, lang_in, lang_out, model, ignore_cache=False, **kwargs):
+    def __init__(self, lang_in, lang_out, model, envs=None, ignore_cache=False, **kwargs):
+        self.set_envs(envs)
         super().__init__(lang_in, lang_out, model, ignore_cache)
         self.session = requests.Session()
-        self.endpoint = "https://translate.google.com/m"
+        self.endpoint = self.envs["GOOGLE_ENDPOINT"]
         self.headers = {
             "User-Agent": "Mozilla/4.0 (compatible;MSIE 6.0;Windows NT 5.1;SV1;.NET CLR 1.1.4322;.NET CLR 2.0.50727;.NET CLR 3.0.04506.30)"  # noqa: E501
         }
 
     def do_translate(self, text):
-        text = text[:5000]  # 谷歌翻译最大长度限制
         try:
             response = self.session.get(
                 self.endpoint,
@@ -40,16 +53,7 @@ class GoogleTranslator(BaseTranslator):
                 timeout=10 # 添加超时设置
             )
             response.raise_for_status() # 对于错误响应(4xx或5xx)抛出HTTPError
-            re_result = re.findall(
-                r'(?s)class="(?:t0|result-container)">(.*?)<', response.text
-            )
-            if not re_result:
-                 # 可能HTML结构已更改，记录响应以便调试
-                 logger.warning(f"无法解析谷歌翻译响应，文本: '{text[:50]}...' 响应内容: {response.text[:500]}")
-                 raise ValueError("无法解析谷歌翻译响应")
-
-            result = html.unescape(re_result[0])
-            return remove_control_characters(result)
+            return self._parse_response(text, response.text)
 
         except requests.exceptions.Timeout:
             logger.error("谷歌翻译请求超时。")
@@ -61,10 +65,45 @@ class GoogleTranslator(BaseTranslator):
             logger.error(f"谷歌翻译过程中出错: {e}")
             raise # 重新抛出其他异常
 
+    async def do_translate_async(self, text):
+        try:
+            response = await aio.get_client().get(
+                self.endpoint,
+                params={"tl": self.lang_out, "sl": self.lang_in, "q": text},
+                headers=self.headers,
+                timeout=10,
+            )
+            response.raise_for_status()
+            return self._parse_response(text, response.text)
+        except httpx.TimeoutException:
+            logger.error("谷歌翻译请求超时。")
+            raise
+        except httpx.HTTPError as e:
+            logger.error(f"谷歌翻译请求失败: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"谷歌翻译过程中出错: {e}")
+            raise
+
+    def _parse_response(self, text, body):
+        re_result = re.findall(r'(?s)class="(?:t0|result-container)">(.*?)<', body)
+        if not re_result:
+            # 可能HTML结构已更改，记录响应以便调试
+            logger.warning(f"无法解析谷歌翻译响应，文本: '{text[:50]}...' 响应内容: {body[:500]}")
+            raise ValueError("无法解析谷歌翻译响应")
+        result = html.unescape(re_result[0])
+        # 保留换行，拼接请求按换行拆回各段
+        return "\n".join(remove_control_characters(line) for line in result.split("\n"))
+
 class BingTranslator(BaseTranslator):
     # https://github.com/immersive-translate/old-immersive-translate/blob/6df13da22664bea2f51efe5db64c63aca59c4e79/src/background/translationService.js
     name = "bing"
     lang_map = {"zh": "zh-Hans"}
+    # 单次最多1000字符，超长段落按句拆开；短段落用分隔符拼成一次请求
+    max_text_chars = 1000
+    batch_max_segments = 50
+    batch_max_chars = 1000
+    pack_delimiter = segment.PACK_DELIMITER
 
     def __init__(self, lang_in, lang_out, model, ignore_cache=False, **kwargs):
         super().__init__(lang_in, lang_out, model, ignore_cache)
@@ -107,7 +146,6 @@ class BingTranslator(BaseTranslator):
             raise
 
     def do_translate(self, text):
-        text = text[:1000]  # 必应翻译最大长度限制
         try:
             url, ig, iid, key, token = self.find_sid()
             translate_url = f"{url.split('/translator')[0]}/ttranslatev3?isVertical=1&=&IG={ig}&IID={iid}"
@@ -152,6 +190,9 @@ class DeepLTranslator(BaseTranslator):
         "DEEPL_SERVER_URL": None, # 可选：用于自定义端点（如deeplx）
     }
     lang_map = {"zh": "ZH"} # DeepL使用ZH表示简体中文
+    # 每次请求最多50段，请求体不超过128KiB
+    batch_max_segments = 50
+    batch_max_chars = 30000
 
     def __init__(
         self, lang_in, lang_out, model, envs=None, ignore_cache=False, **kwargs
@@ -165,6 +206,9 @@ class DeepLTranslator(BaseTranslator):
         self.client = deepl.Translator(auth_key, server_url=server_url)
 
     def do_translate(self, text):
+        return self.do_translate_batch([text])[0]
+
+    def do_translate_batch(self, texts):
         try:
             # 如果需要，将zh-Hans映射到ZH（虽然lang_map应该已处理）
             target_lang = self.lang_out.upper()
@@ -173,12 +217,12 @@ class DeepLTranslator(BaseTranslator):
             source_lang = self.lang_in.upper() if self.lang_in else None
 
             response = self.client.translate_text(
-                text,
+                texts,
                 source_lang=source_lang,
                 target_lang=target_lang,
                 # 如果需要，可以在此添加正式性选项等
             )
-            return response.text
+            return [result.text for result in response]
         except deepl.DeepLException as e:
             logger.error(f"DeepL API错误: {e}")
             raise
@@ -194,6 +238,10 @@ class DeepLXTranslator(BaseTranslator):
         "DEEPLX_ACCESS_TOKEN": None,
     }
     lang_map = {"zh": "ZH"} # DeepL使用ZH表示简体中文
+    # DeepLX 只接受单段文本，短段落用分隔符拼成一次请求
+    batch_max_segments = 50
+    batch_max_chars = 5000
+    pack_delimiter = segment.PACK_DELIMITER
 
     def __init__(
         self, lang_in, lang_out, model, envs=None, ignore_cache=False, **kwargs
@@ -204,32 +252,36 @@ class DeepLXTranslator(BaseTranslator):
         self.access_token = self.envs.get("DEEPLX_ACCESS_TOKEN") # 可选令牌
         self.session = requests.Session()
 
+    def _request_args(self, text):
+        # 如果需要，将zh-Hans映射到ZH
+        target_lang = self.lang_out.upper()
+        if target_lang == 'ZH-HANS':
+            target_lang = 'ZH'
+        source_lang = self.lang_in.upper() if self.lang_in else "AUTO"
+
+        payload = {
+            "text": text,
+            "source_lang": source_lang,
+            "target_lang": target_lang,
+        }
+        headers = {}
+        if self.access_token:
+            headers["Authorization"] = f"Bearer {self.access_token}"
+        return payload, headers
+
+    def _parse_response(self, result):
+        if "data" in result:
+            return result["data"]
+        else:
+            logger.warning(f"意外的DeepLX响应格式: {result}")
+            raise ValueError("意外的DeepLX响应格式")
+
     def do_translate(self, text):
         try:
-            # 如果需要，将zh-Hans映射到ZH
-            target_lang = self.lang_out.upper()
-            if target_lang == 'ZH-HANS':
-                target_lang = 'ZH'
-            source_lang = self.lang_in.upper() if self.lang_in else "AUTO"
-
-            payload = {
-                "text": text,
-                "source_lang": source_lang,
-                "target_lang": target_lang,
-            }
-            headers = {}
-            if self.access_token:
-                headers["Authorization"] = f"Bearer {self.access_token}"
-            
-            response = self.session.post(self.endpoint, json=payload, timeout=20) # 增加超时时间
+            payload, headers = self._request_args(text)
+            response = self.session.post(self.endpoint, json=payload, headers=headers, timeout=20) # 增加超时时间
             response.raise_for_status()
-            
-            result = response.json()
-            if "data" in result:
-                return result["data"]
-            else:
-                logger.warning(f"意外的DeepLX响应格式: {result}")
-                raise ValueError("意外的DeepLX响应格式")
+            return self._parse_response(response.json())
         except requests.exceptions.RequestException as e:
             logger.error(f"DeepLX请求失败: {e}")
             raise
@@ -237,6 +289,19 @@ class DeepLXTranslator(BaseTranslator):
             logger.error(f"DeepLX翻译过程中出错: {e}")
             raise
 
+    async def do_translate_async(self, text):
+        try:
+            payload, headers = self._request_args(text)
+            response = await aio.get_client().post(self.endpoint, json=payload, headers=headers, timeout=20)
+            response.raise_for_status()
+            return self._parse_response(response.json())
+        except httpx.HTTPError as e:
+            logger.error(f"DeepLX请求失败: {e}")
+            raise
+        except Exception as e:
+            logger.error(f"DeepLX翻译过程中出错: {e}")
+            raise
+
 class AzureTranslator(BaseTranslator):
     # https://github.com/Azure/azure-sdk-for-python
     name = "azure"
@@ -247,6 +312,9 @@ class AzureTranslator(BaseTranslator):
         "AZURE_REGION": None, # SDK需要
     }
     lang_map = {"zh": "zh-Hans"}
+    # 每次请求最多1000段，总长度不超过50000字符
+    batch_max_segments = 1000
+    batch_max_chars = 50000
 
     def __init__(
         self, lang_in, lang_out, model, envs=None, ignore_cache=False, **kwargs
@@ -267,17 +335,20 @@ class AzureTranslator(BaseTranslator):
         self.region = region
 
     def do_translate(self, text) -> str:
+        return self.do_translate_batch([text])[0]
+
+    def do_translate_batch(self, texts):
         try:
             # 使用TextTranslationClient
             # 注意：凭证可能会根据端点略有不同（全球与区域）
             response = self.client.translate(
-                content=[text],
+                content=texts,
                 source_language=self.lang_in,
                 target_languages=[self.lang_out],
                 region=self.region
             )
-            if response and len(response) > 0 and len(response[0].translations) > 0:
-                return response[0].translations[0].text
+            if response and len(response) == len(texts) and all(item.translations for item in response):
+                return [item.translations[0].text for item in response]
             else:
                 logger.warning("没有从Azure收到翻译。")
                 raise ValueError("没有从Azure收到翻译。")
@@ -294,6 +365,9 @@ class TencentTranslator(BaseTranslator):
         "TENCENT_REGION": "ap-shanghai",  # 默认区域
     }
     # 腾讯语言映射似乎兼容，除非出现问题，否则不需要显式映射
+    # TextTranslateBatch 单次请求总长度需低于6000字符
+    batch_max_segments = 100
+    batch_max_chars = 6000
 
     def __init__(
         self, lang_in, lang_out, model, envs=None, ignore_cache=False, **kwargs
@@ -329,6 +403,20 @@ class TencentTranslator(BaseTranslator):
             logger.error(f"腾讯云翻译错误: {e}")
             raise
 
+    def do_translate_batch(self, texts):
+        try:
+            req = TextTranslateBatchRequest()
+            req.SourceTextList = texts
+            req.Source = self.lang_in
+            req.Target = self.lang_out
+            req.ProjectId = 0 # 默认项目ID
+
+            resp = self.client.TextTranslateBatch(req)
+            return resp.TargetTextList
+        except Exception as e:
+            logger.error(f"腾讯云批量翻译错误: {e}")
+            raise
+
 class BaiduTranslator(BaseTranslator):
     # https://fanyi-api.baidu.com/doc/21
     name = "baidu"
@@ -336,10 +424,16 @@ class BaiduTranslator(BaseTranslator):
         "BAIDU_APP_ID": None,
         "BAIDU_SECRET_KEY": None,
     }
+    runtime_envs = {
+        "BAIDU_ENDPOINT": "https://fanyi-api.baidu.com/api/trans/vip/translate", # 可指向 pdf2zh.mock_server 做离线测试
+    }
     lang_map = {
         "zh": "zh", # 百度使用'zh'表示简体中文
         # 根据百度文档需要添加其他映射
     }
+    # 多段文本用换行符拼接在 q 中，单次请求建议不超过6000字节（约2000个汉字）
+    batch_max_segments = 100
+    batch_max_chars = 2000
 
     def __init__(
         self, lang_in, lang_out, model, envs=None, ignore_cache=False, **kwargs
@@ -358,43 +452,72 @@ class BaiduTranslator(BaseTranslator):
             raise ValueError("需要百度APP ID和密钥")
         
         self.session = requests.Session()
-        self.endpoint = "https://fanyi-api.baidu.com/api/trans/vip/translate"
+        self.endpoint = self.envs["BAIDU_ENDPOINT"]
 
     def make_md5(self, s, encoding='utf-8'):
         return hashlib.md5(s.encode(encoding)).hexdigest()
 
     def do_translate(self, text: str) -> str:
+        return self._request(text)[0]["dst"]
+
+    def do_translate_batch(self, texts):
+        if any("\n" in text for text in texts):
+            # 段落本身含换行时无法按行对应译文
+            return super().do_translate_batch(texts)
+        return [item["dst"] for item in self._request("\n".join(texts))]
+
+    async def do_translate_async(self, text: str) -> str:
+        return (await self._request_async(text))[0]["dst"]
+
+    async def do_translate_batch_async(self, texts):
+        if any("\n" in text for text in texts):
+            return await super().do_translate_batch_async(texts)
+        return [item["dst"] for item in await self._request_async("\n".join(texts))]
+
+    def _request_params(self, text: str) -> dict:
+        salt = random.randint(32768, 65536)
+        sign = self.make_md5(self.app_id + text + str(salt) + self.secret_key)
+        return {
+            "appid": self.app_id,
+            "q": text,
+            "from": self.lang_in, # 使用可能已映射的lang_in
+            "to": self.lang_out,   # 使用可能已映射的lang_out
+            "salt": salt,
+            "sign": sign
+        }
+
+    def _parse_response(self, result) -> list:
+        if "error_code" in result:
+            # 你可能想将错误代码映射到更具体的异常
+            error_msg = f"百度API错误: {result.get('error_code')}, {result.get('error_msg', '')}"
+            logger.error(error_msg)
+            raise ValueError(error_msg)
+
+        if "trans_result" in result and len(result["trans_result"]) > 0:
+            return result["trans_result"]
+        else:
+            raise ValueError(f"百度返回了无效的翻译结果: {result}")
+
+    def _request(self, text: str) -> list:
         try:
-            salt = random.randint(32768, 65536)
-            sign = self.make_md5(self.app_id + text + str(salt) + self.secret_key)
-            
-            params = {
-                "appid": self.app_id,
-                "q": text,
-                "from": self.lang_in, # 使用可能已映射的lang_in
-                "to": self.lang_out,   # 使用可能已映射的lang_out
-                "salt": salt,
-                "sign": sign
-            }
-            
             response = self.session.get(
                 self.endpoint, 
-                params=params, 
+                params=self._request_params(text), 
                 timeout=10
             )
             response.raise_for_status()
-            result = response.json()
-            
-            if "error_code" in result:
-                # 你可能想将错误代码映射到更具体的异常
-                error_msg = f"百度API错误: {result.get('error_code')}, {result.get('error_msg', '')}"
-                logger.error(error_msg)
-                raise ValueError(error_msg)
-            
-            if "trans_result" in result and len(result["trans_result"]) > 0:
-                return result["trans_result"][0]["dst"]
-            else:
-                raise ValueError(f"百度返回了无效的翻译结果: {result}")
+            return self._parse_response(response.json())
+        except Exception as e:
+            logger.error(f"百度翻译过程中出错: {e}")
+            raise
+
+    async def _request_async(self, text: str) -> list:
+        try:
+            response = await aio.get_client().get(
+                self.endpoint, params=self._request_params(text), timeout=10
+            )
+            response.raise_for_status()
+            return self._parse_response(response.json())
         except Exception as e:
             logger.error(f"百度翻译过程中出错: {e}")
             raise
@@ -403,27 +526,22 @@ class ArgosTranslator(BaseTranslator):
     name = "argos"
     # Argos使用标准ISO 639-1代码（例如'en', 'zh'）
     # lang_map = {} # 通常不需要特定映射
+    # 同一语言对的模型在进程内共享，各线程的段落合并成批推理，见 argos_pool
+    batch_max_segments = 32
 
     def __init__(self, lang_in, lang_out, model, ignore_cache=False, **kwargs):
         super().__init__(lang_in, lang_out, model, ignore_cache)
         try:
-            import argostranslate.package
-            import argostranslate.translate
-
-            # 查找已安装的语言
-            from_lang = argostranslate.translate.get_language_from_code(self.lang_in)
-            to_lang = argostranslate.translate.get_language_from_code(self.lang_out)
-            
-            package = from_lang.get_translation(to_lang)
-            if not package:
-                 # 可选：尝试安装包？
-                 # argostranslate.package.update_package_index()
-                 # available_packages = argostranslate.package.get_available_packages()
-                 # package_to_install = next(filter(...))
-                 # argostranslate.package.install_from_path(package_to_install.download())
-                 raise ValueError(f"从{self.lang_in}到{self.lang_out}的Argos翻译包不可用")
-            
-            self.translator = package
+            # 线程设置: PDF2ZH_ARGOS_INTRA_THREADS、PDF2ZH_ARGOS_INTER_THREADS，
+            # 合并推理: PDF2ZH_ARGOS_MAX_BATCH（段）、PDF2ZH_ARGOS_BATCH_WAIT（秒）
+            self.translator = argos_pool.get_model(
+                self.lang_in,
+                self.lang_out,
+                intra_threads=self._setting("INTRA_THREADS", 0, int),
+                inter_threads=self._setting("INTER_THREADS", 1, int),
+                max_batch=self._setting("MAX_BATCH", 32, int),
+                max_wait=self._setting("BATCH_WAIT", 0.005, float),
+            )
         except ImportError:
             logger.error("无法导入argostranslate，请使用pip install argostranslate安装它。")
             raise ValueError("缺少argostranslate包")
@@ -441,11 +559,12 @@ class ArgosTranslator(BaseTranslator):
         return super().translate(text, ignore_cache)
 
     def do_translate(self, text: str) -> str:
+        return self.do_translate_batch([text])[0]
+
+    def do_translate_batch(self, texts):
         try:
-            # 翻译
-            result = self.translator.translate(text)
-            return result
+            return self.translator.translate_many(texts)
         except Exception as e:
             # 捕获可能的CTranslate2异常（如果使用该后端）
             logger.error(f"Argos翻译过程中出错: {e}")
-            raise 
\ No newline at end of file
+            raise
@@ -0,0 +1,11 @@
+import pytest
+
+from pdf2zh import cache
+
+
+@pytest.fixture
+def test_db():
+    """Bind the translation cache to a fresh temporary sqlite database."""
+    db = cache.init_test_db()
+    yield db
+    cache.clean_test_db(db)
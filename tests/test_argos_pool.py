@@ -0,0 +1,89 @@
+import sys
+import types
+
+import pytest
+
+from pdf2zh.translators import argos_pool
+
+
+class FakeResult:
+    def __init__(self, tokens):
+        self.hypotheses = [tokens]
+
+
+class FakeCT2Translator:
+    calls = []
+
+    def __init__(self, path, **kwargs):
+        pass
+
+    def translate_batch(self, sentences, target_prefix=None, max_batch_size=0, **options):
+        FakeCT2Translator.calls.append((sentences, options))
+        return [FakeResult([token.upper() for token in sentence]) for sentence in sentences]
+
+
+class FakeTokenizer:
+    def encode(self, sentence):
+        return ["▁" + word for word in sentence.split()]
+
+    def decode(self, tokens):
+        return "".join(tokens).replace("▁", " ")
+
+
+class FakeTranslation:
+    """逐段翻译：与 Argos 一样按换行分段，段内各句的词元拼接后解码"""
+
+    def __init__(self, pkg, broken=False):
+        self.pkg = pkg
+        self.broken = broken
+
+    def translate(self, text):
+        if self.broken:
+            return text
+        return "\n".join(
+            " ".join(word.upper() for word in part.split()) for part in text.split("\n")
+        )
+
+
+@pytest.fixture
+def fake_argos(monkeypatch, tmp_path):
+    settings = types.ModuleType("argostranslate.settings")
+    settings.device = "cpu"
+    settings.stanza_available = False
+    package = types.ModuleType("argostranslate")
+    package.settings = settings
+    monkeypatch.setitem(sys.modules, "argostranslate", package)
+    monkeypatch.setitem(sys.modules, "argostranslate.settings", settings)
+    monkeypatch.setitem(sys.modules, "ctranslate2", types.SimpleNamespace(Translator=FakeCT2Translator))
+    monkeypatch.setitem(sys.modules, "sentencepiece", types.ModuleType("sentencepiece"))
+    (tmp_path / "metadata.json").write_text('{"beam_size": 2}')
+    FakeCT2Translator.calls = []
+    return types.SimpleNamespace(package_path=tmp_path, from_code="en", tokenizer=FakeTokenizer(), target_prefix="")
+
+
+PARAGRAPHS = ["Hello world. How are you?", "one\ntwo three", "", "Last one!"]
+
+
+def test_batched_output_matches_translate(fake_argos):
+    translation = FakeTranslation(fake_argos)
+    model = argos_pool.ArgosModel(translation)
+    assert model.translate_many(PARAGRAPHS) == [translation.translate(text) for text in PARAGRAPHS]
+    sentences, options = FakeCT2Translator.calls[0]
+    assert len(sentences) == 5  # 两句、两段、一句，空段落不推理
+    assert options == {"beam_size": 2, "length_penalty": 0.2, "replace_unknowns": True}
+
+
+def test_cached_translation_is_unwrapped(fake_argos):
+    translation = types.SimpleNamespace(underlying=FakeTranslation(fake_argos))
+    translation.translate = translation.underlying.translate
+    model = argos_pool.ArgosModel(translation)
+    assert model.translate_many(["a b"]) == ["A B"]
+    assert FakeCT2Translator.calls
+
+
+def test_mismatch_falls_back_to_translate(fake_argos):
+    model = argos_pool.ArgosModel(FakeTranslation(fake_argos, broken=True))
+    assert model.translate_many(PARAGRAPHS) == PARAGRAPHS
+    calls = len(FakeCT2Translator.calls)
+    assert model.translate_many(["x y"]) == ["x y"]
+    assert len(FakeCT2Translator.calls) == calls
@@ -0,0 +1,92 @@
+import sqlite3
+import time
+
+from pdf2zh import cache
+
+
+def reload_from_backend():
+    cache.write_behind.flush()
+    cache.memory_cache.clear()
+
+
+def test_get_many_and_set_many(test_db):
+    c = cache.TranslationCache("cache-test", {"lang_in": "en", "lang_out": "zh"})
+    c.set_many([("hello", "你好"), ("world", "世界"), ("long " * 200, "长" * 200)])
+    assert c.get_many(["hello", "world", "missing"]) == {"hello": "你好", "world": "世界"}
+
+    reload_from_backend()
+    assert c.get_many(["hello", "long " * 200, "missing"]) == {"hello": "你好", "long " * 200: "长" * 200}
+    # 参数不同的翻译服务互不命中，参数顺序不影响
+    assert cache.TranslationCache("cache-test", {"lang_in": "en"}).get("hello") is None
+    assert cache.TranslationCache("cache-test", {"lang_out": "zh", "lang_in": "en"}).get("hello") == "你好"
+
+
+def test_set_overwrites(test_db):
+    c = cache.TranslationCache("cache-test")
+    c.set("hello", "old")
+    c.set("hello", "new")
+    reload_from_backend()
+    assert c.get("hello") == "new"
+    assert cache.stats()["rows"] == 1
+
+
+def make_v1(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute(
+        "CREATE TABLE _translationcache (id INTEGER PRIMARY KEY, translate_engine TEXT, "
+        "translate_engine_params TEXT, original_text TEXT, translation TEXT)"
+    )
+    conn.executemany(
+        "INSERT INTO _translationcache (translate_engine, translate_engine_params, original_text, translation) "
+        "VALUES (?, ?, ?, ?)",
+        rows,
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_migrate_from_v1(test_db, tmp_path):
+    v1 = tmp_path / "cache.v1.db"
+    make_v1(v1, [("google", "{}", f"text {i}", f"译文 {i}") for i in range(25)])
+    c = cache.TranslationCache("google")
+    c.set("text 3", "newer")  # v2 中已有的条目保留
+    cache.write_behind.flush()
+
+    assert cache.migrate_from_v1(str(v1), batch_size=10) == 25
+    assert cache._migration_state() == "done"
+    reload_from_backend()
+    assert c.get("text 24") == "译文 24"
+    assert c.get("text 3") == "newer"
+    assert cache.stats()["rows"] == 25
+    assert cache.migrate_from_v1(str(v1)) == 0
+
+
+def test_migrate_from_v1_resumes(test_db, tmp_path):
+    v1 = tmp_path / "cache.v1.db"
+    make_v1(v1, [("google", "{}", f"text {i}", f"译文 {i}") for i in range(1, 11)])
+    cache._CacheMeta.replace(key=cache._V1_MIGRATION, value="6").execute()  # 上次迁移到 rowid 6 中断
+
+    assert cache.migrate_from_v1(str(v1), batch_size=3) == 4
+    reload_from_backend()
+    c = cache.TranslationCache("google")
+    assert c.get("text 6") is None
+    assert c.get("text 7") == "译文 7"
+
+
+def test_evict(test_db):
+    c = cache.TranslationCache("cache-test")
+    c.set_many([(f"text {i}", f"译文 {i}") for i in range(10)])
+    cache.write_behind.flush()
+    now = int(time.time())
+    for i in range(10):  # text 0 最久没有访问
+        key = c._digest(f"text {i}")
+        cache._TranslationCache.update(last_access=now - 10000 + 100 * i).where(cache._TranslationCache.key == key).execute()
+
+    assert cache.evict(ttl=10000 - 250) == 3  # text 0、1、2 过期
+    assert cache.evict(max_rows=5) == 2
+    reload_from_backend()
+    assert sorted(c.get_many(f"text {i}" for i in range(10))) == [f"text {i}" for i in range(5, 10)]
+
+    total = cache.stats()["bytes"]
+    assert cache.evict(max_bytes=total - 1) >= 1
+    assert cache.stats()["bytes"] <= total - 1
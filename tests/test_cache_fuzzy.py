@@ -0,0 +1,33 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+
+from pdf2zh import cache
+
+
+def test_normalized_hits_are_counted_across_threads(test_db):
+    c = cache.TranslationCache("fuzzy-test", {"lang_in": "en"})
+    c.enable_fuzzy()
+    c.set_many([(f"paragraph {i} with {{v1}}", f"段落 {i} {{v1}}") for i in range(20)])
+    cache.write_behind.flush()
+
+    other = cache.TranslationCache("fuzzy-test", {"lang_in": "en"})
+    other.enable_fuzzy()
+    texts = [f"paragraph  {i} with {{v5}}" for i in range(20)]
+    with ThreadPoolExecutor(8) as pool:
+        results = list(pool.map(lambda _: other.fuzzy.get_many(texts), range(16)))
+    assert results[0][texts[3]] == "段落 3 {v5}"
+    assert other.fuzzy.hits == 16 * 20
+    assert other.fuzzy.near_hits == 0
+    assert other.fuzzy.index is None
+
+
+def test_near_hit_is_logged_with_both_sources(test_db, caplog):
+    c = cache.TranslationCache("fuzzy-test", {"lang_in": "en"})
+    c.enable_fuzzy(minhash=True)
+    c.set_many([("The quick brown fox jumps over the lazy dog near the river bank", "狐狸")])
+    with caplog.at_level(logging.DEBUG, logger="pdf2zh.cache_fuzzy"):
+        found = c.fuzzy.get_many(["The quick brown fox jumps over the lazy cat near the river bank"])
+    assert found
+    assert c.fuzzy.near_hits == 1
+    (message,) = [r.getMessage() for r in caplog.records if "near hit" in r.getMessage()]
+    assert "lazy cat" in message and "lazy dog" in message
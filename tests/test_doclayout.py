@@ -0,0 +1,51 @@
+import os
+
+from pdf2zh import doclayout
+
+
+def test_file_digest_is_recomputed_only_on_change(tmp_path, monkeypatch):
+    model = tmp_path / "model.onnx"
+    model.write_bytes(b"weights v1")
+    cache_dir = tmp_path / "cache"
+    first = doclayout._file_digest(model, cache_dir)
+
+    opened = []
+    real_open = open
+    monkeypatch.setattr("builtins.open", lambda *a, **kw: opened.append(a[0]) or real_open(*a, **kw))
+    assert doclayout._file_digest(model, cache_dir) == first
+    assert opened == []
+
+    model.write_bytes(b"weights v2")
+    os.utime(model, ns=(0, model.stat().st_mtime_ns + 1))
+    assert doclayout._file_digest(model, cache_dir) != first
+    assert opened == [model.resolve()]
+
+
+class FakeSession:
+    def __init__(self, error):
+        self.error = error
+
+    def run(self, output_names, feeds):
+        raise self.error
+
+
+def fallback_model(error, monkeypatch):
+    model = object.__new__(doclayout.OnnxModel)
+    model.model = FakeSession(error)
+    model._batched = True
+    monkeypatch.setattr(model, "preprocess", lambda images, imgsz: (None, [None] * len(images)))
+    monkeypatch.setattr(model, "predict", lambda image, imgsz=1024, **kwargs: [image])
+    return model
+
+
+def test_batch_shape_error_disables_batching(monkeypatch):
+    error = RuntimeError("Got invalid dimensions for input: images for the following indices index: 0 Got: 2 Expected: 1")
+    model = fallback_model(error, monkeypatch)
+    assert model.predict_batch(["a", "b"], 1024) == ["a", "b"]
+    assert model._batched is False
+
+
+def test_other_batch_error_falls_back_for_that_call_only(monkeypatch):
+    model = fallback_model(RuntimeError("Failed to allocate memory for requested buffer"), monkeypatch)
+    assert model.predict_batch(["a", "b"], 1024) == ["a", "b"]
+    assert model._batched is True
@@ -0,0 +1,47 @@
+import io
+
+from pdf2zh.ir import Formula, FormulaChar, Line, PageLayout, Paragraph, dump_pages, load_pages
+
+
+def make_page() -> PageLayout:
+    page = PageLayout(
+        pageid=3,
+        figure=True,
+        latin_font=None,
+        paragraphs=[
+            Paragraph(700.0, 72.0, 72.0, 540.0, 690.0, 712.0, 10.0, True, "Let {v0} be 中文"),
+            Paragraph(650.0, 72.0, 72.0, 540.0, 640.0, 660.0, 9.5, False, "second"),
+        ],
+        formulas=[
+            Formula(
+                chars=[
+                    FormulaChar("F1", False, 120, 10.0, 90.0, 700.0, 95.0, 5.0, "x"),
+                    FormulaChar(None, True, 8722, 7.0, 95.0, 704.0, 99.0, 4.0, "−"),
+                ],
+                lines=[Line(90.0, 699.0, 99.0, 699.0, 0.4)],
+                offset=-1.5,
+                width=9.0,
+            )
+        ],
+        lines=[Line(72.0, 600.0, 540.0, 600.0, 0.5)],
+    )
+    page.set_translations(["设 {v0} 为 Chinese", None])
+    return page
+
+
+def test_page_layout_round_trip():
+    page = make_page()
+    restored = PageLayout.from_dict(page.to_dict())
+    assert restored == page
+    assert restored.texts() == ["Let {v0} be 中文", "second"]
+    assert restored.paragraphs[0].translation == "设 {v0} 为 Chinese"
+    assert restored.paragraphs[1].translation is None
+    assert isinstance(restored.formulas[0].chars[1], FormulaChar)
+
+
+def test_dump_and_load_pages():
+    pages = [make_page(), PageLayout(pageid=4)]
+    fp = io.StringIO()
+    dump_pages(pages, fp)
+    fp.seek(0)
+    assert load_pages(fp) == pages
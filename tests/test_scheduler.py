@@ -0,0 +1,62 @@
+import threading
+
+import pytest
+
+from pdf2zh.report import RunReport
+from pdf2zh.scheduler import TranslationScheduler
+from pdf2zh.translators.base import BaseTranslator
+
+
+class GatedTranslator(BaseTranslator):
+    """译文为原文转大写；gate 打开前请求一直等待，fail 为真时请求失败"""
+
+    name = "scheduler-test"
+    batch_max_segments = 10
+    max_retries = 0
+
+    def __init__(self, fail=False):
+        super().__init__("en", "zh", "", True)
+        self.fail = fail
+        self.gate = threading.Event()
+        self.calls = []
+
+    def do_translate(self, text):
+        return self.do_translate_batch([text])[0]
+
+    def do_translate_batch(self, texts):
+        self.calls.append(list(texts))
+        assert self.gate.wait(5)
+        if self.fail:
+            raise RuntimeError("owner failed")
+        return [text.upper() for text in texts]
+
+
+def test_duplicates_are_translated_once():
+    translator = GatedTranslator()
+    scheduler = TranslationScheduler(translator, 4, RunReport())
+    first = scheduler.submit(["shared text", "shared text", "{v0}", " ", "page one"])
+    second = scheduler.submit(["shared   text", "page two"])  # 空白不同的同一段落等待第一页的请求
+    translator.gate.set()
+    assert first.result(5) == ["SHARED TEXT", "SHARED TEXT", "{v0}", " ", "PAGE ONE"]
+    assert second.result(5) == ["SHARED TEXT", "PAGE TWO"]
+    scheduler.close()
+    assert sorted(text for call in translator.calls for text in call) == ["page one", "page two", "shared text"]
+
+
+def test_abandoned_paragraphs_are_resubmitted():
+    owner = GatedTranslator(fail=True)
+    waiter = GatedTranslator()
+    waiter.gate.set()
+    a = TranslationScheduler(owner, 1, RunReport())
+    b = TranslationScheduler(waiter, 1, RunReport())
+    page_a = a.submit(["shared text"])
+    page_b = b.submit(["shared text", "own text"])
+    owner.gate.set()
+
+    # 登记段落的调度器失败时只有它自己的页面失败，另一个调度器重新提交这些段落
+    assert page_b.result(5) == ["SHARED TEXT", "OWN TEXT"]
+    with pytest.raises(RuntimeError, match="owner failed"):
+        page_a.result(5)
+    assert waiter.calls == [["own text"], ["shared text"]]
+    a.close()
+    b.close()
@@ -0,0 +1,51 @@
+from pdf2zh import segment
+from pdf2zh.segment import PACK_DELIMITER
+
+
+def test_pack_round_trip():
+    texts = ["hello world", "line one\nline two", "x = {v0}"]
+    packed = segment.pack(texts, PACK_DELIMITER)
+    assert packed.count(PACK_DELIMITER.strip()) == 2
+    assert segment.unpack(packed, PACK_DELIMITER, 3) == texts
+
+
+def test_pack_refuses_blank_and_delimiter():
+    assert segment.pack(["a", " "], PACK_DELIMITER) is None
+    assert segment.pack(["a", "b ||| c"], PACK_DELIMITER) is None
+
+
+def test_unpack_tolerates_changed_whitespace():
+    # 翻译服务删掉或增加了分隔符两侧的换行
+    assert segment.unpack("A|||B\n\n|||\n\nC\n", PACK_DELIMITER, 3) == ["A", "B", "C"]
+
+
+def test_unpack_rejects_wrong_count():
+    assert segment.unpack("A ||| B", PACK_DELIMITER, 3) is None
+    assert segment.unpack("A\nB\nC", PACK_DELIMITER, 3) is None
+
+
+def test_split_text_keeps_short_text():
+    assert segment.split_text("short", 100) == ["short"]
+    assert segment.split_text("no limit " * 100, 0) == ["no limit " * 100]
+
+
+def test_split_text_prefers_sentence_end():
+    text = "First sentence is here. The value 3.14 stays whole. Last one follows"
+    pieces = segment.split_text(text, 30)
+    assert pieces == ["First sentence is here.", "The value 3.14 stays whole.", "Last one follows"]
+    assert segment.split_text("中文句子一。中文句子二。", 8) == ["中文句子一。", "中文句子二。"]
+
+
+def test_split_text_never_splits_placeholders():
+    text = "x" * 18 + "{v12}" + "y" * 18 + "{ v 3 }" + "z" * 10
+    for max_chars in range(5, len(text)):
+        pieces = segment.split_text(text, max_chars)
+        assert "".join(pieces) == text
+        for piece in pieces:
+            assert segment._PLACEHOLDER.sub("", piece).count("{") == 0
+            assert piece.count("{") == piece.count("}")
+
+
+def test_join_text():
+    assert segment.join_text(["第一句。", "第二句。"], "zh-CN") == "第一句。第二句。"
+    assert segment.join_text(["One.", "Two."], "en") == "One. Two."
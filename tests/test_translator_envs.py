@@ -0,0 +1,46 @@
+import json
+
+import pytest
+
+from pdf2zh.config import ConfigManager
+from pdf2zh.translators import BaiduTranslator, GoogleTranslator
+
+
+@pytest.fixture
+def config_file(tmp_path):
+    user_config = ConfigManager.get_instance()._config_path
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({
+        "translators": [{"name": "google", "envs": {"GOOGLE_ENDPOINT": "http://127.0.0.1:1/m"}}]
+    }))
+    ConfigManager.custome_config(path)
+    yield path
+    ConfigManager.custome_config(user_config)
+
+
+def saved_envs(path, name):
+    for translator in json.loads(path.read_text()).get("translators", []):
+        if translator["name"] == name:
+            return translator["envs"]
+    return None
+
+
+def test_endpoint_override_is_not_saved(config_file, monkeypatch):
+    monkeypatch.delenv("GOOGLE_ENDPOINT", raising=False)
+    translator = GoogleTranslator("en", "zh", None, envs={"GOOGLE_ENDPOINT": "http://mock/m"}, ignore_cache=True)
+    assert translator.endpoint == "http://mock/m"
+    assert "GOOGLE_ENDPOINT" not in saved_envs(config_file, "google")
+
+    # 旧版本写入用户配置的地址被忽略
+    translator = GoogleTranslator("en", "zh", None, ignore_cache=True)
+    assert translator.endpoint == GoogleTranslator.runtime_envs["GOOGLE_ENDPOINT"]
+
+    monkeypatch.setenv("GOOGLE_ENDPOINT", "http://env/m")
+    assert GoogleTranslator("en", "zh", None, ignore_cache=True).endpoint == "http://env/m"
+
+
+def test_credentials_are_saved_without_endpoint(config_file):
+    envs = {"BAIDU_APP_ID": "id", "BAIDU_SECRET_KEY": "key", "BAIDU_ENDPOINT": "http://mock/baidu"}
+    translator = BaiduTranslator("en", "zh", None, envs=envs, ignore_cache=True)
+    assert translator.endpoint == "http://mock/baidu"
+    assert saved_envs(config_file, "baidu") == {"BAIDU_APP_ID": "id", "BAIDU_SECRET_KEY": "key"}